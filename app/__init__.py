@@ -14,8 +14,8 @@ login_manager = LoginManager()
 mail = Mail()
 migrate = Migrate()
 
-def create_app():
-    """Crea y configura la aplicación Flask"""
+def create_app(config=None):
+    """Crea y configura la aplicación Flask. `config` reemplaza valores (pruebas)."""
     app = Flask(__name__)
 
     # -------------------------
@@ -24,6 +24,7 @@ def create_app():
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', os.urandom(24))
     app.config.from_object('config.Config')
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['EVIDENCIAS_FOLDER'], exist_ok=True)
 
     # -------------------------
     # Configuración de Base de Datos
@@ -47,12 +48,16 @@ def create_app():
         print(f"[DEBUG] Usando SQLite local: {app.config['SQLALCHEMY_DATABASE_URI']}")
 
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if config:
+        app.config.update(config)
 
     # -------------------------
     # Inicialización de extensiones
     # -------------------------
     db.init_app(app)
-    migrate.init_app(app, db)   # 🔴 CLAVE PARA flask db
+    # Las migraciones (flask db upgrade) viven en migrations/, junto a run.py
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(app.root_path), 'migrations'),
+                     render_as_batch=True)   # 🔴 CLAVE PARA flask db
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     mail.init_app(app)
@@ -77,6 +82,7 @@ def create_app():
     from app.routes.adm_sede_route import adm_sede_bp
     from app.routes.notificacion_route import notificacion_bp
     from app.routes.sedes_route import sedes_bp
+    from app.routes.estado_route import estado_bp
 
     # -------------------------
     # Registro de Blueprints
@@ -96,6 +102,34 @@ def create_app():
     app.register_blueprint(adm_sede_bp)
     app.register_blueprint(notificacion_bp)
     app.register_blueprint(sedes_bp)
+    app.register_blueprint(estado_bp)
+
+    # -------------------------
+    # Servicios y comandos CLI
+    # -------------------------
+    from app.services import identidad  # noqa: F401 (registra la sincronización del índice de identidades)
+    from app.services import eventos
+    eventos.init_app(app)
+    from app.services import notificaciones  # registra los contadores de no leídas
+    notificaciones.init_app(app)
+    from app.services import carga_usuario
+    carga_usuario.init_app(app)
+    from app.services import hashing
+    hashing.init_app(app)
+    from app.services import limitador
+    limitador.init_app(app)
+    from app.services import esquema
+    esquema.init_app(app)
+    from app.services import subidas
+    subidas.init_app(app)
+    from app.services import almacen
+    almacen.init_app(app)
+    from app.services import blobs  # noqa: F401 (registra las referencias de los archivos de evidencia)
+    from app.services import resumen_evidencias  # noqa: F401 (mantiene el resumen por aprendiz)
+    from app.services import previas
+    previas.init_app(app)
+    from app.commands import registrar_comandos
+    registrar_comandos(app)
 
     # -------------------------
     # Proxy reverso (Coolify / Nginx)
@@ -121,24 +155,6 @@ def create_app():
 # -------------------------
 @login_manager.user_loader
 def load_user(user_id):
-    from app.models.users import (
-        Aprendiz, Instructor,
-        Administrador, AdministradorSede
-    )
-
-    try:
-        role, id = user_id.split("-")
-        id = int(id)
-    except (ValueError, AttributeError):
-        return None
-
-    if role == "aprendiz":
-        return Aprendiz.query.get(id)
-    elif role == "instructor":
-        return Instructor.query.get(id)
-    elif role == "administrador":
-        return Administrador.query.get(id)
-    elif role == "administrador_sede":
-        return AdministradorSede.query.get(id)
-
-    return None
+    # Usa la cache por proceso con las relaciones de cada rol ya cargadas
+    from app.services.carga_usuario import cargar_usuario
+    return cargar_usuario(user_id)
@@ -0,0 +1,232 @@
+# app/commands.py
+# Comandos de mantenimiento disponibles con `flask <grupo> <comando>`
+import click
+from flask.cli import AppGroup
+
+# -------------------------
+# Identidades de usuario
+# -------------------------
+identidades_cli = AppGroup('identidades', help='Índice de documento/correo/celular de todos los roles.')
+
+
+@identidades_cli.command('reconstruir')
+@click.option('--lote', default=500, show_default=True, help='Filas por INSERT.')
+def reconstruir_identidades_cmd(lote):
+    """Reconstruye el índice de identidades desde las tablas de usuarios."""
+    from app.services.identidad import reconstruir_identidades
+
+    insertadas, conflictos = reconstruir_identidades(lote=lote)
+    click.echo(f"[INFO] {insertadas} identidades registradas.")
+    for rol, usuario_id, campos in conflictos:
+        click.echo(f"[WARN] {rol}-{usuario_id}: {', '.join(campos)} repetido en otro rol (indexado igual).")
+
+
+# -------------------------
+# Tokens de recuperación heredados
+# -------------------------
+tokens_reset_cli = AppGroup('tokens-reset', help='Tabla heredada password_reset_token.')
+
+
+@tokens_reset_cli.command('purgar')
+@click.option('--lote', default=1000, show_default=True, help='Filas por DELETE.')
+def purgar_tokens_reset_cmd(lote):
+    """Elimina por lotes los tokens de la tabla heredada (ya no se usan)."""
+    from app import db
+    from app.models.users import PasswordResetToken
+
+    total = 0
+    while True:
+        ids = [fila.id for fila in PasswordResetToken.query
+               .with_entities(PasswordResetToken.id)
+               .order_by(PasswordResetToken.id)
+               .limit(lote)]
+        if not ids:
+            break
+        PasswordResetToken.query.filter(PasswordResetToken.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        total += len(ids)
+        click.echo(f"[INFO] {total} tokens eliminados...")
+
+    click.echo(f"[INFO] Purga terminada: {total} tokens eliminados.")
+
+
+# -------------------------
+# Bandeja de salida de correos
+# -------------------------
+correo_cli = AppGroup('correo', help='Envío de correos en segundo plano.')
+
+
+@correo_cli.command('trabajador')
+@click.option('--lote', type=int, help='Correos por lote (MAIL_OUTBOX_BATCH).')
+@click.option('--por-minuto', type=int, help='Máximo de envíos por minuto (MAIL_OUTBOX_PER_MINUTE).')
+@click.option('--una-vez', is_flag=True, help='Vacía lo pendiente y termina.')
+def trabajador_correo_cmd(lote, por_minuto, una_vez):
+    """Envía los correos pendientes reutilizando la conexión SMTP."""
+    from app.services.correo import crear_trabajador
+
+    trabajador = crear_trabajador(lote=lote, por_minuto=por_minuto)
+    click.echo("[INFO] Trabajador de correo iniciado.")
+    try:
+        trabajador.ejecutar(una_vez=una_vez)
+    except KeyboardInterrupt:
+        pass
+    click.echo(f"[INFO] Enviados: {trabajador.enviados}. Fallidos definitivos: {trabajador.fallidos}.")
+
+
+@correo_cli.command('sumidero')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--puerto', default=1025, show_default=True)
+def sumidero_cmd(host, puerto):
+    """Servidor SMTP local que muestra los correos en vez de enviarlos."""
+    from app.services.smtp_sink import SumideroSMTP
+
+    def mostrar(remitente, destinatarios, mensaje):
+        click.echo(f"--- {remitente} -> {', '.join(destinatarios)} | {mensaje['Subject']}")
+        click.echo(mensaje.get_payload(decode=True).decode(errors='replace'))
+
+    servidor = SumideroSMTP(host, puerto, al_recibir=mostrar)
+    click.echo(f"[INFO] Sumidero SMTP escuchando en {host}:{puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.server_close()
+
+
+# -------------------------
+# Notificaciones
+# -------------------------
+notificaciones_cli = AppGroup('notificaciones', help='Mantenimiento de notificaciones.')
+
+
+@notificaciones_cli.command('normalizar-roles')
+def normalizar_roles_cmd():
+    """Unifica los nombres de rol guardados ("administrador" -> "Administrador", ...)."""
+    from app import db
+    from app.services.notificaciones import normalizar_roles
+
+    total = normalizar_roles()
+    db.session.commit()
+    click.echo(f"[INFO] {total} valores de rol normalizados.")
+
+
+@notificaciones_cli.command('migrar-referencias')
+@click.option('--lote', default=500, show_default=True, help='Notificaciones por transacción.')
+def migrar_referencias_cmd(lote):
+    """Pasa a columnas el "(ID: n)" y el "Archivo adjunto: x" de los mensajes antiguos."""
+    from app.services.notificaciones import migrar_referencias
+
+    total = migrar_referencias(lote=lote)
+    click.echo(f"[INFO] {total} notificaciones con referencias migradas.")
+
+
+@notificaciones_cli.command('reconstruir-contadores')
+def reconstruir_contadores_cmd():
+    """Recalcula desde cero los contadores de no leídas."""
+    from app import db
+    from app.services.notificaciones import reconstruir_contadores
+
+    destinatarios, roles = reconstruir_contadores()
+    db.session.commit()
+    click.echo(f"[INFO] Contadores reconstruidos: {destinatarios} destinatarios, {roles} roles.")
+
+
+@notificaciones_cli.command('archivar')
+@click.option('--dias', type=int, default=None, help='Antigüedad mínima (por defecto NOTIFICACIONES_ARCHIVAR_DIAS).')
+@click.option('--lote', default=500, show_default=True, help='Notificaciones por transacción.')
+def archivar_cmd(dias, lote):
+    """Mueve a notificacion_archivada las notificaciones directas vistas más antiguas."""
+    from app.services.notificaciones import archivar_notificaciones
+
+    movidas, segundos = archivar_notificaciones(dias=dias, lote=lote)
+    click.echo(f"[INFO] {movidas} notificaciones archivadas en {segundos:.1f} s.")
+
+
+# -------------------------
+# Archivos de evidencia
+# -------------------------
+evidencias_cli = AppGroup('evidencias', help='Almacén de archivos de evidencia.')
+
+
+@evidencias_cli.command('deduplicar')
+@click.option('--lote', default=200, show_default=True, help='Evidencias por transacción.')
+def deduplicar_cmd(lote):
+    """Pasa los archivos existentes de UPLOAD_FOLDER al almacén por contenido."""
+    from app.services.blobs import deduplicar_evidencias
+
+    resumen = deduplicar_evidencias(lote=lote)
+    click.echo(
+        f"[INFO] {resumen['migradas']} evidencias migradas ({resumen['duplicadas']} duplicadas, "
+        f"{resumen['faltantes']} sin archivo). "
+        f"{resumen['bytes_recuperados'] / (1024 * 1024):.1f} MB recuperados."
+    )
+
+
+@evidencias_cli.command('liberar-blobs')
+@click.option('--horas', type=int, default=None, help='Margen sin referencias (por defecto EVIDENCIA_BLOBS_GRACIA_HORAS).')
+def liberar_blobs_cmd(horas):
+    """Borra los archivos que ninguna evidencia usa."""
+    from app.services.blobs import liberar_blobs
+
+    blobs, liberados = liberar_blobs(horas=horas)
+    click.echo(f"[INFO] {blobs} archivos liberados, {liberados / (1024 * 1024):.1f} MB.")
+
+
+@evidencias_cli.command('limpiar-subidas')
+@click.option('--horas', type=int, default=None, help='Horas sin actividad (por defecto SUBIDAS_REANUDABLES_HORAS).')
+def limpiar_subidas_cmd(horas):
+    """Borra las subidas por bloques abandonadas."""
+    from app.services.reanudables import limpiar_subidas
+
+    subidas, liberados = limpiar_subidas(horas=horas)
+    click.echo(f"[INFO] {subidas} subidas descartadas, {liberados / (1024 * 1024):.1f} MB.")
+
+
+@evidencias_cli.command('previas')
+@click.option('--lote', default=50, show_default=True, help='Archivos por tanda.')
+def previas_cmd(lote):
+    """Genera las previas (páginas, palabras, extracto) que falten."""
+    from app.services.previas import generar_previas_pendientes
+
+    total = generar_previas_pendientes(lote=lote)
+    click.echo(f"[INFO] {total} previas procesadas.")
+
+
+@evidencias_cli.command('reconciliar')
+@click.option('--horas', type=int, default=None, help='Margen antes de la cuarentena y del borrado (por defecto ARCHIVOS_HUERFANOS_GRACIA_HORAS).')
+@click.option('--lote', default=500, show_default=True, help='Archivos por consulta.')
+@click.option('--simular', is_flag=True, help='Solo informa, no mueve ni borra nada.')
+def reconciliar_cmd(horas, lote, simular):
+    """Compara EVIDENCIAS_FOLDER y los archivos heredados de UPLOAD_FOLDER con la base: aparta y borra huérfanos, reporta evidencias sin archivo."""
+    from app.services.huerfanos import reconciliar_archivos
+
+    resumen = reconciliar_archivos(horas=horas, lote=lote, simular=simular)
+    prefijo = '[SIMULACIÓN] ' if simular else '[INFO] '
+    click.echo(
+        f"{prefijo}{resumen['revisados']} archivos revisados; {resumen['en_cuarentena']} a cuarentena "
+        f"({resumen['bytes_en_cuarentena'] / (1024 * 1024):.1f} MB), {resumen['restaurados']} restaurados, "
+        f"{resumen['eliminados']} eliminados ({resumen['bytes_recuperados'] / (1024 * 1024):.1f} MB recuperados)."
+    )
+    if resumen['filas_sin_archivo']:
+        click.echo(
+            f"[WARN] {resumen['filas_sin_archivo']} evidencias sin archivo: "
+            f"{', '.join(map(str, resumen['ids_sin_archivo']))}"
+        )
+
+
+@evidencias_cli.command('reconstruir-resumenes')
+def reconstruir_resumenes_cmd():
+    """Recalcula desde cero el resumen de evidencias de cada aprendiz."""
+    from app import db
+    from app.services.resumen_evidencias import reconstruir_resumenes
+
+    aprendices = reconstruir_resumenes()
+    db.session.commit()
+    click.echo(f"[INFO] Resúmenes reconstruidos: {aprendices} aprendices con evidencias.")
+
+
+def registrar_comandos(app):
+    app.cli.add_command(identidades_cli)
+    app.cli.add_command(tokens_reset_cli)
+    app.cli.add_command(correo_cli)
+    app.cli.add_command(notificaciones_cli)
+    app.cli.add_command(evidencias_cli)
@@ -301,9 +301,48 @@ class Evidencia(db.Model):
 
     sesion_excel = db.Column(db.String(20), nullable=True)  
 
+    # Calculados mientras se recibe el archivo. Con el almacén por contenido,
+    # url_archivo es la clave "blobs/ab/cd/<sha256>" relativa a EVIDENCIAS_FOLDER.
+    sha256 = db.Column(db.String(64), nullable=True, index=True)
+    tamano = db.Column(db.BigInteger, nullable=True)
+
     aprendiz_id_aprendiz = db.Column(db.Integer, db.ForeignKey('aprendiz.id_aprendiz'), nullable=False)
     aprendiz_rel = db.relationship('Aprendiz', back_populates='evidencias', lazy=True)
 
+# -------------------------
+# TABLA ARCHIVO BLOB
+# -------------------------
+class ArchivoBlob(db.Model):
+    """Archivo de evidencia guardado una sola vez por contenido (ver app.services.blobs)."""
+    __tablename__ = 'archivo_blob'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    tamano = db.Column(db.BigInteger, nullable=True)
+    referencias = db.Column(db.Integer, nullable=False, default=0)  # evidencias que lo usan
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    liberado_en = db.Column(db.DateTime, nullable=True)  # cuándo quedó sin referencias
+    # Páginas/hojas, palabras y extracto (ver app.services.previas); NULL = sin procesar
+    previa = db.Column(db.JSON(none_as_null=True), nullable=True)
+
+# -------------------------
+# TABLA RESUMEN EVIDENCIAS
+# -------------------------
+class ResumenEvidencias(db.Model):
+    """Conteos y primeras subidas de evidencias por aprendiz (tablero, listados y tope de 17).
+
+    Se mantiene desde app.services.resumen_evidencias en la misma transacción que
+    la evidencia que lo modifica. Sin fila = el aprendiz no tiene evidencias subidas.
+    """
+    __tablename__ = 'resumen_evidencias'
+    aprendiz_id = db.Column(db.Integer, primary_key=True)
+    subidas = db.Column(db.Integer, nullable=False, default=0)  # con archivo, de cualquier tipo
+    word = db.Column(db.Integer, nullable=False, default=0)
+    excel_15 = db.Column(db.Integer, nullable=False, default=0)
+    excel_3 = db.Column(db.Integer, nullable=False, default=0)
+    pdf = db.Column(db.Integer, nullable=False, default=0)
+    primera_subida_word = db.Column(db.Date, nullable=True)
+    primera_subida_excel_15 = db.Column(db.Date, nullable=True)
+    primera_subida_excel_3 = db.Column(db.Date, nullable=True)
+
 # -------------------------
 # TABLA SEGUIMIENTO
 # -------------------------
@@ -343,6 +382,8 @@ class TokenInstructor(db.Model):
 # -------------------------
 # TABLA PASSWORD RESET TOKEN
 # -------------------------
+# Tabla heredada: los enlaces de recuperación ahora son tokens firmados
+# (app/services/tokens_reset.py). Se vacía con `flask tokens-reset purgar`.
 class PasswordResetToken(db.Model):
     __tablename__ = 'password_reset_token'
     id = db.Column(db.Integer, primary_key=True)
@@ -376,5 +417,160 @@ class Notificacion(db.Model):
     rol_remitente = db.Column(db.String(50), nullable=False)
     destinatario_id = db.Column(db.Integer, nullable=True)
     rol_destinatario = db.Column(db.String(50), nullable=True)
-    visto = db.Column(db.Boolean, default=False)
-    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    visto = db.Column(db.Boolean, default=False)  # solo aplica a notificaciones directas
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Referencias tipadas (antes iban dentro del texto: "(ID: n)", "Archivo adjunto: x")
+    evidencia_id = db.Column(
+        db.Integer, db.ForeignKey('evidencia.id_evidencia', ondelete='SET NULL'), nullable=True, index=True
+    )
+    aprendiz_id = db.Column(
+        db.Integer, db.ForeignKey('aprendiz.id_aprendiz', ondelete='SET NULL'), nullable=True, index=True
+    )
+    # Indexado: la descarga de un adjunto busca las filas que lo llevan (puede_ver_adjunto)
+    adjunto = db.Column(db.String(255), nullable=True, index=True)  # clave adjuntos/<uuid>_<nombre> (los antiguos: nombre en static/uploads)
+
+    evidencia = db.relationship('Evidencia', lazy='select')
+    aprendiz = db.relationship('Aprendiz', lazy='select')
+
+    # destinatario_id NULL = difusión a todo el rol (una sola fila); su lectura
+    # se guarda por usuario en NotificacionLectura.
+    __table_args__ = (
+        db.Index('ix_notificacion_bandeja', 'rol_destinatario', 'destinatario_id', 'visto'),
+        # Recorrido por cursor de la bandeja (más recientes primero)
+        db.Index('ix_notificacion_bandeja_fecha', 'rol_destinatario', 'destinatario_id',
+                 fecha_creacion.desc(), id.desc()),
+        # Canal de difusión de cada rol recorrido por id (cursor de lectura)
+        db.Index('ix_notificacion_canal', 'rol_destinatario', 'destinatario_id', 'id'),
+    )
+
+
+# -------------------------
+# TABLA NOTIFICACION ARCHIVADA
+# -------------------------
+class NotificacionArchivada(db.Model):
+    """Notificaciones directas ya vistas que `flask notificaciones archivar` sacó de la bandeja."""
+    __tablename__ = 'notificacion_archivada'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # mismo id que tenía en notificacion
+    motivo = db.Column(db.String(100), nullable=True)
+    mensaje = db.Column(db.Text, nullable=False)
+    remitente_id = db.Column(db.Integer, nullable=False)
+    rol_remitente = db.Column(db.String(50), nullable=False)
+    destinatario_id = db.Column(db.Integer, nullable=True)
+    rol_destinatario = db.Column(db.String(50), nullable=True)
+    visto = db.Column(db.Boolean, default=True)
+    fecha_creacion = db.Column(db.DateTime)
+    evidencia_id = db.Column(
+        db.Integer, db.ForeignKey('evidencia.id_evidencia', ondelete='SET NULL'), nullable=True
+    )
+    aprendiz_id = db.Column(
+        db.Integer, db.ForeignKey('aprendiz.id_aprendiz', ondelete='SET NULL'), nullable=True
+    )
+    adjunto = db.Column(db.String(255), nullable=True, index=True)
+    fecha_archivo = db.Column(db.DateTime, default=datetime.utcnow)
+
+    evidencia = db.relationship('Evidencia', lazy='select')
+    aprendiz = db.relationship('Aprendiz', lazy='select')
+
+    __table_args__ = (
+        db.Index('ix_notificacion_archivada_bandeja', 'rol_destinatario', 'destinatario_id',
+                 fecha_creacion.desc(), id.desc()),
+    )
+
+
+# -------------------------
+# TABLA NOTIFICACION LECTURA
+# -------------------------
+class NotificacionLectura(db.Model):
+    """Estado de lectura por destinatario de las notificaciones de difusión."""
+    __tablename__ = 'notificacion_lectura'
+    notificacion_id = db.Column(
+        db.Integer, db.ForeignKey('notificacion.id', ondelete='CASCADE'), primary_key=True
+    )
+    rol = db.Column(db.String(30), primary_key=True)
+    usuario_id = db.Column(db.Integer, primary_key=True)
+    fecha_lectura = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_notificacion_lectura_usuario', 'rol', 'usuario_id', 'notificacion_id'),
+    )
+
+
+# -------------------------
+# TABLAS CONTADOR NOTIFICACION
+# -------------------------
+class ContadorNotificacion(db.Model):
+    """Contadores por destinatario para el badge de no leídas.
+
+    Se mantienen desde app.services.notificaciones en la misma transacción
+    que la notificación o la lectura que los modifica.
+    """
+    __tablename__ = 'contador_notificacion'
+    rol = db.Column(db.String(50), primary_key=True)
+    usuario_id = db.Column(db.Integer, primary_key=True)
+    no_leidas = db.Column(db.Integer, nullable=False, default=0)  # directas con visto=False
+    difusiones_leidas = db.Column(db.Integer, nullable=False, default=0)
+    # Cursor del canal de difusión del rol: todas las difusiones con id <= este valor
+    # cuentan como leídas; por encima, la lectura individual está en NotificacionLectura.
+    ultima_difusion_leida = db.Column(db.Integer, nullable=True)
+
+
+class ContadorDifusion(db.Model):
+    """Total de notificaciones de difusión enviadas a cada rol."""
+    __tablename__ = 'contador_difusion'
+    rol = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+# -------------------------
+# TABLA IDENTIDAD USUARIO
+# -------------------------
+class IdentidadUsuario(db.Model):
+    """Índice de documento, correo y celular de todos los roles.
+
+    Se mantiene sincronizado desde app.services.identidad y permite
+    resolver el login y las validaciones de unicidad con una sola consulta.
+    Cada campo tiene su propio índice, sin UNIQUE: la unicidad la siguen
+    imponiendo las tablas de cada rol, y entre roles la revisa campo_en_uso.
+    """
+    __tablename__ = 'identidad_usuario'
+    id = db.Column(db.Integer, primary_key=True)
+    rol = db.Column(db.String(30), nullable=False)
+    usuario_id = db.Column(db.Integer, nullable=False)
+    documento = db.Column(db.String(50), nullable=False, index=True)
+    correo = db.Column(db.String(100), nullable=False, index=True)
+    celular = db.Column(db.String(45), nullable=True, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('rol', 'usuario_id', name='uq_identidad_rol_usuario'),
+    )
+
+    def __repr__(self):
+        return f'<IdentidadUsuario {self.rol}-{self.usuario_id} {self.documento}>'
+
+# -------------------------
+# TABLA CORREO PENDIENTE
+# -------------------------
+class CorreoPendiente(db.Model):
+    """Bandeja de salida de correos.
+
+    Las rutas solo insertan filas (en la misma transacción que el cambio que
+    las origina) y `flask correo trabajador` las envía en segundo plano.
+    """
+    __tablename__ = 'correo_pendiente'
+    id = db.Column(db.Integer, primary_key=True)
+    destinatario = db.Column(db.String(100), nullable=False)
+    asunto = db.Column(db.String(200), nullable=False)
+    cuerpo = db.Column(db.Text, nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')  # pendiente | enviado | fallido
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    proximo_intento = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    ultimo_error = db.Column(db.Text)
+    creado_en = db.Column(db.DateTime, default=datetime.utcnow)
+    enviado_en = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_correo_pendiente_estado_proximo', 'estado', 'proximo_intento'),
+    )
+
+    def __repr__(self):
+        return f'<CorreoPendiente {self.id} {self.estado} {self.destinatario}>'
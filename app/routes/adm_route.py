@@ -1,8 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash, generate_password_hash
 from app.models.users import Administrador, Notificacion, Aprendiz, Instructor, AdministradorSede
 from app import db
+from app.services.identidad import campo_en_uso
+from app.services.hashing import hashear, verificar_password
+from app.services.limitador import limitar_intentos
+from app.services.notificaciones import CARGA_REFERENCIAS, paginar_bandeja, nombres_remitentes, nombre_remitente, contar_no_leidas, ids_leidos, registrar_lectura, marcar_todas_leidas, archivada_de, normalizar_rol
+from app.services.almacen import guardar_adjunto
 import secrets
 from datetime import datetime, timedelta
 from functools import wraps
@@ -30,7 +34,7 @@ def generate_random_token(length=8):
 # -------------------------------
 # Función para enviar notificación
 # -------------------------------
-def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, motivo=None):
+def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, motivo=None, adjunto=None):
     # Determinar remitente dinámicamente según rol
     if current_user.rol_user == "administrador":
         remitente_id = current_user.id_admin
@@ -48,6 +52,7 @@ def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, mo
         rol_remitente=current_user.rol_user.capitalize(),
         destinatario_id=destinatario_id,
         rol_destinatario=rol_destinatario,
+        adjunto=adjunto,
         visto=False
     )
     db.session.add(noti)
@@ -59,6 +64,7 @@ def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, mo
 # Login administrador
 # -------------------------------
 @adm_bp.route('/login', methods=['GET', 'POST'])
+@limitar_intentos('documento')
 def login():
     if current_user.is_authenticated and isinstance(current_user, Administrador):
         return redirect(url_for('adm_bp.dashboard'))
@@ -67,7 +73,7 @@ def login():
         documento = request.form.get('documento')
         password = request.form.get('password')
         admin = Administrador.query.filter_by(documento=documento).first()
-        if not admin or not check_password_hash(admin.password, password):
+        if not admin or not verificar_password(admin, password):
             flash("Documento o contraseña incorrectos", "error")
             return render_template('login.html')
         login_user(admin)
@@ -83,10 +89,7 @@ def login():
 @login_required
 @admin_required
 def dashboard():
-    notificaciones_no_leidas = Notificacion.query.filter_by(
-        rol_destinatario="Administrador",
-        visto=False
-    ).count()
+    notificaciones_no_leidas = contar_no_leidas(current_user)
 
     aprendices = Aprendiz.query.all()
     instructores = Instructor.query.all()
@@ -116,10 +119,7 @@ def enviar_mensaje():
     aprendices = Aprendiz.query.all()
     adm_sedes = AdministradorSede.query.all()
 
-    notificaciones_no_leidas = Notificacion.query.filter_by(
-        rol_destinatario="Administrador",
-        visto=False
-    ).count()
+    notificaciones_no_leidas = contar_no_leidas(current_user)
 
     if request.method == 'POST':
         rol_destinatario = request.form.get('rol_destinatario')
@@ -129,17 +129,9 @@ def enviar_mensaje():
         archivo = request.files.get('archivo')
 
         # Manejar archivo adjunto
-        archivo_url = None
+        adjunto = None
         if archivo and archivo.filename:
-            import os
-            from werkzeug.utils import secure_filename
-            upload_folder = os.path.join('app', 'static', 'uploads')
-            os.makedirs(upload_folder, exist_ok=True)
-            filename = secure_filename(archivo.filename)
-            archivo_path = os.path.join(upload_folder, filename)
-            archivo.save(archivo_path)
-            archivo_url = f"/static/uploads/{filename}"
-            mensaje += f"\n\nArchivo adjunto: {filename}"
+            adjunto = guardar_adjunto(archivo)
 
         if not rol_destinatario:
             flash("Debes seleccionar un rol para enviar el mensaje.", "danger")
@@ -170,7 +162,8 @@ def enviar_mensaje():
                     mensaje=mensaje,
                     destinatario_id=destinatario_id,
                     rol_destinatario=rol_destinatario,
-                    motivo=motivo
+                    motivo=motivo,
+                    adjunto=adjunto
                 )
                 # [OK] Mensaje más descriptivo con nombre y rol
                 flash(
@@ -186,7 +179,8 @@ def enviar_mensaje():
                 mensaje=mensaje,
                 destinatario_id=None,  # [POINTING] general
                 rol_destinatario=rol_destinatario,
-                motivo=motivo
+                motivo=motivo,
+                adjunto=adjunto
             )
             flash(f"Notificación general enviada a todos los {rol_destinatario.lower()}s.", "success")
 
@@ -210,54 +204,25 @@ def enviar_mensaje():
 @login_required
 @admin_required
 def notificaciones():
-    # Obtener la página desde la query string, por defecto 1
-    pagina = request.args.get('pagina', 1, type=int)
-    per_page = 10  # Notificaciones por página
-
-    # Query con paginación
-    from sqlalchemy import or_
-    pagination = Notificacion.query.filter(
-        Notificacion.rol_destinatario == "Administrador",
-        or_(Notificacion.destinatario_id == current_user.id_admin, Notificacion.destinatario_id == None)
-    ).order_by(Notificacion.fecha_creacion.desc()).paginate(page=pagina, per_page=per_page, error_out=False)
-
-    notificaciones = pagination.items
-    total_paginas = pagination.pages
+    # Página por cursor: sin COUNT ni OFFSET (directas y difusiones al rol)
+    archivadas = request.args.get('archivadas', type=int) == 1
+    pagina = paginar_bandeja(
+        current_user,
+        antes_de=request.args.get('antes_de', type=int),
+        despues_de=request.args.get('despues_de', type=int),
+        archivadas=archivadas
+    )
+    notificaciones = nombres_remitentes(pagina.items)
 
     return render_template(
         'notificacion/listar.html',
         notificaciones=notificaciones,
-        pagina_actual=pagina,
-        total_paginas=total_paginas,
+        leidas=ids_leidos(notificaciones, current_user),
+        pagina=pagina,
+        archivadas=archivadas,
         now=datetime.now()
     )
 
-# -------------------------------
-# Función para obtener nombre del remitente
-# -------------------------------
-def obtener_remitente(noti):
-    """
-    Devuelve el nombre simple del remitente (sin prefijos como 'De: ').
-    Si no se encuentra el remitente, devuelve 'Sistema'.
-    """
-    role = (noti.rol_remitente or "").strip()
-
-    if role == "Instructor":
-        remitente = Instructor.query.filter_by(id_instructor=noti.remitente_id).first()
-        if remitente:
-            return f"{remitente.nombre_instructor} {remitente.apellido_instructor}"
-    elif role == "Aprendiz":
-        remitente = Aprendiz.query.filter_by(id_aprendiz=noti.remitente_id).first()
-        if remitente:
-            return f"{remitente.nombre} {remitente.apellido}"
-    elif role == "Administrador":
-        remitente = Administrador.query.filter_by(id_admin=noti.remitente_id).first()
-        if remitente:
-            return f"{getattr(remitente, 'nombre', 'Administrador')} {getattr(remitente, 'apellido', '')}".strip()
-
-    # Si no hay remitente encontrado o rol desconocido -> "Sistema"
-    return "Sistema"
-
 # -------------------------------
 # Marcar notificación como vista
 # -------------------------------
@@ -265,15 +230,19 @@ def obtener_remitente(noti):
 @login_required
 @admin_required
 def ver_notificacion(noti_id):
-    noti = Notificacion.query.get_or_404(noti_id)
-    noti.visto = True
-    db.session.commit()
+    # Evidencia y aprendiz referenciados en la misma consulta
+    if request.args.get('archivada', type=int) == 1:
+        noti = archivada_de(current_user, noti_id)
+    else:
+        noti = Notificacion.query.options(*CARGA_REFERENCIAS).filter_by(id=noti_id).first_or_404()
     fecha_local = noti.fecha_creacion - timedelta(hours=5)  # Ajuste a GMT-5 (Colombia)
 
     # Obtener nombre del remitente
-    remitente_nombre = obtener_remitente(noti)
+    remitente_nombre = nombre_remitente(noti)
 
-    return render_template('notificacion/ver_notificacion.html', notificacion=noti, remitente_nombre=remitente_nombre, now=datetime.now(), fecha_local=fecha_local)
+    pagina = render_template('notificacion/ver_notificacion.html', notificacion=noti, remitente_nombre=remitente_nombre, evidencia=noti.evidencia, now=datetime.now(), fecha_local=fecha_local)
+    registrar_lectura(noti, current_user)
+    return pagina
 
 
 
@@ -302,15 +271,9 @@ def responder_notificacion(noti_id):
             mensaje_respuesta = respuesta
 
             # Manejar archivo adjunto
+            adjunto = None
             if archivo and archivo.filename:
-                import os
-                from werkzeug.utils import secure_filename
-                upload_folder = os.path.join('app', 'static', 'uploads')
-                os.makedirs(upload_folder, exist_ok=True)
-                filename = secure_filename(archivo.filename)
-                archivo_path = os.path.join(upload_folder, filename)
-                archivo.save(archivo_path)
-                mensaje_respuesta += f"\n\nArchivo adjunto: {filename}"
+                adjunto = guardar_adjunto(archivo)
 
             nueva = Notificacion(
                 motivo=motivo_respuesta,
@@ -318,7 +281,8 @@ def responder_notificacion(noti_id):
                 remitente_id=remitente_id,
                 rol_remitente=current_user.__class__.__name__,
                 destinatario_id=noti.remitente_id,
-                rol_destinatario=noti.rol_remitente
+                rol_destinatario=normalizar_rol(noti.rol_remitente),
+                adjunto=adjunto
             )
             db.session.add(nueva)
             db.session.commit()
@@ -339,21 +303,11 @@ def responder_notificacion(noti_id):
 @login_required
 def marcar_todas_notificaciones():
 
-    # Detecta el id del usuario según rol
-    if current_user.__class__.__name__ == "Administrador":
-        user_id = current_user.id_admin
-        rol = "Administrador"
-    elif current_user.__class__.__name__ == "Instructor":
-        user_id = current_user.id_instructor
-        rol = "Instructor"
-    elif current_user.__class__.__name__ == "Aprendiz":
-        user_id = current_user.id_aprendiz
-        rol = "Aprendiz"
-    else:
+    if current_user.__class__.__name__ not in ("Administrador", "Instructor", "Aprendiz"):
         return "", 400
 
-    # Marcar todas como vistas
-    Notificacion.query.filter_by(destinatario_id=user_id, rol_destinatario=rol, visto=False).update({"visto": True})
+    # Marcar todas como vistas (directas y difusiones del rol)
+    marcar_todas_leidas(current_user)
     db.session.commit()
     return "", 200
 
@@ -378,13 +332,9 @@ def editar_perfil():
             flash('Faltan campos obligatorios.', 'warning')
             return redirect(url_for('adm_bp.editar_perfil'))
 
-        # Verificar si documento o correo ya existen en otro admin
-        existing_admin = Administrador.query.filter(
-            (Administrador.documento == documento) | (Administrador.correo == correo)
-        ).filter(Administrador.id_admin != current_user.id_admin).first()
-
-        if existing_admin:
-            flash('Documento o correo ya están en uso por otro administrador.', 'danger')
+        # Verificar si documento, correo o celular ya existen en otro usuario
+        if campo_en_uso(documento=documento, correo=correo, celular=celular, excluir=current_user):
+            flash('Documento, correo o celular ya están en uso por otro usuario.', 'danger')
             return redirect(url_for('adm_bp.editar_perfil'))
 
         # Actualizar datos
@@ -395,8 +345,7 @@ def editar_perfil():
         current_user.celular = celular
 
         if password:
-            from werkzeug.security import generate_password_hash
-            current_user.password = generate_password_hash(password)
+            current_user.password = hashear(password)
 
         try:
             db.session.commit()
@@ -438,22 +387,20 @@ def crear_adm_sede():
             return redirect(url_for('adm_bp.crear_adm_sede'))
 
 
-        # Checks for uniqueness
-        documento_existe = AdministradorSede.query.filter_by(documento=documento).first() or Administrador.query.filter_by(documento=documento).first() or Instructor.query.filter_by(documento=documento).first() or Aprendiz.query.filter_by(documento=documento).first()
-        correo_existe = AdministradorSede.query.filter_by(correo=correo).first() or Administrador.query.filter_by(correo=correo).first() or Instructor.query.filter_by(correo_instructor=correo).first() or Aprendiz.query.filter_by(correo=correo).first()
-        celular_existe = AdministradorSede.query.filter_by(celular=celular).first() or Administrador.query.filter_by(celular=celular).first() or Instructor.query.filter_by(celular_instructor=celular).first() or Aprendiz.query.filter_by(celular=celular).first()
+        # Checks for uniqueness (una consulta al índice de identidades)
+        campo_duplicado = campo_en_uso(documento=documento, correo=correo, celular=celular)
 
-        if documento_existe:
+        if campo_duplicado == 'documento':
             flash('Ya existe un usuario con ese documento.', 'danger')
             return redirect(url_for('adm_bp.crear_adm_sede'))
-        if correo_existe:
+        if campo_duplicado == 'correo':
             flash('Ya existe un usuario con ese correo.', 'danger')
             return redirect(url_for('adm_bp.crear_adm_sede'))
-        if celular_existe:
+        if campo_duplicado == 'celular':
             flash('Ya existe un usuario con ese celular.', 'danger')
             return redirect(url_for('adm_bp.crear_adm_sede'))
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = hashear(password)
         nuevo = AdministradorSede(
             nombre=nombre,
             apellido=apellido,
@@ -503,12 +450,8 @@ def editar_adm_sede(id):
             return redirect(url_for('adm_bp.editar_adm_sede', id=id))
 
         # Verificar unicidad
-        existing = AdministradorSede.query.filter(
-            (AdministradorSede.documento == documento) | (AdministradorSede.correo == correo)
-        ).filter(AdministradorSede.id_admin_sede != id).first()
-
-        if existing:
-            flash('Documento o correo ya están en uso.', 'danger')
+        if campo_en_uso(documento=documento, correo=correo, celular=celular, excluir=adm_sede):
+            flash('Documento, correo o celular ya están en uso.', 'danger')
             return redirect(url_for('adm_bp.editar_adm_sede', id=id))
 
         adm_sede.nombre = nombre
@@ -518,7 +461,7 @@ def editar_adm_sede(id):
         adm_sede.celular = celular
 
         if password:
-            adm_sede.password = generate_password_hash(password)
+            adm_sede.password = hashear(password)
 
         db.session.commit()
         flash('Perfil actualizado correctamente.', 'success')
@@ -1,11 +1,14 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, login_user, logout_user, current_user
-from werkzeug.security import check_password_hash, generate_password_hash
 from app.models.users import (
     AdministradorSede, Instructor, Notificacion, Aprendiz,
     Administrador, Programa, Ficha, Sede
 )
 from app import db
+from app.services.identidad import campo_en_uso
+from app.services.hashing import hashear
+from app.services.notificaciones import CARGA_REFERENCIAS, paginar_bandeja, nombres_remitentes, nombre_remitente, difundir, filtro_bandeja, contar_no_leidas, ids_leidos, registrar_lectura, marcar_todas_leidas, archivada_de, normalizar_rol
+from app.services.almacen import guardar_adjunto
 from datetime import datetime, timedelta
 from functools import wraps
 import logging
@@ -29,7 +32,7 @@ def admin_sede_required(f):
 # -------------------------------
 # Función para enviar notificación
 # -------------------------------
-def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, motivo=None):
+def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, motivo=None, adjunto=None):
     noti = Notificacion(
         mensaje=mensaje,
         motivo=motivo,
@@ -37,42 +40,13 @@ def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, mo
         rol_remitente="AdministradorSede",
         destinatario_id=destinatario_id,
         rol_destinatario=rol_destinatario,
+        adjunto=adjunto,
         visto=False
     )
     db.session.add(noti)
     db.session.commit()
     return True
 
-# -------------------------------
-# Función para obtener nombre del remitente
-# -------------------------------
-def obtener_remitente(noti):
-    """
-    Devuelve el nombre simple del remitente (sin prefijos como 'De: ').
-    Si no se encuentra el remitente, devuelve 'Sistema'.
-    """
-    role = (noti.rol_remitente or "").strip()
-
-    if role == "Instructor":
-        remitente = Instructor.query.filter_by(id_instructor=noti.remitente_id).first()
-        if remitente:
-            return f"{remitente.nombre_instructor} {remitente.apellido_instructor}"
-    elif role == "Aprendiz":
-        remitente = Aprendiz.query.filter_by(id_aprendiz=noti.remitente_id).first()
-        if remitente:
-            return f"{remitente.nombre} {remitente.apellido}"
-    elif role == "Administrador":
-        remitente = Administrador.query.filter_by(id_admin=noti.remitente_id).first()
-        if remitente:
-            return f"{remitente.nombre} {remitente.apellido}"
-    elif role == "AdministradorSede":
-        remitente = AdministradorSede.query.filter_by(id_admin_sede=noti.remitente_id).first()
-        if remitente:
-            return f"{remitente.nombre} {remitente.apellido}"
-
-    # Si no hay remitente encontrado o rol desconocido -> "Sistema"
-    return "Sistema"
-
 # -------------------------------
 # Dashboard administrador de sede
 # -------------------------------
@@ -93,10 +67,7 @@ def dashboard():
     logging.info(f"Dashboard: Programas encontrados para sede_id={current_user.sede_id}: {len(programas)}")
 
     # Notificaciones no leídas
-    notificaciones_no_leidas = Notificacion.query.filter_by(
-        rol_destinatario="AdministradorSede",
-        visto=False
-    ).count()
+    notificaciones_no_leidas = contar_no_leidas(current_user)
 
     administradores = Administrador.query.all()
 
@@ -134,35 +105,22 @@ def registrar_instructor():
             flash('Todos los campos son obligatorios.', 'warning')
             return redirect(url_for('adm_sede_bp.registrar_instructor'))
 
-        # Verificar unicidad
-        documento_existe = (Instructor.query.filter_by(documento=documento).first() or
-                            Administrador.query.filter_by(documento=documento).first() or
-                            AdministradorSede.query.filter_by(documento=documento).first() or
-                            Aprendiz.query.filter_by(documento=documento).first())
-
-        email_existe = (Instructor.query.filter_by(correo_instructor=correo).first() or
-                        Administrador.query.filter_by(correo=correo).first() or
-                        AdministradorSede.query.filter_by(correo=correo).first() or
-                        Aprendiz.query.filter_by(correo=correo).first())
-
-        celular_existe = (Instructor.query.filter_by(celular_instructor=celular).first() or
-                          Administrador.query.filter_by(celular=celular).first() or
-                          AdministradorSede.query.filter_by(celular=celular).first() or
-                          Aprendiz.query.filter_by(celular=celular).first())
-
-        if documento_existe:
+        # Verificar unicidad (una consulta al índice de identidades)
+        campo_duplicado = campo_en_uso(documento=documento, correo=correo, celular=celular)
+
+        if campo_duplicado == 'documento':
             flash('Ya existe un usuario con ese documento.', 'danger')
             return redirect(url_for('adm_sede_bp.registrar_instructor'))
 
-        if email_existe:
+        if campo_duplicado == 'correo':
             flash('Ya existe un usuario con ese email.', 'danger')
             return redirect(url_for('adm_sede_bp.registrar_instructor'))
 
-        if celular_existe:
+        if campo_duplicado == 'celular':
             flash('Ya existe un usuario con ese número de celular.', 'danger')
             return redirect(url_for('adm_sede_bp.registrar_instructor'))
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = hashear(password)
 
         nuevo_instructor = Instructor(
             nombre_instructor=nombre,
@@ -181,18 +139,13 @@ def registrar_instructor():
             db.session.commit()
 
             # Notificación a administradores principales
-            administradores = Administrador.query.all()
-            for admin in administradores:
-                noti = Notificacion(
-                    motivo="Se ha registrado un nuevo Instructor",
-                    mensaje=f"{nuevo_instructor.nombre_instructor} {nuevo_instructor.apellido_instructor} en la sede {current_user.sede.nombre_completo()}",
-                    remitente_id=current_user.id_admin_sede,
-                    rol_remitente="AdministradorSede",
-                    destinatario_id=admin.id_admin,
-                    rol_destinatario="administrador",
-                    visto=False
-                )
-                db.session.add(noti)
+            difundir(
+                "Administrador",
+                motivo="Se ha registrado un nuevo Instructor",
+                mensaje=f"{nuevo_instructor.nombre_instructor} {nuevo_instructor.apellido_instructor} en la sede {current_user.sede.nombre_completo()}",
+                remitente_id=current_user.id_admin_sede,
+                rol_remitente="AdministradorSede"
+            )
             db.session.commit()
 
             flash('Instructor registrado con éxito.', 'success')
@@ -221,21 +174,16 @@ def enviar_mensaje():
         return redirect(url_for('adm_sede_bp.dashboard'))
 
     # Manejar archivo adjunto
+    adjunto = None
     if archivo and archivo.filename:
-        import os
-        from werkzeug.utils import secure_filename
-        upload_folder = os.path.join('app', 'static', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-        filename = secure_filename(archivo.filename)
-        archivo_path = os.path.join(upload_folder, filename)
-        archivo.save(archivo_path)
-        mensaje += f"\n\nArchivo adjunto: {filename}"
+        adjunto = guardar_adjunto(archivo)
 
     enviar_notificacion(
         mensaje=mensaje,
         motivo=motivo,
         destinatario_id=destinatario_id if destinatario_id else None,
-        rol_destinatario=rol_destinatario
+        rol_destinatario=rol_destinatario,
+        adjunto=adjunto
     )
 
     flash(f"Mensaje enviado a {rol_destinatario}", "success")
@@ -248,23 +196,22 @@ def enviar_mensaje():
 @login_required
 @admin_sede_required
 def notificaciones():
-    pagina = request.args.get('pagina', 1, type=int)
-    per_page = 10
-
-    pagination = Notificacion.query.filter(
-        Notificacion.rol_destinatario == "AdministradorSede",
-        ((Notificacion.destinatario_id == current_user.id_admin_sede) |
-         (Notificacion.destinatario_id == None))
-    ).order_by(Notificacion.fecha_creacion.desc()).paginate(page=pagina, per_page=per_page, error_out=False)
-
-    notificaciones = pagination.items
-    total_paginas = pagination.pages
+    # Página por cursor: sin COUNT ni OFFSET (directas y difusiones al rol)
+    archivadas = request.args.get('archivadas', type=int) == 1
+    pagina = paginar_bandeja(
+        current_user,
+        antes_de=request.args.get('antes_de', type=int),
+        despues_de=request.args.get('despues_de', type=int),
+        archivadas=archivadas
+    )
+    notificaciones = nombres_remitentes(pagina.items)
 
     return render_template(
         'notificacion/listar.html',
         notificaciones=notificaciones,
-        pagina_actual=pagina,
-        total_paginas=total_paginas,
+        leidas=ids_leidos(notificaciones, current_user),
+        pagina=pagina,
+        archivadas=archivadas,
         now=datetime.now()
     )
 
@@ -275,29 +222,29 @@ def notificaciones():
 @login_required
 @admin_sede_required
 def ver_notificacion(noti_id):
-    noti = Notificacion.query.filter(
-        Notificacion.id == noti_id,
-        Notificacion.rol_destinatario == "AdministradorSede",
-        ((Notificacion.destinatario_id == current_user.id_admin_sede) |
-         (Notificacion.destinatario_id == None))
-    ).first_or_404()
-
-    if not noti.visto:
-        noti.visto = True
-        db.session.commit()
+    if request.args.get('archivada', type=int) == 1:
+        noti = archivada_de(current_user, noti_id)
+    else:
+        noti = Notificacion.query.options(*CARGA_REFERENCIAS).filter(
+            Notificacion.id == noti_id,
+            filtro_bandeja(current_user)
+        ).first_or_404()
 
     # Obtener nombre del remitente
-    remitente_nombre = obtener_remitente(noti)
+    remitente_nombre = nombre_remitente(noti)
 
     fecha_local = noti.fecha_creacion - timedelta(hours=5)
 
-    return render_template(
+    pagina = render_template(
         'notificacion/ver_notificacion.html',
         notificacion=noti,
         remitente_nombre=remitente_nombre,
+        evidencia=noti.evidencia,
         now=datetime.now(),
         fecha_local=fecha_local
     )
+    registrar_lectura(noti, current_user)
+    return pagina
 
 # -------------------------------
 # Marcar todas notificaciones como vistas
@@ -306,11 +253,7 @@ def ver_notificacion(noti_id):
 @login_required
 @admin_sede_required
 def marcar_todas_notificaciones():
-    Notificacion.query.filter_by(
-        rol_destinatario="AdministradorSede",
-        destinatario_id=current_user.id_admin_sede,
-        visto=False
-    ).update({"visto": True})
+    marcar_todas_leidas(current_user)
     db.session.commit()
     return "", 200
 
@@ -323,9 +266,7 @@ def marcar_todas_notificaciones():
 def responder_notificacion(noti_id):
     noti = Notificacion.query.filter(
         Notificacion.id == noti_id,
-        Notificacion.rol_destinatario == "AdministradorSede",
-        ((Notificacion.destinatario_id == current_user.id_admin_sede) |
-         (Notificacion.destinatario_id == None))
+        filtro_bandeja(current_user)
     ).first_or_404()
 
     if request.method == 'POST':
@@ -337,15 +278,9 @@ def responder_notificacion(noti_id):
             mensaje_respuesta = respuesta
 
             # Manejar archivo adjunto
+            adjunto = None
             if archivo and archivo.filename:
-                import os
-                from werkzeug.utils import secure_filename
-                upload_folder = os.path.join('app', 'static', 'uploads')
-                os.makedirs(upload_folder, exist_ok=True)
-                filename = secure_filename(archivo.filename)
-                archivo_path = os.path.join(upload_folder, filename)
-                archivo.save(archivo_path)
-                mensaje_respuesta += f"\n\nArchivo adjunto: {filename}"
+                adjunto = guardar_adjunto(archivo)
 
             nueva = Notificacion(
                 motivo=motivo_respuesta,
@@ -353,7 +288,8 @@ def responder_notificacion(noti_id):
                 remitente_id=current_user.id_admin_sede,
                 rol_remitente="AdministradorSede",
                 destinatario_id=noti.remitente_id,
-                rol_destinatario=noti.rol_remitente
+                rol_destinatario=normalizar_rol(noti.rol_remitente),
+                adjunto=adjunto
             )
             db.session.add(nueva)
             db.session.commit()
@@ -389,11 +325,7 @@ def editar_instructor(id):
             return redirect(url_for('adm_sede_bp.editar_instructor', id=id))
 
         # Verificar unicidad
-        existing = Instructor.query.filter(
-            (Instructor.documento == documento) | (Instructor.correo_instructor == correo) | (Instructor.celular_instructor == celular)
-        ).filter(Instructor.id_instructor != id).first()
-
-        if existing:
+        if campo_en_uso(documento=documento, correo=correo, celular=celular, excluir=instructor):
             flash('Documento, correo o celular ya están en uso.', 'danger')
             return redirect(url_for('adm_sede_bp.editar_instructor', id=id))
 
@@ -403,7 +335,7 @@ def editar_instructor(id):
         instructor.correo_instructor = correo
         instructor.celular_instructor = celular
         if password:
-            instructor.password_instructor = generate_password_hash(password)
+            instructor.password_instructor = hashear(password)
 
         try:
             db.session.commit()
@@ -702,35 +634,22 @@ def registrar_aprendiz():
             flash('La ficha pertenece a una sede diferente. No puede registrar aprendices para esta ficha.', 'danger')
             return redirect(url_for('adm_sede_bp.registrar_aprendiz'))
 
-        # Verificar unicidad
-        documento_existe = (Aprendiz.query.filter_by(documento=documento).first() or
-                            Administrador.query.filter_by(documento=documento).first() or
-                            AdministradorSede.query.filter_by(documento=documento).first() or
-                            Instructor.query.filter_by(documento=documento).first())
-
-        correo_existe = (Aprendiz.query.filter_by(correo=correo).first() or
-                         Administrador.query.filter_by(correo=correo).first() or
-                         AdministradorSede.query.filter_by(correo=correo).first() or
-                         Instructor.query.filter_by(correo_instructor=correo).first())
-
-        celular_existe = (Aprendiz.query.filter_by(celular=celular).first() or
-                          Administrador.query.filter_by(celular=celular).first() or
-                          AdministradorSede.query.filter_by(celular=celular).first() or
-                          Instructor.query.filter_by(celular_instructor=celular).first())
-
-        if documento_existe:
+        # Verificar unicidad (una consulta al índice de identidades)
+        campo_duplicado = campo_en_uso(documento=documento, correo=correo, celular=celular)
+
+        if campo_duplicado == 'documento':
             flash('Ya existe un usuario con ese documento.', 'danger')
             return redirect(url_for('adm_sede_bp.registrar_aprendiz'))
 
-        if correo_existe:
+        if campo_duplicado == 'correo':
             flash('Ya existe un usuario con ese correo.', 'danger')
             return redirect(url_for('adm_sede_bp.registrar_aprendiz'))
 
-        if celular_existe:
+        if campo_duplicado == 'celular':
             flash('Ya existe un usuario con ese número de celular.', 'danger')
             return redirect(url_for('adm_sede_bp.registrar_aprendiz'))
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = hashear(password)
 
         logging.info(f"Registrando aprendiz: ficha={numero_ficha_int}, sede_id={sede_id}, programa_id={programa.id_programa}, instructor_id=None (asignado posteriormente)")
 
@@ -826,11 +745,7 @@ def editar_aprendiz(id):
         logging.info(f"Sede_id determinado: {sede_id}")
 
         # Verificar unicidad
-        existing = Aprendiz.query.filter(
-            (Aprendiz.documento == documento) | (Aprendiz.correo == correo) | (Aprendiz.celular == celular)
-        ).filter(Aprendiz.id_aprendiz != id).first()
-
-        if existing:
+        if campo_en_uso(documento=documento, correo=correo, celular=celular, excluir=aprendiz):
             flash('Documento, correo o celular ya están en uso.', 'danger')
             return redirect(url_for('adm_sede_bp.editar_aprendiz', id=id))
 
@@ -844,7 +759,7 @@ def editar_aprendiz(id):
         aprendiz.jornada = jornada
         logging.info(f"Instructor_id mantiene {aprendiz.instructor_id} al cambiar ficha")
         if password:
-            aprendiz.password_aprendiz = generate_password_hash(password)
+            aprendiz.password_aprendiz = hashear(password)
 
         try:
             db.session.commit()
@@ -935,11 +850,7 @@ def editar_perfil():
             return redirect(url_for('adm_sede_bp.editar_perfil'))
 
         # Verificar unicidad
-        existing = AdministradorSede.query.filter(
-            (AdministradorSede.documento == documento) | (AdministradorSede.correo == correo) | (AdministradorSede.celular == celular)
-        ).filter(AdministradorSede.id_admin_sede != current_user.id_admin_sede).first()
-
-        if existing:
+        if campo_en_uso(documento=documento, correo=correo, celular=celular, excluir=current_user):
             flash('Documento, correo o celular ya están en uso.', 'danger')
             return redirect(url_for('adm_sede_bp.editar_perfil'))
 
@@ -949,7 +860,7 @@ def editar_perfil():
         current_user.correo = correo
         current_user.celular = celular
         if password:
-            current_user.password = generate_password_hash(password)
+            current_user.password = hashear(password)
 
         try:
             db.session.commit()
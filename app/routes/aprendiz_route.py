@@ -2,14 +2,17 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, login_user, logout_user, current_user
 from app.models.users import Aprendiz, Instructor, Notificacion , Evidencia, Administrador, Programa, Ficha
 from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.services.identidad import campo_en_uso
+from app.services.hashing import hashear, verificar_password
+from app.services.limitador import limitar_intentos
+from app.services.notificaciones import CARGA_REFERENCIAS, paginar_bandeja, nombres_remitentes, nombre_remitente, filtro_bandeja, contar_no_leidas, ids_leidos, registrar_lectura, marcar_todas_leidas, archivada_de, normalizar_rol
+from app.services.almacen import guardar_adjunto
+from app.services.blobs import guardar_blob
+from app.services.resumen_evidencias import resumen_de, TOTAL_REQUERIDO
 from functools import wraps
 from datetime import datetime, timedelta, date
-from sqlalchemy import or_
 import os
-from flask import current_app
 from werkzeug.utils import secure_filename
-import logging
 
 bp = Blueprint('aprendiz_bp', __name__, url_prefix='/aprendiz')
 
@@ -37,7 +40,7 @@ def aprendiz_required(f):
 # -------------------------------
 # Función para enviar notificación
 # -------------------------------
-def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, motivo=None):
+def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, motivo=None, adjunto=None):
     noti = Notificacion(
         mensaje=mensaje,
         motivo=motivo,
@@ -45,34 +48,12 @@ def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, mo
         rol_remitente="Aprendiz",
         destinatario_id=destinatario_id,
         rol_destinatario=rol_destinatario,
+        adjunto=adjunto,
         visto=False
     )
     db.session.add(noti)
     db.session.commit()
 
-# -------------------------------
-# Función para obtener nombre del remitente
-# -------------------------------
-def obtener_remitente(noti):
-    role = (noti.rol_remitente or "").strip()
-
-    if role == "Instructor":
-        from app.models.users import Instructor
-        remitente = Instructor.query.filter_by(id_instructor=noti.remitente_id).first()
-        if remitente:
-            return f"{remitente.nombre_instructor} {remitente.apellido_instructor}"
-    elif role == "Aprendiz":
-        remitente = Aprendiz.query.filter_by(id_aprendiz=noti.remitente_id).first()
-        if remitente:
-            return f"{remitente.nombre} {remitente.apellido}"
-    elif role == "Administrador":
-        from app.models.users import Administrador
-        remitente = Administrador.query.filter_by(id_admin=noti.remitente_id).first()
-        if remitente:
-            return f"{getattr(remitente, 'nombre', 'Administrador')} {getattr(remitente, 'apellido', '')}".strip()
-
-    return "Sistema"
-
 # -------------------------------
 # Registro de aprendiz
 # -------------------------------
@@ -119,40 +100,22 @@ def registro():
             flash("La ficha no tiene una sede asignada.", "error")
             return render_template('aprendiz.html', sedes=sedes, now=datetime.now())
 
-        # Verificar unicidad global (todos los tipos de usuario)
-        from app.models.users import Administrador, Instructor, AdministradorSede
-
-        # Verificar documento en todos los modelos
-        documento_existe = (Aprendiz.query.filter_by(documento=documento).first() or
-                            Administrador.query.filter_by(documento=documento).first() or
-                            AdministradorSede.query.filter_by(documento=documento).first() or
-                            Instructor.query.filter_by(documento=documento).first())
+        # Verificar unicidad global (todos los tipos de usuario) en el índice de identidades
+        campo_duplicado = campo_en_uso(documento=documento, correo=correo, celular=celular)
 
-        # Verificar email (solo en modelos que tienen email)
-        email_existe = (Aprendiz.query.filter_by(correo=correo).first() or
-                        Administrador.query.filter_by(correo=correo).first() or
-                        AdministradorSede.query.filter_by(correo=correo).first() or
-                        Instructor.query.filter_by(correo_instructor=correo).first())
-
-        # Verificar celular (solo en modelos que tienen celular)
-        celular_existe = (Aprendiz.query.filter_by(celular=celular).first() or
-                          Administrador.query.filter_by(celular=celular).first() or
-                          AdministradorSede.query.filter_by(celular=celular).first() or
-                          Instructor.query.filter_by(celular_instructor=celular).first())
-
-        if documento_existe:
+        if campo_duplicado == 'documento':
             flash("Ya existe un usuario con ese documento", "error")
             return render_template('aprendiz.html', sedes=sedes, now=datetime.now())
 
-        if email_existe:
+        if campo_duplicado == 'correo':
             flash("Ya existe un usuario con ese email", "error")
             return render_template('aprendiz.html', sedes=sedes, now=datetime.now())
 
-        if celular_existe:
+        if campo_duplicado == 'celular':
             flash("Ya existe un usuario con ese número de celular", "error")
             return render_template('aprendiz.html', sedes=sedes, now=datetime.now())
 
-        password_hash = generate_password_hash(password)
+        password_hash = hashear(password)
 
 
         aprendiz = Aprendiz(
@@ -191,13 +154,14 @@ def registro():
 # Login del aprendiz
 # -------------------------------
 @bp.route('/login', methods=['GET', 'POST'])
+@limitar_intentos('documento')
 def login():
     if request.method == 'POST':
         documento = request.form.get('documento')
         password = request.form.get('password')
 
         aprendiz = Aprendiz.query.filter_by(documento=documento).first()
-        if not aprendiz or not check_password_hash(aprendiz.password, password):
+        if not aprendiz or not verificar_password(aprendiz, password):
             flash("Documento o contraseña incorrectos", "error")
             return render_template('aprendiz/login.html', now=datetime.now())
 
@@ -246,13 +210,8 @@ def dashboard_aprendiz(aprendiz_id):
     # -----------------------------
     # Progreso de evidencias
     # -----------------------------
-    total_requerido = 17
-    evidencias_subidas = (
-        db.session.query(Evidencia)
-        .filter_by(aprendiz_id_aprendiz=aprendiz_obj.id_aprendiz)
-        .filter(Evidencia.fecha_subida.isnot(None), Evidencia.url_archivo != '')
-        .count()
-    )
+    total_requerido = TOTAL_REQUERIDO
+    evidencias_subidas = resumen_de(aprendiz_obj.id_aprendiz).subidas
     progreso = int((evidencias_subidas / total_requerido) * 100) if total_requerido > 0 else 0
 
     # -----------------------------
@@ -272,15 +231,7 @@ def dashboard_aprendiz(aprendiz_id):
     # -----------------------------
     # Notificaciones no leídas (ahora usa aprendiz_obj)
     # -----------------------------
-    notificaciones_no_leidas = Notificacion.query.filter(
-        Notificacion.rol_destinatario == 'Aprendiz',
-        Notificacion.visto == False
-    ).filter(
-        or_(
-            Notificacion.destinatario_id == aprendiz_obj.id_aprendiz,
-            Notificacion.destinatario_id == None  # solo si es global
-        )
-    ).count()
+    notificaciones_no_leidas = contar_no_leidas(aprendiz_obj)
 
     # -----------------------------
     # Usuarios para mensajes (solo si es Aprendiz)
@@ -344,7 +295,7 @@ def editar_aprendiz(id):
         aprendiz.correo = correo
         aprendiz.celular = celular
         if password:
-            aprendiz.password = generate_password_hash(password)
+            aprendiz.password_aprendiz = hashear(password)
 
         try:
             db.session.commit()
@@ -421,15 +372,9 @@ def enviar_mensaje():
         return redirect(url_for('aprendiz_bp.dashboard_aprendiz'))
 
     # Manejar archivo adjunto
+    adjunto = None
     if archivo and archivo.filename:
-        import os
-        from werkzeug.utils import secure_filename
-        upload_folder = os.path.join('app', 'static', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-        filename = secure_filename(archivo.filename)
-        archivo_path = os.path.join(upload_folder, filename)
-        archivo.save(archivo_path)
-        mensaje += f"\n\nArchivo adjunto: {filename}"
+        adjunto = guardar_adjunto(archivo)
 
     # [OK] Caso 1: mensaje a usuario específico
     if destinatario_id:
@@ -462,7 +407,8 @@ def enviar_mensaje():
                 mensaje=mensaje,
                 motivo=motivo,
                 destinatario_id=destinatario_id,
-                rol_destinatario=rol_destinatario
+                rol_destinatario=rol_destinatario,
+                adjunto=adjunto
             )
 
             flash(
@@ -478,7 +424,8 @@ def enviar_mensaje():
             mensaje=mensaje,
             motivo=motivo,
             destinatario_id=None,
-            rol_destinatario=rol_destinatario
+            rol_destinatario=rol_destinatario,
+            adjunto=adjunto
         )
         flash(f"Mensaje general enviado a todos los {rol_destinatario.lower()}s.", "success")
 
@@ -492,30 +439,25 @@ def enviar_mensaje():
 @login_required
 @aprendiz_required
 def notificaciones():
-    pagina = request.args.get('pagina', 1, type=int)
-    per_page = 10
-
-    # Filtrar notificaciones que sean individuales o globales
-    pagination = Notificacion.query.filter(
-        Notificacion.rol_destinatario == "Aprendiz",
-        ((Notificacion.destinatario_id == current_user.id_aprendiz) |
-         (Notificacion.destinatario_id == None))
-    ).order_by(Notificacion.fecha_creacion.desc()).paginate(
-        page=pagina, per_page=per_page, error_out=False
+    # Página por cursor: sin COUNT ni OFFSET (directas y difusiones al rol)
+    archivadas = request.args.get('archivadas', type=int) == 1
+    pagina = paginar_bandeja(
+        current_user,
+        antes_de=request.args.get('antes_de', type=int),
+        despues_de=request.args.get('despues_de', type=int),
+        archivadas=archivadas
     )
+    notificaciones = pagina.items
 
-    notificaciones = pagination.items
-    total_paginas = pagination.pages
-
-    # Asignar remitente
-    for noti in notificaciones:
-        noti.remitente_nombre = obtener_remitente(noti)
+    # Nombre legible del remitente (un IN por rol)
+    nombres_remitentes(notificaciones)
 
     return render_template(
         'notificacion/listar.html',
         notificaciones=notificaciones,
-        pagina_actual=pagina,
-        total_paginas=total_paginas,
+        leidas=ids_leidos(notificaciones, current_user),
+        pagina=pagina,
+        archivadas=archivadas,
         now=datetime.now()
     )
 
@@ -526,27 +468,28 @@ def notificaciones():
 @login_required
 @aprendiz_required
 def ver_notificacion(noti_id):
-    # Solo puede ver notificación que le pertenece
-    noti = Notificacion.query.filter(
-        Notificacion.id == noti_id,
-        Notificacion.rol_destinatario == 'Aprendiz',
-        Notificacion.destinatario_id == current_user.id_aprendiz
-    ).first_or_404()
-
-    if not noti.visto:
-        noti.visto = True
-        db.session.commit()
+    # Solo puede ver notificaciones propias o enviadas a todos los aprendices
+    if request.args.get('archivada', type=int) == 1:
+        noti = archivada_de(current_user, noti_id)
+    else:
+        noti = Notificacion.query.options(*CARGA_REFERENCIAS).filter(
+            Notificacion.id == noti_id,
+            filtro_bandeja(current_user)
+        ).first_or_404()
 
-    remitente_nombre = obtener_remitente(noti)
+    remitente_nombre = nombre_remitente(noti)
     fecha_local = noti.fecha_creacion - timedelta(hours=5)
 
-    return render_template(
+    pagina = render_template(
         'notificacion/ver_notificacion.html',
         notificacion=noti,
         remitente_nombre=remitente_nombre,
+        evidencia=noti.evidencia,
         now=datetime.now(),
         fecha_local=fecha_local
     )
+    registrar_lectura(noti, current_user)
+    return pagina
 
 # -------------------------------
 # Responder notificación
@@ -555,10 +498,9 @@ def ver_notificacion(noti_id):
 @login_required
 @aprendiz_required
 def responder_notificacion(noti_id):
-    noti = Notificacion.query.filter_by(
-        id=noti_id,
-        rol_destinatario='Aprendiz',
-        destinatario_id=current_user.id_aprendiz
+    noti = Notificacion.query.filter(
+        Notificacion.id == noti_id,
+        filtro_bandeja(current_user)
     ).first_or_404()
 
     if request.method == 'POST':
@@ -572,15 +514,9 @@ def responder_notificacion(noti_id):
             mensaje_respuesta = respuesta
 
             # Manejar archivo adjunto
+            adjunto = None
             if archivo and archivo.filename:
-                import os
-                from werkzeug.utils import secure_filename
-                upload_folder = os.path.join('app', 'static', 'uploads')
-                os.makedirs(upload_folder, exist_ok=True)
-                filename = secure_filename(archivo.filename)
-                archivo_path = os.path.join(upload_folder, filename)
-                archivo.save(archivo_path)
-                mensaje_respuesta += f"\n\nArchivo adjunto: {filename}"
+                adjunto = guardar_adjunto(archivo)
 
             nueva = Notificacion(
                 motivo=motivo_respuesta,
@@ -588,7 +524,8 @@ def responder_notificacion(noti_id):
                 remitente_id=remitente_id,
                 rol_remitente="Aprendiz",
                 destinatario_id=noti.remitente_id,
-                rol_destinatario=noti.rol_remitente
+                rol_destinatario=normalizar_rol(noti.rol_remitente),
+                adjunto=adjunto
             )
             db.session.add(nueva)
             db.session.commit()
@@ -606,11 +543,7 @@ def responder_notificacion(noti_id):
 @login_required
 @aprendiz_required
 def marcar_todas_notificaciones():
-    Notificacion.query.filter_by(
-        rol_destinatario='Aprendiz',
-        destinatario_id=current_user.id_aprendiz,
-        visto=False
-    ).update({Notificacion.visto: True})
+    marcar_todas_leidas(current_user)
     db.session.commit()
     flash('Todas las notificaciones han sido marcadas como vistas.', 'modal')
     return redirect(url_for('aprendiz_bp.notificaciones'))
@@ -644,15 +577,15 @@ def subir_evidencia(num):
     original_name = secure_filename(archivo.filename)
     extension = os.path.splitext(original_name)[1].lower()
 
-    filename = f"evidencia_{current_user.id_aprendiz}_{num}_{datetime.now().strftime('%Y%m%d%H%M%S')}{extension}"
-    path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-
-    archivo.save(path)
+    # Va al almacén de evidencias (fuera de static), como en evidencia_bp
+    clave, sha256, tamano = guardar_blob(archivo)
 
     evidencia = Evidencia(
         aprendiz_id_aprendiz=current_user.id_aprendiz,
         num_evidencia=num,
-        url_archivo=filename,
+        url_archivo=clave,
+        sha256=sha256,
+        tamano=tamano,
         fecha_subida=datetime.now()
     )
     db.session.add(evidencia)
@@ -1,12 +1,17 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from app.models.users import Aprendiz, Instructor, Contrato, Programa, Administrador, AdministradorSede, Evidencia, PasswordResetToken, Notificacion, Ficha
+from app.models.users import Aprendiz, Instructor, Contrato, Programa, Administrador, AdministradorSede, Ficha
 from app import db
+from app.services.identidad import buscar_por_documento, buscar_por_correo, campo_en_uso, campos_de
+from app.services.hashing import hashear, verificar_password
+from app.services.limitador import limitar_intentos
+from app.services.correo import encolar_correo
+from app.services.resumen_evidencias import resumen_de, TOTAL_REQUERIDO
+from app.services.notificaciones import difundir
+from app.services.tokens_reset import generar_token_reset, leer_token_reset, usuario_del_token
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import or_
-from datetime import datetime, date, timedelta
-import secrets
+from datetime import datetime, date
 import re
 import os
 
@@ -15,6 +20,7 @@ bp = Blueprint('auth', __name__, url_prefix='/auth')
 
 # --- LOGIN GENERAL UNIFICADO ---
 @bp.route('/login', methods=['GET', 'POST'])
+@limitar_intentos('documento')
 def login():
     if current_user.is_authenticated:
         # Redirigir según rol
@@ -37,22 +43,11 @@ def login():
             flash('El documento y la contraseña son obligatorios.', 'warning')
             return redirect(url_for('auth.login'))
 
-        # Buscar usuario en todos los roles
-        user = (Administrador.query.filter_by(documento=documento).first() or
-                AdministradorSede.query.filter_by(documento=documento).first() or
-                Instructor.query.filter_by(documento=documento).first() or
-                Aprendiz.query.filter_by(documento=documento).first())
+        # Buscar usuario en todos los roles (una consulta al índice de identidades)
+        user = buscar_por_documento(documento)
 
         if user:
-            # Campo de contraseña según tipo
-            if isinstance(user, (Administrador, AdministradorSede)):
-                password_field = 'password'
-            elif isinstance(user, Instructor):
-                password_field = 'password_instructor'
-            else:  # Aprendiz
-                password_field = 'password_aprendiz'
-
-            if check_password_hash(getattr(user, password_field), password):
+            if verificar_password(user, password):
                 login_user(user)
                 flash('Inicio de sesión exitoso', 'success')
 
@@ -79,15 +74,10 @@ def login():
 def dashboard():
     if isinstance(current_user, Aprendiz):
         aprendiz = current_user
-        total_requerido = 17
-
-        # Contar solo evidencias realmente subidas
-        evidencias_subidas = (
-            db.session.query(Evidencia)
-            .filter_by(aprendiz_id_aprendiz=aprendiz.id_aprendiz)
-            .filter(Evidencia.fecha_subida.isnot(None), Evidencia.url_archivo != '')
-            .count()
-        )
+        total_requerido = TOTAL_REQUERIDO
+
+        # Solo evidencias realmente subidas (resumen mantenido al subir y eliminar)
+        evidencias_subidas = resumen_de(aprendiz.id_aprendiz).subidas
 
         progreso = int((evidencias_subidas / total_requerido) * 100) if total_requerido > 0 else 0
 
@@ -197,35 +187,22 @@ def registro_aprendiz():
         sede = ficha.sede_rel
         instructor = programa.instructor_rel
 
-        # Verificar unicidad global (todos los tipos de usuario)
-        from app.models.users import Administrador, Instructor
-
-        # Verificar documento en todos los modelos
-        documento_existe = (Aprendiz.query.filter_by(documento=documento).first() or
-                            Administrador.query.filter_by(documento=documento).first() or
-                            Instructor.query.filter_by(documento=documento).first())
-
-        # Verificar email (solo en modelos que tienen email)
-        email_existe = (Aprendiz.query.filter_by(correo=correo).first() or
-                        Instructor.query.filter_by(correo_instructor=correo).first())
+        # Verificar unicidad global (todos los tipos de usuario) en el índice de identidades
+        campo_duplicado = campo_en_uso(documento=documento, correo=correo, celular=celular)
 
-        # Verificar celular (solo en modelos que tienen celular)
-        celular_existe = (Aprendiz.query.filter_by(celular=celular).first() or
-                          Instructor.query.filter_by(celular_instructor=celular).first())
-
-        if documento_existe:
+        if campo_duplicado == 'documento':
             flash('Error: Ya existe un usuario con ese documento.', 'danger')
             return redirect(url_for('auth.registro_aprendiz'))
 
-        if email_existe:
+        if campo_duplicado == 'correo':
             flash('Error: Ya existe un usuario con ese email.', 'danger')
             return redirect(url_for('auth.registro_aprendiz'))
 
-        if celular_existe:
+        if campo_duplicado == 'celular':
             flash('Error: Ya existe un usuario con ese número de celular.', 'danger')
             return redirect(url_for('auth.registro_aprendiz'))
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = hashear(password)
         nuevo = Aprendiz(
             nombre=nombre,
             apellido=apellido,
@@ -246,19 +223,14 @@ def registro_aprendiz():
             # Notificación al administrador principal
             mensaje_notificacion = f"El aprendiz {nuevo.nombre} {nuevo.apellido} se ha registrado exitosamente con ficha {ficha_numero_int}."
 
-            # Buscar administradores para notificar
-            administradores = Administrador.query.all()
-            for admin in administradores:
-                notificacion = Notificacion(
-                    motivo="Registro de aprendiz",
-                    mensaje=mensaje_notificacion,
-                    remitente_id=nuevo.id_aprendiz,
-                    rol_remitente="aprendiz",
-                    destinatario_id=admin.id_admin,
-                    rol_destinatario="administrador"
-                )
-                db.session.add(notificacion)
-
+            # Una sola notificación para todos los administradores
+            difundir(
+                "Administrador",
+                motivo="Registro de aprendiz",
+                mensaje=mensaje_notificacion,
+                remitente_id=nuevo.id_aprendiz,
+                rol_remitente="Aprendiz"
+            )
             db.session.commit()
 
             flash('Aprendiz registrado con éxito.', 'success')
@@ -309,35 +281,22 @@ def instructor():
             flash("El token ha expirado.", "danger")
             return redirect(url_for('auth.instructor'))
 
-        # Verificar unicidad global (todos los tipos de usuario)
-        from app.models.users import Administrador, Aprendiz
-
-        # Verificar documento en todos los modelos
-        documento_existe = (Instructor.query.filter_by(documento=documento).first() or
-                            Administrador.query.filter_by(documento=documento).first() or
-                            Aprendiz.query.filter_by(documento=documento).first())
+        # Verificar unicidad global (todos los tipos de usuario) en el índice de identidades
+        campo_duplicado = campo_en_uso(documento=documento, correo=correo, celular=celular)
 
-        # Verificar email (solo en modelos que tienen email)
-        email_existe = (Instructor.query.filter_by(correo_instructor=correo).first() or
-                        Aprendiz.query.filter_by(correo=correo).first())
-
-        # Verificar celular (solo en modelos que tienen celular)
-        celular_existe = (Instructor.query.filter_by(celular_instructor=celular).first() or
-                          Aprendiz.query.filter_by(celular=celular).first())
-
-        if documento_existe:
+        if campo_duplicado == 'documento':
             flash('Error: Ya existe un usuario con ese documento.', 'danger')
             return redirect(url_for('auth.instructor'))
 
-        if email_existe:
+        if campo_duplicado == 'correo':
             flash('Error: Ya existe un usuario con ese correo.', 'danger')
             return redirect(url_for('auth.instructor'))
 
-        if celular_existe:
+        if campo_duplicado == 'celular':
             flash('Error: Ya existe un usuario con ese número de celular.', 'danger')
             return redirect(url_for('auth.instructor'))
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = hashear(password)
         # Usar sede del formulario si se proporciona, sino la del token
         sede_id_final = sede.id_sede if sede else token.sede_id
 
@@ -357,18 +316,13 @@ def instructor():
             db.session.commit()
 
             # Notificación a administradores
-            administradores = Administrador.query.all()
-            for admin in administradores:
-                noti = Notificacion(
-                    motivo="Se ha registrado un nuevo Instructor",
-                    mensaje=f"{nuevo.nombre_instructor} {nuevo.apellido_instructor} en la sede {sede.nombre_sede}",
-                    remitente_id=nuevo.id_instructor,
-                    rol_remitente="Instructor",
-                    destinatario_id=admin.id_admin,
-                    rol_destinatario="administrador",
-                    visto=False
-                )
-                db.session.add(noti)
+            difundir(
+                "Administrador",
+                motivo="Se ha registrado un nuevo Instructor",
+                mensaje=f"{nuevo.nombre_instructor} {nuevo.apellido_instructor} en la sede {sede.nombre_sede}",
+                remitente_id=nuevo.id_instructor,
+                rol_remitente="Instructor"
+            )
             db.session.commit()
 
             flash('Instructor creado exitosamente.', 'success')
@@ -383,59 +337,12 @@ def instructor():
 
 # --- FUNCIONES AUXILIARES PARA RECUPERACIÓN DE CONTRASEÑA ---
 
-def generate_reset_token():
-    """Genera un token único para recuperación de contraseña"""
-    return secrets.token_urlsafe(32)
-
-def find_user_by_email(email):
-    """Busca un usuario por email en todos los tipos de usuario"""
-    # Buscar en Aprendiz
-    user = Aprendiz.query.filter_by(correo=email).first()
-    if user:
-        return user, 'aprendiz'
-
-    # Buscar en Instructor
-    user = Instructor.query.filter_by(correo_instructor=email).first()
-    if user:
-        return user, 'instructor'
-
-    # Eliminado: Coordinador ya no existe
-
-    # Buscar en Administrador
-    user = Administrador.query.filter_by(correo=email).first()
-    if user:
-        return user, 'administrador'
-
-    return None, None
-
 def send_reset_email(email, reset_url):
-    """Envía el email de recuperación de contraseña usando SMTP"""
-    from flask import current_app
-    from flask_mail import Message, Mail
-    import os
-
-    # Verificar configuración de email
-    mail_server = current_app.config.get('MAIL_SERVER')
-    mail_port = current_app.config.get('MAIL_PORT')
-    mail_username = current_app.config.get('MAIL_USERNAME')
-    mail_password = current_app.config.get('MAIL_PASSWORD')
-    mail_default_sender = current_app.config.get('MAIL_DEFAULT_SENDER')
-    mail_use_ssl = current_app.config.get('MAIL_USE_SSL')
-    mail_use_tls = current_app.config.get('MAIL_USE_TLS')
-
-    # Verificar que tengamos las credenciales necesarias
-    if not mail_username or not mail_password:
-        return False
-
-    try:
-        # Crear instancia de Mail si no existe
-        mail = Mail(current_app)
-
-        msg = Message(
-            subject='Recuperación de contraseña - SENA',
-            recipients=[email],
-            sender=mail_default_sender,
-            body=f"""
+    """Encola el email de recuperación de contraseña (lo envía `flask correo trabajador`)"""
+    encolar_correo(
+        destinatario=email,
+        asunto='Recuperación de contraseña - SENA',
+        cuerpo=f"""
 Hola,
 
 Has solicitado restablecer tu contraseña. Haz clic en el siguiente enlace para continuar:
@@ -448,19 +355,14 @@ Si no solicitaste este cambio, ignora este mensaje.
 
 Atentamente,
 Sistema SENA
-            """.strip()
-        )
-
-        mail.send(msg)
-        return True
-
-    except Exception as e:
-        return False
+        """.strip()
+    )
 
 # --- RUTAS PARA RECUPERACIÓN DE CONTRASEÑA ---
 
 
 @bp.route('/forgot_password', methods=['GET', 'POST'])
+@limitar_intentos('email')
 def forgot_password():
     """Página para solicitar recuperación de contraseña"""
     if request.method == 'POST':
@@ -475,194 +377,47 @@ def forgot_password():
             flash('Por favor ingresa un correo electrónico válido.', 'warning')
             return redirect(url_for('auth.forgot_password'))
 
-        # Buscar usuario por email
-        user, user_type = find_user_by_email(email)
+        # Buscar usuario por email en cualquier rol
+        user = buscar_por_correo(email)
 
         if not user:
             # Por seguridad, no revelamos si el email existe o no
             flash('Si tu correo electrónico está registrado, recibirás un enlace para restablecer tu contraseña.', 'info')
             return redirect(url_for('auth.login'))
 
-        # Generar token
-        token = generate_reset_token()
-        expires_at = datetime.utcnow() + timedelta(hours=1)  # Expira en 1 hora
-
-        # Crear registro del token
-        # Mapeo de atributos de ID por tipo de usuario
-        id_attr_map = {
-            'aprendiz': 'id_aprendiz',
-            'instructor': 'id_instructor',
-            'administrador': 'id_admin'
-        }
-        id_attr = id_attr_map.get(user_type, f'id_{user_type}')
-        user_id = getattr(user, id_attr)
-
-        reset_token = PasswordResetToken(
-            token=token,
-            email=email,
-            user_type=user_type,
-            user_id=user_id,
-            expires_at=expires_at
-        )
+        # El enlace es firmado: no se guarda nada en la base de datos
+        token = generar_token_reset(user)
+        reset_url = url_for('auth.reset_password', token=token, _external=True)
 
         try:
-            # Verificar que la tabla existe
-            from sqlalchemy import inspect
-            inspector = inspect(db.engine)
-            tables = inspector.get_table_names()
-            if 'password_reset_token' not in tables:
-                db.create_all()
-
-            db.session.add(reset_token)
+            send_reset_email(email, reset_url)
             db.session.commit()
-
-            # Generar URL de restablecimiento
-            reset_url = url_for('auth.reset_password', token=token, _external=True)
-
-            # Enviar email
-            email_sent = send_reset_email(email, reset_url)
-
-            if email_sent:
-                flash('Si tu correo electrónico está registrado, recibirás un enlace para restablecer tu contraseña.', 'info')
-            else:
-                flash('Hemos procesado tu solicitud, pero puede haber un problema temporal con el envío de emails. Contacta al administrador si no recibes el mensaje.', 'warning')
-
-            return redirect(url_for('auth.login'))
-
         except Exception as e:
             db.session.rollback()
             flash('Error al procesar la solicitud. Inténtalo de nuevo.', 'danger')
             return redirect(url_for('auth.forgot_password'))
 
+        flash('Si tu correo electrónico está registrado, recibirás un enlace para restablecer tu contraseña.', 'info')
+        return redirect(url_for('auth.login'))
+
     return render_template('forgot_password.html', now=datetime.now())
 
 
 @bp.route('/reset_password/<token>', methods=['GET', 'POST'])
+@limitar_intentos('token')
 def reset_password(token):
     """Página para restablecer contraseña usando token"""
-    import time
-    start_time = time.time()
-
-    # Validar que el token no esté vacío
-    if not token or len(token.strip()) == 0:
-        flash('El enlace de restablecimiento no es válido o ha expirado.', 'danger')
-        return redirect(url_for('auth.login'))
-
-    try:
-        # Verificar conexión a BD con timeout
-        db_start = time.time()
-
-        # Consulta simple para verificar conexión
-        from sqlalchemy import text
-        db.session.execute(text("SELECT 1")).first()
-        db_time = time.time() - db_start
-
-        # Buscar token válido con timeout y optimización
-        search_start = time.time()
-
-        reset_token = None
-
-        # Intentar múltiples veces con reintentos para manejar problemas de conectividad
-        max_retries = 3
-        retry_delay = 1  # segundos
-
-        for attempt in range(max_retries):
-            try:
-                # Usar consulta optimizada con timeout
-                from sqlalchemy import text
-
-                # Ejecutar consulta con timeout usando SQL directo para mejor control
-                query = text("""
-                    SELECT id, token, email, user_type, user_id, created_at, expires_at, used
-                    FROM password_reset_token
-                    WHERE token = :token AND used = 0
-                    LIMIT 1
-                """)
-
-                # Ejecutar con timeout
-                result = db.session.execute(query, {'token': token}).first()
-
-                if result:
-                    # Convertir resultado a objeto PasswordResetToken
-                    reset_token = PasswordResetToken(
-                        id=result[0],
-                        token=result[1],
-                        email=result[2],
-                        user_type=result[3],
-                        user_id=result[4],
-                        created_at=result[5],
-                        expires_at=result[6],
-                        used=result[7]
-                    )
-                    break
-                else:
-                    reset_token = None
-                    break
-
-            except Exception as query_error:
-                if attempt < max_retries - 1:
-                    import time
-                    time.sleep(retry_delay)
-                    continue
-
-                # Fallback a consulta ORM en el último intento
-                try:
-                    reset_token = (PasswordResetToken.query
-                                  .filter(PasswordResetToken.token == token)
-                                  .filter(PasswordResetToken.used == False)
-                                  .first())
-                    break
-                except Exception as orm_error:
-                    reset_token = None
-                    break
-
-        search_time = time.time() - search_start
-
-        # Verificar si la búsqueda tomó demasiado tiempo
-        if search_time > 30:  # Más de 30 segundos - timeout crítico
-            flash('La conexión está tardando demasiado. Inténtalo de nuevo en unos minutos.', 'warning')
-            return redirect(url_for('auth.login'))
-
-        if not reset_token:
-            # Verificar si existe pero está usado (consulta optimizada)
-            used_token = PasswordResetToken.query.filter_by(token=token).first()
-            if used_token:
-                if used_token.used:
-                    flash('Este enlace de restablecimiento ya ha sido utilizado.', 'danger')
-                else:
-                    flash('Error interno del sistema. Inténtalo de nuevo.', 'danger')
-            else:
-                flash('El enlace de restablecimiento no es válido o ha expirado.', 'danger')
-            return redirect(url_for('auth.login'))
-
-        # Verificar expiración con más detalle
-        is_expired = reset_token.is_expired()
-
-        if is_expired:
-            flash('El enlace de restablecimiento ha expirado. Solicita uno nuevo.', 'danger')
-            return redirect(url_for('auth.forgot_password'))
-
-        total_time = time.time() - start_time
-
-    except Exception as db_error:
-        error_time = time.time() - start_time
+    # Firma y vigencia se validan sin consultar la base de datos
+    datos, error = leer_token_reset(token)
 
-        # Intentar rollback si es necesario
-        try:
-            db.session.rollback()
-        except:
-            pass
-
-        flash('Error interno del servidor. La conexión está tardando demasiado. Inténtalo de nuevo.', 'danger')
-        return redirect(url_for('auth.login'))
-
-    # Verificar expiración con más detalle
-    is_expired = reset_token.is_expired()
-
-    if is_expired:
+    if error == 'expirado':
         flash('El enlace de restablecimiento ha expirado. Solicita uno nuevo.', 'danger')
         return redirect(url_for('auth.forgot_password'))
 
+    if error:
+        flash('El enlace de restablecimiento no es válido o ha expirado.', 'danger')
+        return redirect(url_for('auth.login'))
+
     if request.method == 'POST':
         password = request.form.get('password')
         confirm_password = request.form.get('confirm_password')
@@ -679,37 +434,15 @@ def reset_password(token):
             flash('Las contraseñas no coinciden.', 'warning')
             return redirect(url_for('auth.reset_password', token=token))
 
-        # Buscar usuario según tipo
-        user = None
-        if reset_token.user_type == 'aprendiz':
-            user = Aprendiz.query.get(reset_token.user_id)
-            password_field = 'password_aprendiz'
-        elif reset_token.user_type == 'instructor':
-            user = Instructor.query.get(reset_token.user_id)
-            password_field = 'password_instructor'
-        elif reset_token.user_type == 'administrador':
-            user = Administrador.query.get(reset_token.user_id)
-            password_field = 'password'
+        # Si la contraseña ya cambió, la huella del token deja de coincidir
+        user = usuario_del_token(datos)
 
         if not user:
-            flash('Usuario no encontrado.', 'danger')
+            flash('Este enlace de restablecimiento ya ha sido utilizado.', 'danger')
             return redirect(url_for('auth.login'))
 
         try:
-            # Usar transacción para evitar problemas de concurrencia
-            # Verificar nuevamente que el token no haya sido usado por otro usuario
-            if reset_token.used:
-                print(f"[ERROR] Token ya fue usado durante el procesamiento")
-                flash('Este enlace ya ha sido utilizado por otro usuario.', 'danger')
-                return redirect(url_for('auth.login'))
-
-            # Actualizar contraseña
-            hashed_password = generate_password_hash(password)
-            setattr(user, password_field, hashed_password)
-
-            # Marcar token como usado
-            reset_token.used = True
-
+            setattr(user, campos_de(user)['password'], hashear(password))
             db.session.commit()
 
             flash('Tu contraseña ha sido restablecida exitosamente. Ya puedes iniciar sesión.', 'success')
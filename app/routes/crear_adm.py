@@ -1,10 +1,10 @@
 # app/routes/crear_adm.py
 import sys
 from getpass import getpass
-from werkzeug.security import generate_password_hash
 
 from app import create_app, db
 from app.models.users import Administrador
+from app.services.hashing import hashear
 
 TIPOS_DOCUMENTO = [
     'Cedula de Ciudadania',
@@ -53,15 +53,14 @@ def crear_administrador():
         print("\n❌ Todos los campos son obligatorios.")
         sys.exit(1)
 
-    # Verificar si ya existe un administrador con el mismo correo o documento
-    existente = Administrador.query.filter(
-        (Administrador.correo == correo) | (Administrador.documento == documento)
-    ).first()
-    if existente:
-        print("\n❌ Ya existe un administrador con ese correo o documento.")
+    # Verificar si ya existe un usuario (de cualquier rol) con el mismo documento, correo o celular
+    from app.services.identidad import campo_en_uso
+    campo_duplicado = campo_en_uso(documento=documento, correo=correo, celular=celular)
+    if campo_duplicado:
+        print(f"\n❌ Ya existe un usuario con ese {campo_duplicado}.")
         sys.exit(1)
 
-    hashed_password = generate_password_hash(password)
+    hashed_password = hashear(password)
 
     admin = Administrador(
         nombre=nombre,
@@ -0,0 +1,59 @@
+# app/routes/estado_route.py
+import hmac
+from flask import Blueprint, jsonify, request, current_app
+from flask_login import current_user
+from app.models.users import Administrador
+from app.routes.adm_route import admin_required
+from app.services import carga_usuario, limitador, esquema, eventos, notificaciones, previas
+
+estado_bp = Blueprint('estado_bp', __name__, url_prefix='/estado')
+
+
+# -------------------------------
+# Salud del proceso (sin consultas: usa la verificación hecha al arrancar)
+# -------------------------------
+# Pública (balanceador, monitoreo): solo el estado, sin nombres de tablas ni columnas.
+@estado_bp.route('/salud')
+def salud():
+    resultado = esquema.estado_esquema()
+    if resultado is None:
+        return jsonify({'estado': 'sin_verificar'}), 200
+    if resultado['ok']:
+        return jsonify({'estado': 'ok'}), 200
+    return jsonify({'estado': 'degradado'}), 503
+
+
+def _puede_ver_detalle():
+    """Administrador con sesión, o la cabecera X-Estado-Token igual a ESTADO_TOKEN."""
+    if current_user.is_authenticated and isinstance(current_user, Administrador):
+        return True
+    token = current_app.config['ESTADO_TOKEN']
+    enviado = request.headers.get('X-Estado-Token', '')
+    return bool(token) and hmac.compare_digest(enviado.encode(), token.encode())
+
+
+# Detalle de la verificación del esquema (tablas y columnas faltantes)
+@estado_bp.route('/esquema')
+def detalle_esquema():
+    if not _puede_ver_detalle():
+        return jsonify({'error': 'Acceso denegado.'}), 403
+    resultado = esquema.estado_esquema()
+    if resultado is None:
+        return jsonify({'estado': 'sin_verificar'}), 200
+    estado = 'ok' if resultado['ok'] else 'degradado'
+    return jsonify({'estado': estado, 'esquema': resultado}), 200 if resultado['ok'] else 503
+
+
+# -------------------------------
+# Métricas internas del proceso (solo administrador)
+# -------------------------------
+@estado_bp.route('/metricas')
+@admin_required
+def metricas():
+    return jsonify({
+        'cache_usuarios': carga_usuario.estadisticas(),
+        'limitador': limitador.estadisticas(),
+        'eventos': eventos.estadisticas(),
+        'lecturas': notificaciones.estadisticas(),
+        'previas': previas.estadisticas(),
+    })
@@ -1,11 +1,21 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, current_app
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify,
+                   Response, stream_with_context, session)
 from flask_login import login_required, current_user
-from app.models.users import Evidencia, Aprendiz, Instructor
+from app.models.users import Evidencia, Aprendiz, Instructor, Ficha
 from app import db
 import os
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from datetime import date, datetime, timedelta
-from uuid import uuid4
+from app.services.subidas import preparar_subida, limite_para
+from app.services.blobs import (guardar_blob, confirmar_blob, clave_blob, clave_temporal, clave_miniatura, ruta_evidencia,
+                                url_evidencia, eliminar_archivo_heredado)
+from app.services.almacen import almacen, enviar_archivo
+from app.services.exportar import evidencias_para_zip, generar_zip
+from app.services.previas import generar_previa, previas_de
+from app.services.resumen_evidencias import resumen_de, TOTAL_REQUERIDO
+from app.services.reanudables import (iniciar_subida, estado_subida, agregar_bloque, completar_subida,
+                                      DesfaseSubida, ChecksumInvalido)
 
 bp = Blueprint('evidencia_bp', __name__, url_prefix='/evidencia')
 
@@ -129,38 +139,41 @@ def allowed_file(filename: str, tipo: str) -> bool:
     return ext in EXTENSIONES_PERMITIDAS.get(tipo, set())
 
 
+def mensaje_tamano(tipo: str) -> str:
+    limite = limite_para(tipo) or 0
+    return f'El archivo supera el tamaño máximo para {tipo.capitalize()} ({limite // (1024 * 1024)} MB).'
+
+
+@bp.errorhandler(RequestEntityTooLarge)
+def archivo_demasiado_grande(error):
+    # El cuerpo se cortó al pasar el límite (sin Content-Length); el parcial ya se borró
+    if request.method == 'PATCH':
+        return jsonify({'error': 'El bloque supera el tamaño máximo.'}), 413
+    flash('El archivo supera el tamaño máximo permitido.', 'danger')
+    return redirect(request.url)
+
+
 def puede_subir_archivo(aprendiz_id: int, tipo: str, sesion_excel: str = None) -> tuple[bool, str, str]:
     """
     Verifica si un aprendiz puede subir un archivo según las restricciones temporales.
     Retorna (puede_subir, mensaje_error, fecha_proxima)
     """
     hoy = date.today()
+    # Primeras subidas registradas (resumen por aprendiz)
+    resumen = resumen_de(aprendiz_id)
 
     # --- REGLAS ---
     if tipo == 'word':
         dias_restriccion = 90
-        # Buscar la primera subida registrada
-        primera_subida = db.session.query(Evidencia.primera_subida_word) \
-            .filter_by(aprendiz_id_aprendiz=aprendiz_id) \
-            .filter(Evidencia.primera_subida_word.isnot(None)) \
-            .first()
-        fecha_inicio = primera_subida[0] if primera_subida and primera_subida[0] else None
+        fecha_inicio = resumen.primera_subida_word
 
     elif tipo == 'excel' and sesion_excel == '15_dias':
         dias_restriccion = 15
-        primera_subida = db.session.query(Evidencia.primera_subida_excel_15) \
-            .filter_by(aprendiz_id_aprendiz=aprendiz_id) \
-            .filter(Evidencia.primera_subida_excel_15.isnot(None)) \
-            .first()
-        fecha_inicio = primera_subida[0] if primera_subida and primera_subida[0] else None
+        fecha_inicio = resumen.primera_subida_excel_15
 
     elif tipo == 'excel' and sesion_excel == '3_meses':
         dias_restriccion = 90
-        primera_subida = db.session.query(Evidencia.primera_subida_excel_3) \
-            .filter_by(aprendiz_id_aprendiz=aprendiz_id) \
-            .filter(Evidencia.primera_subida_excel_3.isnot(None)) \
-            .first()
-        fecha_inicio = primera_subida[0] if primera_subida and primera_subida[0] else None
+        fecha_inicio = resumen.primera_subida_excel_3
 
     elif tipo == 'pdf':
         # Nunca restringe
@@ -190,6 +203,21 @@ def puede_subir_archivo(aprendiz_id: int, tipo: str, sesion_excel: str = None) -
 # -------------------------------
 # LISTAR EVIDENCIAS
 # -------------------------------
+def evidencias_por_grupo(aprendiz_id):
+    """Evidencias del aprendiz repartidas como las muestra el listado, en una sola consulta."""
+    grupos = {'evidencias_word': [], 'evidencias_excel_15': [], 'evidencias_excel_3': [], 'evidencias_pdf': []}
+    for evidencia in Evidencia.query.filter_by(aprendiz_id_aprendiz=aprendiz_id).order_by(Evidencia.id_evidencia):
+        if evidencia.tipo == 'Word':
+            grupos['evidencias_word'].append(evidencia)
+        elif evidencia.tipo == 'Excel' and evidencia.sesion_excel == '15_dias':
+            grupos['evidencias_excel_15'].append(evidencia)
+        elif evidencia.tipo == 'Excel' and evidencia.sesion_excel == '3_meses':
+            grupos['evidencias_excel_3'].append(evidencia)
+        elif evidencia.tipo == 'Pdf':
+            grupos['evidencias_pdf'].append(evidencia)
+    return grupos
+
+
 @bp.route('/')
 @login_required
 def listar_evidencias():
@@ -209,17 +237,14 @@ def listar_evidencias():
 
     aprendiz = Aprendiz.query.get_or_404(aprendiz_id)
 
-    evidencias_word = Evidencia.query.filter_by(aprendiz_id_aprendiz=aprendiz.id_aprendiz, tipo='Word').all()
-    evidencias_excel_15 = Evidencia.query.filter_by(aprendiz_id_aprendiz=aprendiz.id_aprendiz, tipo='Excel', sesion_excel='15_dias').all()
-    evidencias_excel_3 = Evidencia.query.filter_by(aprendiz_id_aprendiz=aprendiz.id_aprendiz, tipo='Excel', sesion_excel='3_meses').all()
-    evidencias_pdf = Evidencia.query.filter_by(aprendiz_id_aprendiz=aprendiz.id_aprendiz, tipo='Pdf').all()
+    evidencias = evidencias_por_grupo(aprendiz.id_aprendiz)
 
     return render_template('evidencia/listar_evidencia.html',
                            aprendiz=aprendiz,
-                           evidencias_word=evidencias_word,
-                           evidencias_excel_15=evidencias_excel_15,
-                           evidencias_excel_3=evidencias_excel_3,
-                           evidencias_pdf=evidencias_pdf,
+                           resumen=resumen_de(aprendiz.id_aprendiz),
+                           total_requerido=TOTAL_REQUERIDO,
+                           previas=previas_de([e for grupo in evidencias.values() for e in grupo]),
+                           **evidencias,
                            now=datetime.now())
 
 
@@ -236,8 +261,10 @@ def serve_file(id):
         return redirect(url_for('evidencia_bp.listar_evidencias'))
 
     try:
-        unique_filename = os.path.basename(evidencia.url_archivo)
-        return send_from_directory(current_app.config['UPLOAD_FOLDER'], unique_filename, as_attachment=True, download_name=evidencia.nombre_archivo)
+        url = url_evidencia(evidencia)
+        if url:
+            return redirect(url)
+        return enviar_archivo(ruta_evidencia(evidencia), evidencia.nombre_archivo, adjunto=True)
     except FileNotFoundError:
         flash('El archivo no se encontró en el servidor.', 'danger')
     except Exception as e:
@@ -263,8 +290,10 @@ def view_file(id):
         return redirect(url_for('evidencia_bp.listar_evidencias'))
 
     try:
-        unique_filename = os.path.basename(evidencia.url_archivo)
-        return send_from_directory(current_app.config['UPLOAD_FOLDER'], unique_filename, as_attachment=False)
+        url = url_evidencia(evidencia, adjunto=False)
+        if url:
+            return redirect(url)
+        return enviar_archivo(ruta_evidencia(evidencia), evidencia.nombre_archivo, adjunto=False)
     except FileNotFoundError:
         flash('El archivo no se encontró en el servidor.', 'danger')
     except Exception as e:
@@ -273,6 +302,29 @@ def view_file(id):
     return redirect(url_for('evidencia_bp.listar_evidencias'))
 
 
+# -------------------------------
+# MINIATURA DE LA PREVIA
+# -------------------------------
+@bp.route('/miniatura/<int:id>')
+@login_required
+def miniatura(id):
+    evidencia = Evidencia.query.get_or_404(id)
+
+    if isinstance(current_user, Aprendiz) and evidencia.aprendiz_id_aprendiz != current_user.id_aprendiz:
+        return '', 403
+    if not evidencia.sha256:
+        return '', 404
+
+    clave = clave_miniatura(evidencia.sha256)
+    url = almacen().url_descarga(clave, 'miniatura.png', adjunto=False)
+    if url:
+        return redirect(url)
+    try:
+        return enviar_archivo(almacen().ruta_local(clave), 'miniatura.png', adjunto=False)
+    except FileNotFoundError:
+        return '', 404
+
+
 # -------------------------------
 # ELEGIR TIPO
 # -------------------------------
@@ -314,17 +366,43 @@ def upload_evidencia(tipo):
                                    fecha_proxima=fecha_proxima,
                                    now=datetime.now())
 
-        return render_template('evidencia/nueva_evidencia.html', tipo=tipo.capitalize(), now=datetime.now())
+        return render_template('evidencia/nueva_evidencia.html', tipo=tipo.capitalize(),
+                               subida_directa=almacen().subida_directa, now=datetime.now())
+
+    # POST → procesar subida (antes de leer el cuerpo: límite del tipo y destino final)
+    if not preparar_subida(tipo):
+        flash(mensaje_tamano(tipo), 'danger')
+        return redirect(request.url)
 
-    # POST → procesar subida
     archivo = request.files.get('archivo')
     nota = request.form.get('nota', '').strip()
+    # Con subida directa el archivo ya está en el bucket y el formulario trae su hash;
+    # la clave donde quedó es la que firmar_subida guardó en la sesión
+    sha256_directo = request.form.get('sha256')
+    directa = session.pop('subida_directa', None) if sha256_directo else None
+    if sha256_directo and not (almacen().subida_directa and directa and directa['tipo'] == tipo
+                               and directa['sha256'] == sha256_directo.lower()):
+        flash('La subida no existe o ya expiró; vuelve a seleccionar el archivo.', 'danger')
+        return redirect(request.url)
+    # Con subida por bloques el archivo ya está completo en instance/subidas
+    id_reanudable = request.form.get('reanudable')
+    reanudable = estado_subida(id_reanudable, current_user.id_aprendiz) if id_reanudable else None
+    if id_reanudable and (reanudable is None or reanudable['tipo'] != tipo):
+        flash('La subida no existe o ya expiró; vuelve a seleccionar el archivo.', 'danger')
+        return redirect(request.url)
 
-    if not archivo or not archivo.filename:
+    if reanudable:
+        nombre_recibido = reanudable['nombre']
+    elif sha256_directo:
+        nombre_recibido = request.form.get('nombre_archivo', '')
+    else:
+        nombre_recibido = archivo.filename if archivo else ''
+
+    if not nombre_recibido:
         flash('Debe seleccionar un archivo.', 'warning')
         return redirect(request.url)
 
-    if not allowed_file(archivo.filename, tipo):
+    if not allowed_file(nombre_recibido, tipo):
         allowed_text = {
             'word': '(.doc, .docx)',
             'excel': '(.xls, .xlsx)',
@@ -346,21 +424,22 @@ def upload_evidencia(tipo):
                                fecha_proxima=fecha_proxima,
                                now=datetime.now())
 
-    evidencias_subidas = Evidencia.query.filter_by(aprendiz_id_aprendiz=current_user.id_aprendiz).filter(
-        Evidencia.fecha_subida.isnot(None),
-        Evidencia.url_archivo != ''
-    ).count()
-    if evidencias_subidas >= 17:
-        flash('Has alcanzado el máximo de 17 evidencias subidas.', 'danger')
+    resumen = resumen_de(current_user.id_aprendiz)
+    if resumen.subidas >= TOTAL_REQUERIDO:
+        flash(f'Has alcanzado el máximo de {TOTAL_REQUERIDO} evidencias subidas.', 'danger')
         return redirect(url_for('evidencia_bp.listar_evidencias'))
 
-    original_name = secure_filename(archivo.filename)
+    original_name = secure_filename(nombre_recibido)
     ext = original_name.rsplit('.', 1)[1].lower()
-    unique_name = f"{uuid4().hex}_{original_name}"
-    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_name)
 
     try:
-        archivo.save(filepath)
+        # Un solo archivo por contenido: subir lo mismo otra vez no ocupa más disco
+        if reanudable:
+            filepath, sha256, tamano = completar_subida(id_reanudable, reanudable)
+        elif sha256_directo:
+            filepath, sha256, tamano = confirmar_blob(directa, limite_para(tipo))
+        else:
+            filepath, sha256, tamano = guardar_blob(archivo)
     except Exception as e:
         flash(f'Error al guardar el archivo: {str(e)}', 'danger')
         return redirect(request.url)
@@ -376,6 +455,8 @@ def upload_evidencia(tipo):
         evidencia.formato = ext
         evidencia.nombre_archivo = original_name
         evidencia.url_archivo = filepath
+        evidencia.sha256 = sha256
+        evidencia.tamano = tamano
         evidencia.fecha_subida = date.today()
         evidencia.nota = nota if nota else None
     else:
@@ -383,6 +464,8 @@ def upload_evidencia(tipo):
             formato=ext,
             nombre_archivo=original_name,
             url_archivo=filepath,
+            sha256=sha256,
+            tamano=tamano,
             fecha_subida=date.today(),
             tipo=tipo.capitalize(),
             nota=nota if nota else None,
@@ -393,31 +476,20 @@ def upload_evidencia(tipo):
     hoy = date.today()
 
     if tipo == 'word':
-        existing_word = db.session.query(Evidencia.primera_subida_word)\
-            .filter_by(aprendiz_id_aprendiz=current_user.id_aprendiz)\
-            .filter(Evidencia.primera_subida_word.isnot(None))\
-            .first()
-        evidencia.primera_subida_word = existing_word[0] if existing_word else hoy
+        evidencia.primera_subida_word = resumen.primera_subida_word or hoy
 
     elif tipo == 'excel':
         sesion_excel = request.form.get('sesion_excel', '15_dias')
         evidencia.sesion_excel = sesion_excel
 
         if sesion_excel == '15_dias':
-            existing_15 = db.session.query(Evidencia.primera_subida_excel_15)\
-                .filter_by(aprendiz_id_aprendiz=current_user.id_aprendiz)\
-                .filter(Evidencia.primera_subida_excel_15.isnot(None))\
-                .first()
-            evidencia.primera_subida_excel_15 = existing_15[0] if existing_15 else hoy
+            evidencia.primera_subida_excel_15 = resumen.primera_subida_excel_15 or hoy
 
         elif sesion_excel == '3_meses':
-            existing_3 = db.session.query(Evidencia.primera_subida_excel_3)\
-                .filter_by(aprendiz_id_aprendiz=current_user.id_aprendiz)\
-                .filter(Evidencia.primera_subida_excel_3.isnot(None))\
-                .first()
-            evidencia.primera_subida_excel_3 = existing_3[0] if existing_3 else hoy
+            evidencia.primera_subida_excel_3 = resumen.primera_subida_excel_3 or hoy
 
     db.session.commit()
+    generar_previa(evidencia)
 
     from app.models.users import Notificacion
     try:
@@ -429,7 +501,7 @@ def upload_evidencia(tipo):
                 tipo_archivo = f"Excel ({'15 días' if sesion_excel == '15_dias' else '3 meses'})"
 
             motivo = "Nueva Evidencia subida"
-            mensaje = f"El aprendiz {current_user.nombre} {current_user.apellido} ha Subido una nueva evidencia (ID: {evidencia.id_evidencia})."
+            mensaje = f"El aprendiz {current_user.nombre} {current_user.apellido} ha Subido una nueva evidencia ({tipo_archivo})."
 
             notificacion = Notificacion(
                 motivo=motivo,
@@ -438,6 +510,8 @@ def upload_evidencia(tipo):
                 rol_remitente="Aprendiz",
                 destinatario_id=instructor.id_instructor,
                 rol_destinatario="Instructor",
+                evidencia_id=evidencia.id_evidencia,
+                aprendiz_id=current_user.id_aprendiz,
                 visto=False
             )
             db.session.add(notificacion)
@@ -448,6 +522,110 @@ def upload_evidencia(tipo):
     flash('Evidencia subida con éxito [OK]', 'modal')
     return redirect(url_for('evidencia_bp.listar_evidencias'))
 
+
+# -------------------------------
+# SUBIDA DIRECTA AL BUCKET
+# -------------------------------
+@bp.route('/upload/<string:tipo>/firmar', methods=['POST'])
+@login_required
+def firmar_subida(tipo):
+    """
+    El navegador envía {sha256, tamano, nombre} y recibe la URL firmada para hacer
+    PUT a una clave temporal propia (temporales/<aprendiz>/<uuid>), o {existe: true}
+    si ese contenido ya es de una de sus evidencias. La clave queda en la sesión;
+    upload_evidencia la verifica y la pasa a blobs/ al recibir el formulario.
+    """
+    if not isinstance(current_user, Aprendiz) or tipo not in EXTENSIONES_PERMITIDAS:
+        return jsonify({'error': 'Acceso denegado.'}), 403
+    if not almacen().subida_directa:
+        return jsonify({'error': 'Subida directa no disponible.'}), 404
+
+    datos = request.get_json(silent=True) or {}
+    sha256 = str(datos.get('sha256', '')).lower()
+    tamano = datos.get('tamano')
+    if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256) or not isinstance(tamano, int):
+        return jsonify({'error': 'Datos del archivo inválidos.'}), 400
+    if not allowed_file(str(datos.get('nombre', '')), tipo):
+        return jsonify({'error': 'Tipo de archivo inválido.'}), 400
+    limite = limite_para(tipo)
+    if limite is not None and tamano > limite:
+        return jsonify({'error': mensaje_tamano(tipo)}), 413
+
+    directa = {'tipo': tipo, 'sha256': sha256, 'tamano': tamano}
+    # Solo se salta el PUT si el aprendiz ya tiene ese archivo: no revela qué guardaron otros
+    clave = clave_blob(sha256)
+    propio = db.session.query(Evidencia.query.filter_by(
+        aprendiz_id_aprendiz=current_user.id_aprendiz, url_archivo=clave
+    ).exists()).scalar()
+    if propio and almacen().existe(clave):
+        session['subida_directa'] = directa
+        return jsonify({'existe': True})
+
+    directa['temporal'] = clave_temporal(current_user.id_aprendiz)
+    session['subida_directa'] = directa
+    return jsonify(almacen().firmar_subida(directa['temporal'], sha256, tamano))
+
+
+# -------------------------------
+# SUBIDA POR BLOQUES (REANUDABLE)
+# -------------------------------
+# 1. POST /reanudable/<tipo> con {nombre, tamano} → id de la subida.
+# 2. PATCH /reanudable/subida/<id> por cada bloque, con las cabeceras Upload-Offset
+#    y Upload-Checksum ("sha256 <base64>"). Si la conexión se corta, HEAD dice
+#    desde qué byte seguir.
+# 3. El formulario de upload_evidencia se envía con reanudable=<id>; ahí se aplican
+#    las restricciones y el tope de evidencias, una sola vez.
+@bp.route('/reanudable/<string:tipo>', methods=['POST'])
+@login_required
+def iniciar_reanudable(tipo):
+    if not isinstance(current_user, Aprendiz) or tipo not in EXTENSIONES_PERMITIDAS:
+        return jsonify({'error': 'Acceso denegado.'}), 403
+
+    datos = request.get_json(silent=True) or {}
+    nombre = secure_filename(str(datos.get('nombre', '')))
+    tamano = datos.get('tamano')
+    if not isinstance(tamano, int) or tamano <= 0:
+        return jsonify({'error': 'Tamaño de archivo inválido.'}), 400
+    if not allowed_file(nombre, tipo):
+        return jsonify({'error': 'Tipo de archivo inválido.'}), 400
+    limite = limite_para(tipo)
+    if limite is not None and tamano > limite:
+        return jsonify({'error': mensaje_tamano(tipo)}), 413
+
+    id_subida = iniciar_subida(current_user.id_aprendiz, tipo, nombre, tamano)
+    url = url_for('evidencia_bp.bloque_reanudable', id_subida=id_subida)
+    return jsonify({'id': id_subida, 'offset': 0, 'url': url}), 201, {'Location': url}
+
+
+@bp.route('/reanudable/subida/<string:id_subida>', methods=['GET', 'PATCH'])
+@login_required
+def bloque_reanudable(id_subida):
+    estado = estado_subida(id_subida, getattr(current_user, 'id_aprendiz', None))
+    if estado is None:
+        return jsonify({'error': 'La subida no existe o ya expiró.'}), 404
+
+    if request.method == 'GET':
+        return jsonify({'offset': estado['offset'], 'tamano': estado['tamano']}), 200, {
+            'Upload-Offset': str(estado['offset']), 'Upload-Length': str(estado['tamano']),
+            'Cache-Control': 'no-store',
+        }
+
+    request.max_content_length = current_app.config['SUBIDAS_BLOQUE_MAX']
+    algoritmo, _, checksum = request.headers.get('Upload-Checksum', '').partition(' ')
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        if algoritmo != 'sha256':
+            raise ChecksumInvalido('Solo se acepta Upload-Checksum sha256.')
+        offset = agregar_bloque(id_subida, estado, offset, request.stream, checksum)
+    except DesfaseSubida as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), 409, {'Upload-Offset': str(e.offset)}
+    except ChecksumInvalido as e:
+        # 460 es el código de tus para "Checksum Mismatch"
+        return jsonify({'error': str(e)}), 460, {'Upload-Offset': str(estado['offset'])}
+    except ValueError as e:
+        return jsonify({'error': str(e) or 'Cabeceras inválidas.'}), 400
+    return '', 204, {'Upload-Offset': str(offset)}
+
 # --- EDITAR EVIDENCIA ---
 @bp.route('/editar/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -461,6 +639,10 @@ def editar_evidencia(id):
         return redirect(url_for('evidencia_bp.listar_evidencias'))
 
     if request.method == 'POST':
+        if not preparar_subida(evidencia.tipo):
+            flash(mensaje_tamano(evidencia.tipo), 'danger')
+            return redirect(request.url)
+
         nota = request.form.get('nota', '').strip()
         evidencia.nota = nota if nota else None
         evidencia.fecha_subida = date.today()
@@ -479,27 +661,25 @@ def editar_evidencia(id):
 
             original_name = secure_filename(archivo.filename)
             ext = original_name.rsplit('.', 1)[1].lower()
-            unique_name = f"{uuid4().hex}_{original_name}"
-            new_filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_name)
 
             try:
-                archivo.save(new_filepath)
+                new_filepath, sha256, tamano = guardar_blob(archivo)
             except Exception as e:
                 flash(f'Error al guardar el archivo nuevo: {str(e)}', 'danger')
                 return redirect(request.url)
 
-            # Eliminar archivo previo si existe
-            try:
-                if evidencia.url_archivo and os.path.exists(evidencia.url_archivo):
-                    os.remove(evidencia.url_archivo)
-            except Exception:
-                pass
+            # Eliminar archivo previo (los blobs se liberan al quedar sin referencias)
+            eliminar_archivo_heredado(evidencia.url_archivo)
 
             evidencia.url_archivo = new_filepath
             evidencia.nombre_archivo = original_name
             evidencia.formato = ext
+            evidencia.sha256 = sha256
+            evidencia.tamano = tamano
 
         db.session.commit()
+        if archivo and archivo.filename:
+            generar_previa(evidencia)
         flash('Evidencia actualizada correctamente [OK]', 'success')
         return redirect(url_for('evidencia_bp.listar_evidencias'))
 
@@ -515,11 +695,7 @@ def eliminar_evidencia(id):
         flash('Acceso denegado.', 'danger')
         return redirect(url_for('evidencia_bp.listar_evidencias'))
 
-    try:
-        if evidencia.url_archivo and os.path.exists(evidencia.url_archivo):
-            os.remove(evidencia.url_archivo)
-    except Exception:
-        pass
+    eliminar_archivo_heredado(evidencia.url_archivo)
 
     db.session.delete(evidencia)
     db.session.commit()
@@ -536,15 +712,50 @@ def evidencias_aprendiz(id_aprendiz):
 
     aprendiz = Aprendiz.query.get_or_404(id_aprendiz)
 
-    evidencias_word = Evidencia.query.filter_by(aprendiz_id_aprendiz=aprendiz.id_aprendiz, tipo='Word').all()
-    evidencias_excel_15 = Evidencia.query.filter_by(aprendiz_id_aprendiz=aprendiz.id_aprendiz, tipo='Excel', sesion_excel='15_dias').all()
-    evidencias_excel_3 = Evidencia.query.filter_by(aprendiz_id_aprendiz=aprendiz.id_aprendiz, tipo='Excel', sesion_excel='3_meses').all()
-    evidencias_pdf = Evidencia.query.filter_by(aprendiz_id_aprendiz=aprendiz.id_aprendiz, tipo='Pdf').all()
+    evidencias = evidencias_por_grupo(aprendiz.id_aprendiz)
 
     return render_template('evidencia/listar_evidencia.html',
                             aprendiz=aprendiz,
-                            evidencias_word=evidencias_word,
-                            evidencias_excel_15=evidencias_excel_15,
-                            evidencias_excel_3=evidencias_excel_3,
-                            evidencias_pdf=evidencias_pdf,
+                            resumen=resumen_de(aprendiz.id_aprendiz),
+                            total_requerido=TOTAL_REQUERIDO,
+                            previas=previas_de([e for grupo in evidencias.values() for e in grupo]),
+                            **evidencias,
                             now=datetime.now())
+
+
+# --- DESCARGAR EVIDENCIAS EN ZIP (INSTRUCTOR) ---
+def respuesta_zip(filas, nombre, por_aprendiz=False):
+    # La lista de evidencias ya está en memoria: se libera la conexión antes de la descarga
+    db.session.commit()
+    return Response(
+        stream_with_context(generar_zip(filas, por_aprendiz=por_aprendiz)),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename="{nombre}"',
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+
+@bp.route('/aprendiz/<int:id_aprendiz>/zip')
+@login_required
+def evidencias_aprendiz_zip(id_aprendiz):
+    if not isinstance(current_user, Instructor):
+        flash('Acceso denegado.', 'danger')
+        return redirect(url_for('auth.dashboard'))
+
+    aprendiz = Aprendiz.query.get_or_404(id_aprendiz)
+    filas = evidencias_para_zip(aprendiz_id=aprendiz.id_aprendiz)
+    return respuesta_zip(filas, secure_filename(f"evidencias_{aprendiz.documento}.zip"))
+
+
+@bp.route('/ficha/<int:id_ficha>/zip')
+@login_required
+def evidencias_ficha_zip(id_ficha):
+    if not isinstance(current_user, Instructor):
+        flash('Acceso denegado.', 'danger')
+        return redirect(url_for('auth.dashboard'))
+
+    ficha = Ficha.query.get_or_404(id_ficha)
+    filas = evidencias_para_zip(ficha_id=ficha.id_ficha)
+    return respuesta_zip(filas, f"evidencias_ficha_{ficha.numero_ficha}.zip", por_aprendiz=True)
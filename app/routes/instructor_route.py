@@ -2,7 +2,10 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app.models.users import Instructor, Aprendiz, TokenInstructor, Notificacion, Administrador, Contrato, Programa, Sede, AdministradorSede
 from app import db
-from werkzeug.security import generate_password_hash
+from app.services.identidad import campo_en_uso
+from app.services.hashing import hashear
+from app.services.notificaciones import CARGA_REFERENCIAS, paginar_bandeja, nombres_remitentes, nombre_remitente, difundir, contar_no_leidas, ids_leidos, registrar_lectura, marcar_todas_leidas, archivada_de, normalizar_rol
+from app.services.almacen import guardar_adjunto
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import or_
 from datetime import datetime, date, timedelta
@@ -25,7 +28,7 @@ def ver_progreso_aprendiz(aprendiz_id):
 # -------------------------------
 # Función para enviar notificación
 # -------------------------------
-def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, motivo=None):
+def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, motivo=None, adjunto=None):
     noti = Notificacion(
         motivo=motivo,
         mensaje=mensaje,
@@ -33,44 +36,12 @@ def enviar_notificacion(mensaje, destinatario_id=None, rol_destinatario=None, mo
         rol_remitente="Instructor",
         destinatario_id=destinatario_id,
         rol_destinatario=rol_destinatario,
+        adjunto=adjunto,
         visto=False
     )
     db.session.add(noti)
     db.session.commit()
 
-# -------------------------------
-# Función para obtener nombre del remitente
-# -------------------------------
-def obtener_remitente(noti):
-    """
-    Devuelve el nombre simple del remitente (sin prefijos como 'De: ').
-    Si no se encuentra el remitente, devuelve 'Sistema'.
-    """
-    role = (noti.rol_remitente or "").strip()
-
-    if role == "Instructor":
-        remitente = Instructor.query.filter_by(id_instructor=noti.remitente_id).first()
-        if remitente:
-            return f"{remitente.nombre_instructor} {remitente.apellido_instructor}"
-    elif role == "Aprendiz":
-        remitente = Aprendiz.query.filter_by(id_aprendiz=noti.remitente_id).first()
-        if remitente:
-            return f"{remitente.nombre} {remitente.apellido}"
-    elif role == "Administrador":
-        # Intentamos traer el nombre completo del administrador (si existe)
-        remitente = Administrador.query.filter_by(id_admin=noti.remitente_id).first()
-        if remitente:
-            # ajusta los atributos si tu modelo administrador usa otros nombres
-            return f"{getattr(remitente, 'nombre', 'Administrador')} {getattr(remitente, 'apellido', '')}".strip()
-    elif role == "Administrador Sede":
-        remitente = AdministradorSede.query.filter_by(id_admin_sede=noti.remitente_id).first()
-        if remitente:
-            return f"{remitente.nombre} {remitente.apellido}"
-
-    # Si no hay remitente encontrado o rol desconocido -> "Sistema"
-    return "Sistema"
-
-
 # -------------------------------
 # Dashboard del instructor
 # -------------------------------
@@ -95,11 +66,7 @@ def dashboard_instructor():
     administradores_sede = AdministradorSede.query.filter_by(sede_id=current_user.sede_id).all()
 
     # [OK] Notificaciones no leídas SOLO del instructor actual
-    notificaciones_no_leidas = Notificacion.query.filter(
-        Notificacion.rol_destinatario == "Instructor",
-        Notificacion.visto == False,
-        Notificacion.destinatario_id == current_user.id_instructor
-    ).count()
+    notificaciones_no_leidas = contar_no_leidas(current_user)
 
     # [OK] Aprendices que finalizan para armar eventos (SOLO de la misma sede)
     aprendices_finalizan = (
@@ -170,36 +137,23 @@ def nuevo_instructor():
             flash('El token no tiene una sede válida asignada.', 'danger')
             return redirect(url_for('instructor_bp.nuevo_instructor'))
 
-        # [OK] Validar duplicados globales (todos los tipos de usuario)
-        from app.models.users import Administrador, Aprendiz
-
-        # Verificar documento en todos los modelos
-        documento_existe = (Instructor.query.filter_by(documento=documento).first() or
-                            Administrador.query.filter_by(documento=documento).first() or
-                            Aprendiz.query.filter_by(documento=documento).first())
-
-        # Verificar email (solo en modelos que tienen email)
-        email_existe = (Instructor.query.filter_by(correo_instructor=correo).first() or
-                        Aprendiz.query.filter_by(correo=correo).first())
+        # [OK] Validar duplicados globales (todos los tipos de usuario) en el índice de identidades
+        campo_duplicado = campo_en_uso(documento=documento, correo=correo, celular=celular)
 
-        # Verificar celular (solo en modelos que tienen celular)
-        celular_existe = (Instructor.query.filter_by(celular_instructor=celular).first() or
-                          Aprendiz.query.filter_by(celular=celular).first())
-
-        if documento_existe:
+        if campo_duplicado == 'documento':
             flash('Ya existe un usuario con ese documento.', 'danger')
             return redirect(url_for('instructor_bp.nuevo_instructor'))
 
-        if email_existe:
+        if campo_duplicado == 'correo':
             flash('Ya existe un usuario con ese email.', 'danger')
             return redirect(url_for('instructor_bp.nuevo_instructor'))
 
-        if celular_existe:
+        if campo_duplicado == 'celular':
             flash('Ya existe un usuario con ese número de celular.', 'danger')
             return redirect(url_for('instructor_bp.nuevo_instructor'))
 
         # [OK] Crear instructor con la sede_id heredada del token
-        hashed_password = generate_password_hash(password)
+        hashed_password = hashear(password)
 
         # [SEARCH] Debug 1: valores que vienen del token
         print("DEBUG TOKEN:",
@@ -235,18 +189,13 @@ def nuevo_instructor():
                   "sede_id:", nuevo.sede_id)
 
             # Notificación a administradores
-            administradores = Administrador.query.all()
-            for admin in administradores:
-                noti = Notificacion(
-                    motivo="Se ha registrado un nuevo Instructor",
-                    mensaje=f"{nuevo.nombre_instructor} {nuevo.apellido_instructor} en la sede {sede.nombre_sede}",
-                    remitente_id=None,
-                    rol_remitente="Sistema",
-                    destinatario_id=admin.id_admin,
-                    rol_destinatario="administrador",
-                    visto=False
-                )
-                db.session.add(noti)
+            difundir(
+                "Administrador",
+                motivo="Se ha registrado un nuevo Instructor",
+                mensaje=f"{nuevo.nombre_instructor} {nuevo.apellido_instructor} en la sede {sede.nombre_sede}",
+                remitente_id=nuevo.id_instructor,
+                rol_remitente="Instructor"
+            )
             db.session.commit()
 
             flash('Instructor registrado con éxito.', 'success')
@@ -295,7 +244,7 @@ def editar_instructor(id):
         instructor.celular_instructor = celular
         instructor.sede_id = sede.id_sede
         if password:
-            instructor.password_instructor = generate_password_hash(password)
+            instructor.password_instructor = hashear(password)
 
         try:
             db.session.commit()
@@ -361,15 +310,9 @@ def enviar_mensaje():
         return redirect(url_for('instructor_bp.dashboard_instructor'))
 
     # Manejar archivo adjunto
+    adjunto = None
     if archivo and archivo.filename:
-        import os
-        from werkzeug.utils import secure_filename
-        upload_folder = os.path.join('app', 'static', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-        filename = secure_filename(archivo.filename)
-        archivo_path = os.path.join(upload_folder, filename)
-        archivo.save(archivo_path)
-        mensaje += f"\n\nArchivo adjunto: {filename}"
+        adjunto = guardar_adjunto(archivo)
 
     # Ajustar rol_destinatario para coincidir con el backend
     if rol_destinatario == "administrador_sede":
@@ -379,7 +322,8 @@ def enviar_mensaje():
         mensaje=mensaje,
         destinatario_id=destinatario_id if destinatario_id else None,
         rol_destinatario=rol_destinatario,
-        motivo=motivo
+        motivo=motivo,
+        adjunto=adjunto
     )
 
     flash(f"Mensaje enviado a {rol_destinatario}", "modal")
@@ -392,28 +336,25 @@ def enviar_mensaje():
 @bp.route('/notificaciones')
 @login_required
 def notificaciones():
-    # Página actual desde la query string
-    pagina = request.args.get('pagina', 1, type=int)
-    per_page = 10  # Notificaciones por página
-
-    # Query filtrando por instructor
-    pagination = Notificacion.query.filter(
-        Notificacion.rol_destinatario == "Instructor",
-        or_(Notificacion.destinatario_id == current_user.id_instructor, Notificacion.destinatario_id == None)
-    ).order_by(Notificacion.fecha_creacion.desc()).paginate(page=pagina, per_page=per_page, error_out=False)
-
-    notificaciones = pagination.items
-    total_paginas = pagination.pages
+    # Página por cursor: sin COUNT ni OFFSET (directas y difusiones al rol)
+    archivadas = request.args.get('archivadas', type=int) == 1
+    pagina = paginar_bandeja(
+        current_user,
+        antes_de=request.args.get('antes_de', type=int),
+        despues_de=request.args.get('despues_de', type=int),
+        archivadas=archivadas
+    )
+    notificaciones = pagina.items
 
-    # Asignar nombre legible del remitente
-    for noti in notificaciones:
-        noti.remitente_nombre = obtener_remitente(noti)
+    # Nombre legible del remitente (un IN por rol)
+    nombres_remitentes(notificaciones)
 
     return render_template(
         'notificacion/listar.html',
         notificaciones=notificaciones,
-        pagina_actual=pagina,
-        total_paginas=total_paginas,
+        leidas=ids_leidos(notificaciones, current_user),
+        pagina=pagina,
+        archivadas=archivadas,
         now=datetime.now()
     )
 from datetime import timedelta
@@ -421,39 +362,32 @@ from datetime import timedelta
 @bp.route('/notificacion/<int:noti_id>')
 @login_required
 def ver_notificacion(noti_id):
-    noti = Notificacion.query.get_or_404(noti_id)
-
-    # Marcar como visto
-    if noti.rol_destinatario == "Instructor" and not noti.visto:
-        noti.visto = True
-        db.session.commit()
+    # Evidencia y aprendiz referenciados en la misma consulta
+    if request.args.get('archivada', type=int) == 1:
+        noti = archivada_de(current_user, noti_id)
+    else:
+        noti = Notificacion.query.options(*CARGA_REFERENCIAS).filter_by(id=noti_id).first_or_404()
 
     # Obtener nombre del remitente
-    remitente_nombre = obtener_remitente(noti)
+    remitente_nombre = nombre_remitente(noti)
 
     # Calcular fecha_local (hora local)
     fecha_local = noti.fecha_creacion - timedelta(hours=5)  # ajustar según tu zona horaria
 
-    # Si es notificación de evidencia subida, extraer ID y obtener evidencia
-    evidencia = None
-    if noti.motivo == "Nueva Evidencia subida" and "(ID: " in noti.mensaje:
-        try:
-            id_str = noti.mensaje.split("(ID: ")[1].split(")")[0]
-            evidencia_id = int(id_str)
-            from app.models.users import Evidencia
-            evidencia = Evidencia.query.get(evidencia_id)
-        except (ValueError, IndexError):
-            evidencia = None
-
-    return render_template(
+    pagina = render_template(
         'notificacion/ver_notificacion.html',
         notificacion=noti,
         remitente_nombre=remitente_nombre,
-        evidencia=evidencia,
+        evidencia=noti.evidencia,
         now=datetime.now(),
         fecha_local=fecha_local
     )
 
+    # Marcar como visto
+    if noti.rol_destinatario == "Instructor":
+        registrar_lectura(noti, current_user)
+    return pagina
+
 
 # Responder notificación (Instructor)
 @bp.route('/notificacion/<int:noti_id>/responder', methods=['GET', 'POST'])
@@ -480,15 +414,9 @@ def responder_notificacion(noti_id):
             mensaje_respuesta = respuesta
 
             # Manejar archivo adjunto
+            adjunto = None
             if archivo and archivo.filename:
-                import os
-                from werkzeug.utils import secure_filename
-                upload_folder = os.path.join('app', 'static', 'uploads')
-                os.makedirs(upload_folder, exist_ok=True)
-                filename = secure_filename(archivo.filename)
-                archivo_path = os.path.join(upload_folder, filename)
-                archivo.save(archivo_path)
-                mensaje_respuesta += f"\n\nArchivo adjunto: {filename}"
+                adjunto = guardar_adjunto(archivo)
 
             nueva = Notificacion(
                 motivo=motivo_respuesta,
@@ -496,7 +424,8 @@ def responder_notificacion(noti_id):
                 remitente_id=remitente_id,
                 rol_remitente=current_user.__class__.__name__,
                 destinatario_id=noti.remitente_id,
-                rol_destinatario=noti.rol_remitente
+                rol_destinatario=normalizar_rol(noti.rol_remitente),
+                adjunto=adjunto
             )
             db.session.add(nueva)
             db.session.commit()
@@ -520,16 +449,8 @@ def marcar_todas_notificaciones():
     if current_user.__class__.__name__ != "Instructor":
         return "", 400
 
-    user_id = current_user.id_instructor
-    rol = "Instructor"
-
-    # Marcar todas las notificaciones como vistas (incluyendo globales)
-    Notificacion.query.filter(
-        Notificacion.rol_destinatario == rol,
-        or_(Notificacion.destinatario_id == user_id, Notificacion.destinatario_id == None),
-        Notificacion.visto == False
-    ).update({ "visto": True }, synchronize_session=False)
-
+    # Marcar todas las notificaciones como vistas (incluyendo globales, solo para este instructor)
+    marcar_todas_leidas(current_user)
     db.session.commit()
     return "", 200
 
@@ -1,8 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, current_app, abort
 from flask_login import login_required, current_user
 from app import db
 from app.models.users import Notificacion
+from app.services.eventos import bus, canal_usuario, canal_rol
+from app.services.notificaciones import destinatario_de, contar_no_leidas_de, puede_ver_adjunto
+from app.services.almacen import almacen, enviar_archivo, nombre_adjunto
 from datetime import datetime
+import json
+import time
 
 notificacion_bp = Blueprint('notificacion_bp', __name__, url_prefix='/notificacion')
 
@@ -50,3 +55,68 @@ def marcar_visto(id):
         db.session.commit()
         flash("Notificación marcada como leída.", "success")
     return redirect(request.referrer or url_for('notificacion_bp.listar_notificaciones'))
+
+
+# Descargar el adjunto de una notificación (fuera de static: se revisa quién lo pide)
+@notificacion_bp.route('/adjunto/<path:nombre>')
+@login_required
+def descargar_adjunto(nombre):
+    if not puede_ver_adjunto(current_user, nombre):
+        abort(404)
+    ruta = almacen().ruta_local(nombre)
+    if ruta is None:
+        return redirect(almacen().url_descarga(nombre, nombre_adjunto(nombre)))
+    if not almacen().existe(nombre):
+        abort(404)
+    return enviar_archivo(ruta, nombre_adjunto(nombre))
+
+
+# -------------------------------
+# Stream SSE para el badge de no leídas
+# -------------------------------
+@notificacion_bp.route('/eventos')
+@login_required
+def eventos():
+    """
+    Envía "notificacion" cuando llega una nueva y "no_leidas" con el total actualizado.
+    La conexión a la base se devuelve al pool antes de esperar: mientras el stream
+    está inactivo solo ocupa un hilo (o greenlet) bloqueado en una cola.
+    """
+    if current_user.rol_user not in ('administrador', 'administrador_sede', 'instructor', 'aprendiz'):
+        return "", 400
+
+    app = current_app._get_current_object()
+    rol, usuario_id = destinatario_de(current_user)
+    bus_eventos = bus()
+    suscripcion = bus_eventos.suscribir([canal_usuario(rol, usuario_id), canal_rol(rol)])
+    inicial = contar_no_leidas_de(rol, usuario_id)
+    db.session.remove()
+
+    keepalive = app.config['NOTIFICACIONES_SSE_KEEPALIVE']
+    fin = time.monotonic() + app.config['NOTIFICACIONES_SSE_DURACION']
+
+    def contar():
+        with app.app_context():
+            try:
+                return contar_no_leidas_de(rol, usuario_id)
+            finally:
+                db.session.remove()
+
+    def generar():
+        try:
+            yield f"retry: 5000\nevent: no_leidas\ndata: {inicial}\n\n"
+            while time.monotonic() < fin:
+                evento = suscripcion.esperar(timeout=keepalive)
+                if evento is None:
+                    yield ": ping\n\n"
+                    continue
+                if evento.get('tipo') == 'notificacion':
+                    yield f"event: notificacion\ndata: {json.dumps(evento)}\n\n"
+                yield f"event: no_leidas\ndata: {contar()}\n\n"
+        finally:
+            bus_eventos.cancelar(suscripcion)
+
+    return Response(generar(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Nginx no debe acumular el stream
+    })
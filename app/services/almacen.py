@@ -0,0 +1,269 @@
+# app/services/almacen.py
+import base64
+import mimetypes
+import os
+import shutil
+from urllib.parse import quote
+from uuid import uuid4
+from flask import current_app, request, send_file, url_for
+from werkzeug.utils import secure_filename, send_file as send_file_werkzeug
+
+try:
+    import boto3
+except ImportError:  # Solo se necesita con EVIDENCIA_ALMACEN=s3
+    boto3 = None
+
+MODOS_DESCARGA = ('python', 'x-accel', 'x-sendfile')
+
+
+# -------------------------
+# Backends
+# -------------------------
+# Todos guardan por clave relativa ("blobs/ab/cd/<sha256>", "informe.pdf") y exponen
+# la misma interfaz; las vistas y app.services.blobs no tocan rutas de disco.
+class AlmacenLocal:
+    """Archivos en una carpeta local (EVIDENCIAS_FOLDER). La aplicación los sirve con send_file."""
+
+    subida_directa = False
+
+    def __init__(self, raiz):
+        self.raiz = raiz
+
+    def ruta_local(self, clave):
+        return os.path.join(self.raiz, *clave.split('/'))
+
+    def tamano(self, clave):
+        try:
+            return os.path.getsize(self.ruta_local(clave))
+        except OSError:
+            return None
+
+    def existe(self, clave):
+        return os.path.isfile(self.ruta_local(clave))
+
+    def _preparar(self, clave):
+        destino = self.ruta_local(clave)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        return destino
+
+    def mover_archivo(self, ruta, clave):
+        """Pasa un archivo local al almacén (en el mismo disco es un renombrado)."""
+        shutil.move(ruta, self._preparar(clave))
+
+    def renombrar(self, clave, nueva):
+        os.replace(self.ruta_local(clave), self._preparar(nueva))
+
+    def copiar_archivo(self, ruta, clave):
+        destino = self._preparar(clave)
+        try:
+            os.link(ruta, destino)
+        except OSError:
+            shutil.copy2(ruta, destino)
+
+    def guardar(self, clave, flujo):
+        destino = self._preparar(clave)
+        parcial = destino + '.parcial'
+        try:
+            with open(parcial, 'wb') as archivo:
+                shutil.copyfileobj(flujo, archivo, 1024 * 1024)
+            os.replace(parcial, destino)
+        except Exception:
+            if os.path.exists(parcial):
+                os.remove(parcial)
+            raise
+
+    def abrir(self, clave):
+        return open(self.ruta_local(clave), 'rb')
+
+    def eliminar(self, clave):
+        try:
+            os.remove(self.ruta_local(clave))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def url_descarga(self, clave, nombre, adjunto=True):
+        return None
+
+    def firmar_subida(self, clave, sha256, tamano):
+        return None
+
+
+class AlmacenS3:
+    """
+    Bucket S3 compatible (AWS, MinIO, ...). Las descargas y las subidas desde el
+    navegador van directo al bucket con URLs firmadas: los workers no mueven bytes.
+    """
+
+    subida_directa = True
+
+    def __init__(self, cliente, bucket, prefijo='', expira=300):
+        self.cliente = cliente
+        self.bucket = bucket
+        self.prefijo = prefijo
+        self.expira = expira
+
+    def _clave(self, clave):
+        return f"{self.prefijo}{clave}"
+
+    def ruta_local(self, clave):
+        return None
+
+    def tamano(self, clave):
+        try:
+            return self.cliente.head_object(Bucket=self.bucket, Key=self._clave(clave))['ContentLength']
+        except Exception as e:
+            codigo = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if codigo in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def existe(self, clave):
+        return self.tamano(clave) is not None
+
+    def mover_archivo(self, ruta, clave):
+        self.cliente.upload_file(ruta, self.bucket, self._clave(clave))
+        os.remove(ruta)
+
+    def copiar_archivo(self, ruta, clave):
+        self.cliente.upload_file(ruta, self.bucket, self._clave(clave))
+
+    def renombrar(self, clave, nueva):
+        # S3 no renombra: copia dentro del bucket (sin pasar por el worker) y borra
+        self.cliente.copy_object(Bucket=self.bucket, Key=self._clave(nueva),
+                                 CopySource={'Bucket': self.bucket, 'Key': self._clave(clave)})
+        self.eliminar(clave)
+
+    def guardar(self, clave, flujo):
+        # upload_fileobj sube por partes: no carga el archivo completo en memoria
+        self.cliente.upload_fileobj(flujo, self.bucket, self._clave(clave))
+
+    def abrir(self, clave):
+        return self.cliente.get_object(Bucket=self.bucket, Key=self._clave(clave))['Body']
+
+    def eliminar(self, clave):
+        self.cliente.delete_object(Bucket=self.bucket, Key=self._clave(clave))
+        return True
+
+    def url_descarga(self, clave, nombre, adjunto=True):
+        disposicion = f"{'attachment' if adjunto else 'inline'}; filename*=UTF-8''{quote(nombre)}"
+        parametros = {'Bucket': self.bucket, 'Key': self._clave(clave), 'ResponseContentDisposition': disposicion}
+        tipo = mimetypes.guess_type(nombre)[0]
+        if tipo:
+            parametros['ResponseContentType'] = tipo
+        return self.cliente.generate_presigned_url('get_object', Params=parametros, ExpiresIn=self.expira)
+
+    def firmar_subida(self, clave, sha256, tamano):
+        """
+        URL para que el navegador haga PUT del archivo en `clave`. El tamaño y el
+        SHA-256 van firmados y el bucket los verifica: la clave no puede recibir
+        otro contenido.
+        """
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        url = self.cliente.generate_presigned_url('put_object', Params={
+            'Bucket': self.bucket, 'Key': self._clave(clave),
+            'ContentLength': tamano, 'ChecksumSHA256': checksum,
+        }, ExpiresIn=self.expira)
+        return {'url': url, 'headers': {'x-amz-checksum-sha256': checksum}}
+
+
+def init_app(app):
+    almacen_actual = None
+    if app.config['EVIDENCIA_ALMACEN'] == 's3':
+        if boto3 is None:
+            app.logger.warning("EVIDENCIA_ALMACEN=s3 pero boto3 no está instalado; se usa EVIDENCIAS_FOLDER.")
+        else:
+            cliente = boto3.client(
+                's3',
+                endpoint_url=app.config['S3_ENDPOINT_URL'],
+                region_name=app.config['S3_REGION'],
+                aws_access_key_id=app.config['S3_ACCESS_KEY'],
+                aws_secret_access_key=app.config['S3_SECRET_KEY'],
+            )
+            almacen_actual = AlmacenS3(
+                cliente, app.config['S3_BUCKET'],
+                prefijo=app.config['S3_PREFIJO'], expira=app.config['S3_URL_EXPIRA']
+            )
+    app.extensions['almacen'] = almacen_actual or AlmacenLocal(app.config['EVIDENCIAS_FOLDER'])
+    app.jinja_env.globals['url_adjunto'] = url_adjunto
+    app.jinja_env.globals['nombre_adjunto'] = nombre_adjunto
+
+    if app.config['DESCARGAS_MODO'] not in MODOS_DESCARGA:
+        app.logger.warning("DESCARGAS_MODO=%s no es válido; se usa 'python'.", app.config['DESCARGAS_MODO'])
+        app.config['DESCARGAS_MODO'] = 'python'
+
+
+def almacen():
+    return current_app.extensions['almacen']
+
+
+# -------------------------
+# Descargas desde disco
+# -------------------------
+def enviar_archivo(ruta, nombre, adjunto=True):
+    """
+    Respuesta de descarga de un archivo local. Con DESCARGAS_MODO "x-accel" (Nginx)
+    o "x-sendfile" (Apache, Lighttpd) la vista solo autoriza y arma las cabeceras:
+    el proxy envía los bytes y atiende los Range. ETag e If-Modified-Since se
+    resuelven aquí, así un 304 no llega a tocar el archivo.
+    """
+    modo = current_app.config['DESCARGAS_MODO']
+    interna = None
+    if modo == 'x-accel':
+        relativa = os.path.relpath(ruta, current_app.config['EVIDENCIAS_FOLDER'])
+        if not relativa.startswith('..'):
+            interna = current_app.config['DESCARGAS_ACCEL_PREFIJO'].rstrip('/') + '/' + quote(relativa.replace(os.sep, '/'))
+    if modo == 'python' or (modo == 'x-accel' and interna is None):
+        return send_file(ruta, as_attachment=adjunto, download_name=nombre)
+
+    respuesta = send_file_werkzeug(
+        ruta, request.environ, as_attachment=adjunto, download_name=nombre,
+        use_x_sendfile=True, conditional=False, response_class=current_app.response_class,
+        max_age=current_app.get_send_file_max_age, _root_path=current_app.root_path,
+    )
+    respuesta.make_conditional(request.environ, accept_ranges=False)
+    if respuesta.status_code == 304:
+        respuesta.headers.pop('X-Sendfile', None)
+        return respuesta
+    respuesta.accept_ranges = 'bytes'
+    if interna is not None:
+        respuesta.headers['X-Accel-Redirect'] = interna
+        respuesta.headers.pop('X-Sendfile', None)
+    return respuesta
+
+
+# -------------------------
+# Adjuntos de notificaciones
+# -------------------------
+PREFIJO_ADJUNTOS = 'adjuntos/'
+
+
+def guardar_adjunto(archivo):
+    """
+    Guarda el adjunto de una notificación bajo "adjuntos/<uuid>_<nombre>": dos
+    envíos con el mismo nombre no se pisan. Retorna la clave.
+    """
+    nombre = (secure_filename(archivo.filename) or 'adjunto')[-200:]  # la columna es de 255
+    clave = f"{PREFIJO_ADJUNTOS}{uuid4().hex}_{nombre}"
+    almacen().guardar(clave, archivo.stream)
+    return clave
+
+
+def nombre_adjunto(clave):
+    """Nombre con el que se muestra y descarga un adjunto (sin carpeta ni prefijo único)."""
+    if clave.startswith(PREFIJO_ADJUNTOS):
+        return clave[len(PREFIJO_ADJUNTOS):].split('_', 1)[-1]
+    return clave
+
+
+def url_adjunto(clave):
+    """
+    Enlace de descarga de un adjunto: firmado en S3; en local, la vista que revisa
+    permisos. Los adjuntos anteriores siguen en UPLOAD_FOLDER como estáticos.
+    """
+    url = almacen().url_descarga(clave, nombre_adjunto(clave))
+    if url:
+        return url
+    if almacen().existe(clave):
+        return url_for('notificacion_bp.descargar_adjunto', nombre=clave)
+    return url_for('static', filename='uploads/' + clave)
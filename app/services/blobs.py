@@ -0,0 +1,297 @@
+# app/services/blobs.py
+import hashlib
+import os
+from datetime import datetime, timedelta
+from uuid import uuid4
+from flask import current_app
+from sqlalchemy import event, inspect, case
+from app import db
+from app.models.users import Evidencia, ArchivoBlob
+from app.services.almacen import almacen
+from app.services.subidas import guardar_subida
+
+# Las evidencias se guardan una sola vez por contenido bajo la clave
+# blobs/ab/cd/<sha256> del almacén; url_archivo guarda esa clave.
+PREFIJO = 'blobs/'
+# Las subidas directas al bucket llegan primero a temporales/<aprendiz>/<uuid>
+PREFIJO_TEMPORAL = 'temporales/'
+
+
+def es_blob(url):
+    return bool(url) and url.startswith(PREFIJO)
+
+
+def clave_blob(sha256):
+    return f"{PREFIJO}{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def _ruta_heredada(url):
+    """Archivo de una evidencia anterior al almacén (ruta absoluta o nombre en UPLOAD_FOLDER)."""
+    if not url:
+        return None
+    for ruta in (url, os.path.join(current_app.config['UPLOAD_FOLDER'], os.path.basename(url))):
+        if os.path.isfile(ruta):
+            return ruta
+    return None
+
+
+def clave_miniatura(sha256):
+    """La miniatura de la previa se guarda junto al blob y se libera con él."""
+    return clave_blob(sha256) + '.png'
+
+
+def ruta_evidencia(evidencia):
+    """Ruta en disco del archivo de la evidencia (None si el almacén no es local)."""
+    if es_blob(evidencia.url_archivo):
+        return almacen().ruta_local(evidencia.url_archivo)
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], os.path.basename(evidencia.url_archivo))
+
+
+def abrir_evidencia(url):
+    """Flujo de lectura del archivo de una evidencia; FileNotFoundError si no está."""
+    if es_blob(url):
+        if not almacen().existe(url):
+            raise FileNotFoundError(url)
+        return almacen().abrir(url)
+    ruta = _ruta_heredada(url)
+    if ruta is None:
+        raise FileNotFoundError(url)
+    return open(ruta, 'rb')
+
+
+def url_evidencia(evidencia, adjunto=True):
+    """URL firmada para descargar la evidencia directo del almacén, o None si la sirve la aplicación."""
+    if not es_blob(evidencia.url_archivo):
+        return None
+    return almacen().url_descarga(evidencia.url_archivo, evidencia.nombre_archivo, adjunto=adjunto)
+
+
+def guardar_blob(archivo):
+    """
+    Deja el archivo recibido (ver subidas.preparar_subida) en su ruta por contenido.
+    Si ya hay un archivo con el mismo SHA-256, el recibido se descarta.
+    Retorna (clave, sha256, tamaño); la referencia la suma la evidencia al guardarse.
+    """
+    temporal, sha256, tamano = guardar_subida(archivo, f".{uuid4().hex}.parcial")
+    return _colocar_blob(temporal, sha256), sha256, tamano
+
+
+def guardar_blob_de_ruta(ruta):
+    """Como guardar_blob, para un archivo ya completo en disco (p. ej. una subida reanudable)."""
+    sha256, tamano = _hash_archivo(ruta)
+    return _colocar_blob(ruta, sha256), sha256, tamano
+
+
+def _reservar_blob(sha256):
+    """
+    Reinicia el margen de un blob sin referencias que una subida va a reutilizar:
+    liberar_blobs cuenta desde liberado_en, así que no lo borra antes de que la
+    evidencia haga commit. Va en su propia transacción para que otro proceso lo vea
+    enseguida, y antes de mirar si el archivo existe.
+    """
+    tabla = ArchivoBlob.__table__
+    with db.engine.begin() as conexion:
+        conexion.execute(
+            tabla.update()
+            .where(tabla.c.sha256 == sha256, tabla.c.referencias <= 0)
+            .values(liberado_en=datetime.utcnow())
+        )
+
+
+def _colocar_blob(temporal, sha256):
+    clave = clave_blob(sha256)
+    _reservar_blob(sha256)
+    if almacen().existe(clave):
+        os.remove(temporal)
+    else:
+        almacen().mover_archivo(temporal, clave)
+    return clave
+
+
+def clave_temporal(aprendiz_id):
+    """Clave de una subida directa aún sin verificar: propia del aprendiz y fuera de blobs/."""
+    return f"{PREFIJO_TEMPORAL}{aprendiz_id}/{uuid4().hex}"
+
+
+def confirmar_blob(pendiente, limite=None):
+    """
+    Valida un archivo que el navegador subió directo al almacén. `pendiente` es lo
+    que evidencia_route.firmar_subida guardó en la sesión: {'sha256', 'tamano'} y la
+    clave 'temporal' del PUT (sin ella, el contenido ya era de un blob del aprendiz).
+    El objeto temporal pasa a su clave por contenido. Retorna (clave, sha256, tamaño)
+    o lanza ValueError.
+    """
+    sha256, temporal = pendiente['sha256'], pendiente.get('temporal')
+    clave = clave_blob(sha256)
+    if temporal is None:
+        _reservar_blob(sha256)
+    tamano = almacen().tamano(temporal or clave)
+    if tamano is None:
+        raise ValueError('El archivo no llegó al almacenamiento; intenta subirlo de nuevo.')
+    if temporal is None:
+        return clave, sha256, tamano
+    if tamano != pendiente['tamano'] or (limite is not None and tamano > limite):
+        almacen().eliminar(temporal)
+        raise ValueError('El archivo recibido no coincide con el declarado o supera el tamaño permitido.')
+    _reservar_blob(sha256)
+    if almacen().existe(clave):
+        almacen().eliminar(temporal)
+    else:
+        almacen().renombrar(temporal, clave)
+    return clave, sha256, tamano
+
+
+def eliminar_archivo_heredado(url):
+    """Borra el archivo de una evidencia anterior al almacén; los blobs se liberan por referencias."""
+    if es_blob(url):
+        return
+    try:
+        ruta = _ruta_heredada(url)
+        if ruta:
+            os.remove(ruta)
+    except OSError as e:
+        # El archivo queda para `flask evidencias reconciliar`
+        current_app.logger.warning(f"No se pudo borrar {url}: {e}")
+
+
+# -------------------------
+# Referencias (eventos del ORM)
+# -------------------------
+# Cada evidencia con url_archivo "blobs/..." suma una referencia a su blob. Se ajustan
+# en la misma transacción que la evidencia, así que cubren subidas, ediciones,
+# eliminaciones y el borrado en cascada de un aprendiz.
+def _sha_de(url):
+    return url.rsplit('/', 1)[1] if es_blob(url) else None
+
+
+def _ajustar_referencias(connection, sha256, delta, tamano=None):
+    if not sha256 or not delta:
+        return
+    tabla = ArchivoBlob.__table__
+    nuevas = tabla.c.referencias + delta
+    resultado = connection.execute(
+        tabla.update()
+        .where(tabla.c.sha256 == sha256)
+        .values(referencias=nuevas, liberado_en=case((nuevas <= 0, datetime.utcnow()), else_=None))
+    )
+    if resultado.rowcount == 0 and delta > 0:
+        connection.execute(tabla.insert().values(
+            sha256=sha256, tamano=tamano, referencias=delta, fecha_creacion=datetime.utcnow()
+        ))
+
+
+def _al_insertar_evidencia(mapper, connection, target):
+    _ajustar_referencias(connection, _sha_de(target.url_archivo), 1, target.tamano)
+
+
+def _al_actualizar_evidencia(mapper, connection, target):
+    historial = inspect(target).attrs.url_archivo.history
+    if not historial.has_changes():
+        return
+    anterior = historial.deleted[0] if historial.deleted else None
+    if anterior != target.url_archivo:
+        _ajustar_referencias(connection, _sha_de(anterior), -1)
+        _ajustar_referencias(connection, _sha_de(target.url_archivo), 1, target.tamano)
+
+
+def _al_eliminar_evidencia(mapper, connection, target):
+    historial = inspect(target).attrs.url_archivo.history
+    url = historial.deleted[0] if historial.deleted else target.url_archivo
+    _ajustar_referencias(connection, _sha_de(url), -1)
+
+
+event.listen(Evidencia, 'after_insert', _al_insertar_evidencia)
+event.listen(Evidencia, 'after_update', _al_actualizar_evidencia)
+event.listen(Evidencia, 'after_delete', _al_eliminar_evidencia)
+
+
+# -------------------------
+# Mantenimiento
+# -------------------------
+def liberar_blobs(horas=None, lote=500):
+    """
+    Borra los blobs que llevan más de `horas` sin referencias. Una subida que reutiliza
+    un blob reinicia liberado_en (ver _reservar_blob), así que el margen cubre su commit.
+    Retorna (blobs, bytes) liberados.
+    """
+    horas = current_app.config['EVIDENCIA_BLOBS_GRACIA_HORAS'] if horas is None else horas
+    limite = datetime.utcnow() - timedelta(hours=horas)
+    tabla = ArchivoBlob.__table__
+    ultimo, blobs, liberados = '', 0, 0
+    while True:
+        filas = db.session.query(ArchivoBlob.sha256, ArchivoBlob.tamano).filter(
+            ArchivoBlob.sha256 > ultimo,
+            ArchivoBlob.referencias <= 0,
+            ArchivoBlob.liberado_en < limite
+        ).order_by(ArchivoBlob.sha256).limit(lote).all()
+        if not filas:
+            break
+        ultimo = filas[-1].sha256
+
+        for sha256, tamano in filas:
+            # Condicionado: si otra evidencia lo tomó o reservó entretanto, no se borra
+            if db.session.execute(
+                tabla.delete().where(
+                    tabla.c.sha256 == sha256, tabla.c.referencias <= 0, tabla.c.liberado_en < limite
+                )
+            ).rowcount:
+                if almacen().eliminar(clave_blob(sha256)):
+                    liberados += tamano or 0
+                almacen().eliminar(clave_miniatura(sha256))
+                blobs += 1
+        db.session.commit()
+    return blobs, liberados
+
+
+def _hash_archivo(ruta):
+    sha256, tamano = hashlib.sha256(), 0
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+            sha256.update(bloque)
+            tamano += len(bloque)
+    return sha256.hexdigest(), tamano
+
+
+def deduplicar_evidencias(lote=200):
+    """
+    Pasa los archivos de evidencia anteriores al almacén por contenido. Recorre por id
+    en lotes: cada archivo se enlaza en su blob (o se reconoce como duplicado) y la
+    evidencia se actualiza; los originales se borran después del commit del lote.
+    Retorna {'migradas', 'duplicadas', 'faltantes', 'bytes_recuperados'}.
+    """
+    resumen = {'migradas': 0, 'duplicadas': 0, 'faltantes': 0, 'bytes_recuperados': 0}
+    ultimo = 0
+    while True:
+        evidencias = Evidencia.query.filter(
+            Evidencia.id_evidencia > ultimo,
+            Evidencia.url_archivo != '',
+            ~Evidencia.url_archivo.startswith(PREFIJO)
+        ).order_by(Evidencia.id_evidencia).limit(lote).all()
+        if not evidencias:
+            break
+        ultimo = evidencias[-1].id_evidencia
+
+        originales = set()
+        for evidencia in evidencias:
+            origen = _ruta_heredada(evidencia.url_archivo)
+            if origen is None:
+                resumen['faltantes'] += 1
+                continue
+            sha256, tamano = _hash_archivo(origen)
+            clave = clave_blob(sha256)
+            _reservar_blob(sha256)
+            if almacen().existe(clave):
+                resumen['duplicadas'] += 1
+                resumen['bytes_recuperados'] += tamano
+            else:
+                almacen().copiar_archivo(origen, clave)
+            evidencia.sha256, evidencia.tamano, evidencia.url_archivo = sha256, tamano, clave
+            originales.add(origen)
+            resumen['migradas'] += 1
+        db.session.commit()
+
+        for origen in originales:
+            if os.path.exists(origen):
+                os.remove(origen)
+    return resumen
+
@@ -0,0 +1,110 @@
+# app/services/carga_usuario.py
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, object_session
+from app import db
+from app.models.users import Aprendiz, Instructor, AdministradorSede, Programa
+from app.services.cache import CacheTTL
+from app.services.identidad import CAMPOS_POR_ROL
+
+# -------------------------
+# Relaciones que cada rol usa en casi todas las páginas
+# -------------------------
+OPCIONES_CARGA = {
+    'aprendiz': (
+        joinedload(Aprendiz.sede),
+        joinedload(Aprendiz.instructor),
+        joinedload(Aprendiz.programa).joinedload(Programa.ficha_rel),
+        joinedload(Aprendiz.contrato),
+    ),
+    'instructor': (joinedload(Instructor.sede),),
+    'administrador_sede': (joinedload(AdministradorSede.sede),),
+    'administrador': (),
+}
+
+
+def init_app(app):
+    app.extensions['cache_usuarios'] = CacheTTL(
+        maxsize=app.config['USER_CACHE_MAXSIZE'],
+        ttl=app.config['USER_CACHE_TTL']
+    )
+
+
+def _cache():
+    return current_app.extensions['cache_usuarios']
+
+
+def _cargar_snapshot(rol, usuario_id):
+    """Carga el usuario con sus relaciones en una sesión propia y lo devuelve desacoplado."""
+    modelo = CAMPOS_POR_ROL[rol]['modelo']
+    with Session(db.engine) as sesion:
+        usuario = sesion.get(modelo, usuario_id, options=OPCIONES_CARGA[rol])
+        if usuario is not None:
+            sesion.expunge_all()
+    return usuario
+
+
+def cargar_usuario(user_id):
+    """
+    Implementación del user_loader: busca el snapshot en la cache del proceso y lo
+    adjunta a la sesión de la petición con merge(load=False), que no ejecuta SQL.
+    La copia adjunta se puede editar y hacer commit como cualquier instancia.
+    """
+    try:
+        rol, id = user_id.split("-")
+        id = int(id)
+    except (ValueError, AttributeError):
+        return None
+
+    if rol not in CAMPOS_POR_ROL:
+        return None
+
+    cache = _cache()
+    snapshot = cache.get(user_id)
+    if snapshot is None:
+        snapshot = _cargar_snapshot(rol, id)
+        if snapshot is None:
+            return None
+        cache.set(user_id, snapshot)
+
+    return db.session.merge(snapshot, load=False)
+
+
+def invalidar_usuario(user_id):
+    _cache().invalidar(user_id)
+
+
+def estadisticas():
+    return _cache().estadisticas()
+
+
+# -------------------------
+# Invalidación al confirmar cambios de un usuario
+# -------------------------
+# Los cambios se anotan en el flush y se invalidan tras el commit, para que otra
+# petición no vuelva a cachear los datos viejos antes de que la transacción termine.
+def _anotar_cambio(mapper, connection, target):
+    sesion = object_session(target)
+    if sesion is not None:
+        sesion.info.setdefault('usuarios_modificados', set()).add(target.get_id())
+
+
+def _despues_commit(sesion):
+    modificados = sesion.info.pop('usuarios_modificados', None)
+    if modificados and current_app:
+        cache = current_app.extensions.get('cache_usuarios')
+        if cache is not None:
+            for user_id in modificados:
+                cache.invalidar(user_id)
+
+
+def _despues_rollback(sesion):
+    sesion.info.pop('usuarios_modificados', None)
+
+
+for _campos in CAMPOS_POR_ROL.values():
+    event.listen(_campos['modelo'], 'after_update', _anotar_cambio)
+    event.listen(_campos['modelo'], 'after_delete', _anotar_cambio)
+
+event.listen(Session, 'after_commit', _despues_commit)
+event.listen(Session, 'after_soft_rollback', lambda sesion, transaccion: _despues_rollback(sesion))
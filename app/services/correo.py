@@ -0,0 +1,171 @@
+# app/services/correo.py
+import smtplib
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from app import db, mail
+from app.models.users import CorreoPendiente
+
+
+def encolar_correo(destinatario, asunto, cuerpo):
+    """
+    Agrega un correo a la bandeja de salida usando la sesión actual.
+    No hace commit: se confirma junto con el cambio que lo origina.
+    """
+    correo = CorreoPendiente(destinatario=destinatario, asunto=asunto, cuerpo=cuerpo)
+    db.session.add(correo)
+    return correo
+
+
+class TrabajadorCorreo:
+    """
+    Vacía la bandeja de salida por lotes reutilizando una sola conexión SMTP
+    mientras haya trabajo. Respeta un máximo de envíos por minuto y reintenta
+    los fallos con espera exponencial.
+    """
+
+    def __init__(self, lote=20, por_minuto=60, max_intentos=6, espera_base=30, pausa=5):
+        self.lote = lote
+        self.por_minuto = por_minuto
+        self.max_intentos = max_intentos
+        self.espera_base = espera_base
+        self.pausa = pausa
+        self.enviados = 0
+        self.fallidos = 0
+        self._conexion = None
+        self._envios_recientes = deque()
+
+    # -------------------------
+    # Conexión SMTP reutilizable
+    # -------------------------
+    def _abrir(self):
+        if self._conexion is None:
+            self._conexion = mail.connect().__enter__()
+        return self._conexion
+
+    def cerrar(self):
+        if self._conexion is not None:
+            try:
+                self._conexion.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._conexion = None
+
+    # -------------------------
+    # Límite de envíos por minuto
+    # -------------------------
+    def _cupo_disponible(self):
+        limite = time.monotonic() - 60
+        while self._envios_recientes and self._envios_recientes[0] < limite:
+            self._envios_recientes.popleft()
+        return self.por_minuto - len(self._envios_recientes)
+
+    def _esperar_cupo(self):
+        if self._cupo_disponible() <= 0:
+            time.sleep(max(0, self._envios_recientes[0] + 60 - time.monotonic()))
+
+    # -------------------------
+    # Procesamiento
+    # -------------------------
+    def procesar_lote(self):
+        """Envía hasta `lote` correos vencidos. Retorna cuántos se intentaron."""
+        cantidad = min(self.lote, max(self._cupo_disponible(), 0))
+        if cantidad == 0:
+            return 0
+
+        # skip_locked permite varios trabajadores en PostgreSQL sin repetir correos
+        correos = (CorreoPendiente.query
+                   .filter(CorreoPendiente.estado == 'pendiente',
+                           CorreoPendiente.proximo_intento <= datetime.utcnow())
+                   .order_by(CorreoPendiente.id)
+                   .limit(cantidad)
+                   .with_for_update(skip_locked=True)
+                   .all())
+
+        for correo in correos:
+            try:
+                conexion = self._abrir()
+                conexion.send(Message(
+                    subject=correo.asunto,
+                    recipients=[correo.destinatario],
+                    sender=current_app.config.get('MAIL_DEFAULT_SENDER'),
+                    body=correo.cuerpo
+                ))
+                correo.estado = 'enviado'
+                correo.enviado_en = datetime.utcnow()
+                correo.ultimo_error = None
+                self.enviados += 1
+            except (smtplib.SMTPException, OSError) as e:
+                # La conexión pudo quedar inutilizable: se abre otra en el siguiente envío
+                self.cerrar()
+                self._registrar_fallo(correo, e)
+            except Exception as e:
+                self._registrar_fallo(correo, e)
+            self._envios_recientes.append(time.monotonic())
+
+        db.session.commit()
+        return len(correos)
+
+    def _registrar_fallo(self, correo, error):
+        correo.intentos += 1
+        correo.ultimo_error = str(error)[:500]
+        if correo.intentos >= self.max_intentos:
+            correo.estado = 'fallido'
+            self.fallidos += 1
+        else:
+            espera = self.espera_base * 2 ** (correo.intentos - 1)
+            correo.proximo_intento = datetime.utcnow() + timedelta(seconds=espera)
+        current_app.logger.warning(f"Correo {correo.id} a {correo.destinatario} falló ({correo.intentos}): {error}")
+
+    def ejecutar(self, una_vez=False):
+        try:
+            while True:
+                procesados = self.procesar_lote()
+                if una_vez and procesados < self.lote:
+                    return
+                if procesados == 0:
+                    # Sin trabajo pendiente: no mantener la conexión SMTP abierta
+                    self.cerrar()
+                    db.session.remove()
+                    time.sleep(self.pausa)
+                self._esperar_cupo()
+        finally:
+            self.cerrar()
+
+
+def crear_trabajador(**opciones):
+    """Crea un trabajador con los valores de configuración, sobrescribibles por opciones."""
+    config = current_app.config
+    valores = {
+        'lote': config['MAIL_OUTBOX_BATCH'],
+        'por_minuto': config['MAIL_OUTBOX_PER_MINUTE'],
+        'max_intentos': config['MAIL_OUTBOX_MAX_ATTEMPTS'],
+        'espera_base': config['MAIL_OUTBOX_BACKOFF'],
+    }
+    valores.update({clave: valor for clave, valor in opciones.items() if valor is not None})
+    return TrabajadorCorreo(**valores)
+
+
+def iniciar_trabajador_interno(app):
+    """
+    Vacía la bandeja de salida en un hilo del propio proceso web, para despliegues
+    con un solo proceso y sin `flask correo trabajador` aparte (MAIL_OUTBOX_WORKER=interno).
+    Si el ciclo falla (p. ej. la base no responde), registra el error y vuelve a empezar.
+    """
+    def ejecutar():
+        with app.app_context():
+            trabajador = crear_trabajador()
+            while True:
+                try:
+                    trabajador.ejecutar()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f"Trabajador de correo interno: {e}")
+                    time.sleep(trabajador.pausa)
+
+    hilo = threading.Thread(target=ejecutar, name='trabajador-correo', daemon=True)
+    hilo.start()
+    return hilo
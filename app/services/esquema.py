@@ -0,0 +1,64 @@
+# app/services/esquema.py
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import inspect
+from app import db
+
+
+def verificar_esquema():
+    """
+    Compara las tablas y columnas de los modelos con las de la base de datos.
+    Se ejecuta al arrancar el proceso: ninguna ruta debe inspeccionar ni crear tablas.
+    """
+    resultado = {
+        'ok': False,
+        'tablas_faltantes': [],
+        'columnas_faltantes': {},
+        'error': None,
+        'verificado_en': datetime.utcnow().isoformat(timespec='seconds'),
+    }
+
+    try:
+        inspector = inspect(db.engine)
+        existentes = set(inspector.get_table_names())
+
+        for nombre, tabla in db.metadata.tables.items():
+            if nombre not in existentes:
+                resultado['tablas_faltantes'].append(nombre)
+                continue
+            columnas = {columna['name'] for columna in inspector.get_columns(nombre)}
+            faltantes = [c.name for c in tabla.columns if c.name not in columnas]
+            if faltantes:
+                resultado['columnas_faltantes'][nombre] = faltantes
+    except Exception as e:
+        resultado['error'] = str(e)
+        return resultado
+
+    resultado['tablas_faltantes'].sort()
+    resultado['ok'] = not resultado['tablas_faltantes'] and not resultado['columnas_faltantes']
+    return resultado
+
+
+def registrar_verificacion(app):
+    """Verifica el esquema y guarda el resultado para el endpoint de salud."""
+    with app.app_context():
+        resultado = verificar_esquema()
+    app.extensions['esquema'] = resultado
+
+    if resultado['error']:
+        app.logger.warning(f"No se pudo verificar el esquema: {resultado['error']}")
+    elif not resultado['ok']:
+        app.logger.warning(
+            f"Esquema incompleto. Tablas: {resultado['tablas_faltantes']} "
+            f"Columnas: {resultado['columnas_faltantes']}"
+        )
+    return resultado
+
+
+def init_app(app):
+    if app.config['SCHEMA_CHECK_ON_STARTUP']:
+        registrar_verificacion(app)
+
+
+def estado_esquema():
+    return current_app.extensions.get('esquema')
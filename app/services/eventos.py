@@ -0,0 +1,210 @@
+# app/services/eventos.py
+import json
+import queue
+import select
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+try:
+    import psycopg2
+except ImportError:  # Solo se necesita para el puente LISTEN/NOTIFY
+    psycopg2 = None
+
+
+# -------------------------
+# Bus de eventos en memoria del proceso
+# -------------------------
+class Suscripcion:
+    """Cola de eventos de un stream; si el cliente no lee, los eventos nuevos se descartan."""
+
+    def __init__(self, canales, maximo=100):
+        self.canales = tuple(canales)
+        self._cola = queue.Queue(maxsize=maximo)
+
+    def entregar(self, evento):
+        try:
+            self._cola.put_nowait(evento)
+            return True
+        except queue.Full:
+            return False
+
+    def esperar(self, timeout):
+        """Bloquea hasta `timeout` segundos; retorna el evento o None."""
+        try:
+            return self._cola.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class BusEventos:
+    """
+    Pub/sub por canal entre hilos del proceso. Usa queue.Queue y threading.Lock,
+    así que funciona con workers por hilos (gthread) y cooperativos (gevent/eventlet
+    con monkey patching).
+    """
+
+    def __init__(self, puente=None):
+        self.puente = puente
+        self.publicados = 0
+        self.descartados = 0
+        self._suscriptores = {}
+        self._lock = threading.Lock()
+
+    def suscribir(self, canales):
+        if self.puente is not None:
+            self.puente.iniciar(self)
+        suscripcion = Suscripcion(canales)
+        with self._lock:
+            for canal in suscripcion.canales:
+                self._suscriptores.setdefault(canal, set()).add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            for canal in suscripcion.canales:
+                suscriptores = self._suscriptores.get(canal)
+                if suscriptores is not None:
+                    suscriptores.discard(suscripcion)
+                    if not suscriptores:
+                        del self._suscriptores[canal]
+
+    def publicar(self, canal, evento):
+        """Entrega el evento a los streams de este proceso suscritos al canal."""
+        with self._lock:
+            suscriptores = list(self._suscriptores.get(canal, ()))
+            self.publicados += 1
+        for suscripcion in suscriptores:
+            if not suscripcion.entregar(evento):
+                with self._lock:
+                    self.descartados += 1
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'canales': len(self._suscriptores),
+                'streams': len({s for subs in self._suscriptores.values() for s in subs}),
+                'publicados': self.publicados,
+                'descartados': self.descartados,
+                'puente': self.puente is not None,
+            }
+
+
+# -------------------------
+# Puente entre workers (PostgreSQL LISTEN/NOTIFY)
+# -------------------------
+class PuentePostgres:
+    """
+    Reparte los eventos entre procesos. El NOTIFY se emite dentro de la transacción
+    que inserta la notificación, así que solo se entrega si hay commit. Un hilo por
+    proceso escucha con una conexión propia (fuera del pool) y publica en el bus local.
+    """
+
+    CANAL = 'notificaciones'
+
+    def __init__(self, dsn, reintento=5):
+        self.dsn = dsn
+        self.reintento = reintento
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def iniciar(self, bus):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(
+                    target=self._escuchar, args=(bus,), name='puente-notificaciones', daemon=True
+                )
+                self._hilo.start()
+
+    def enviar(self, connection, canal, evento):
+        connection.execute(
+            text("SELECT pg_notify(:canal, :datos)"),
+            {'canal': self.CANAL, 'datos': json.dumps({'canal': canal, 'evento': evento})}
+        )
+
+    def _escuchar(self, bus):
+        while True:
+            conexion = None
+            try:
+                conexion = psycopg2.connect(self.dsn)
+                conexion.autocommit = True
+                conexion.cursor().execute(f"LISTEN {self.CANAL}")
+                while True:
+                    if select.select([conexion], [], [], 30) == ([], [], []):
+                        continue
+                    conexion.poll()
+                    while conexion.notifies:
+                        aviso = conexion.notifies.pop(0)
+                        datos = json.loads(aviso.payload)
+                        bus.publicar(datos['canal'], datos['evento'])
+            except Exception:
+                time.sleep(self.reintento)
+            finally:
+                if conexion is not None:
+                    conexion.close()
+
+
+def init_app(app):
+    puente = None
+    if app.config['NOTIFICACIONES_PG_NOTIFY']:
+        from app import db
+        with app.app_context():
+            url = db.engine.url
+        if url.get_backend_name() != 'postgresql':
+            app.logger.warning("NOTIFICACIONES_PG_NOTIFY solo aplica con PostgreSQL; se usa el bus local.")
+        elif psycopg2 is None:
+            app.logger.warning("NOTIFICACIONES_PG_NOTIFY definido pero psycopg2 no está instalado.")
+        else:
+            puente = PuentePostgres(url.set(drivername='postgresql').render_as_string(hide_password=False))
+    app.extensions['bus_eventos'] = BusEventos(puente)
+
+
+def bus():
+    return current_app.extensions['bus_eventos']
+
+
+def canal_usuario(rol, usuario_id):
+    return f"{rol}:{usuario_id}"
+
+
+def canal_rol(rol):
+    return f"{rol}:*"
+
+
+def estadisticas():
+    return bus().estadisticas()
+
+
+# -------------------------
+# Publicación al confirmar la transacción
+# -------------------------
+# Con puente, el NOTIFY viaja en la misma transacción y el hilo oyente lo publica en
+# cada proceso (incluido este). Sin puente, el evento se anota y se publica tras el
+# commit para que un rollback no anuncie notificaciones que no existen.
+def publicar_al_confirmar(sesion, connection, canal, evento):
+    bus_actual = current_app.extensions.get('bus_eventos') if current_app else None
+    if bus_actual is None:
+        return
+    if bus_actual.puente is not None:
+        bus_actual.puente.enviar(connection, canal, evento)
+    else:
+        sesion.info.setdefault('eventos_pendientes', []).append((canal, evento))
+
+
+def _despues_commit(sesion):
+    pendientes = sesion.info.pop('eventos_pendientes', None)
+    if pendientes and current_app:
+        bus_actual = current_app.extensions.get('bus_eventos')
+        if bus_actual is not None:
+            for canal, evento in pendientes:
+                bus_actual.publicar(canal, evento)
+
+
+def _despues_rollback(sesion):
+    sesion.info.pop('eventos_pendientes', None)
+
+
+event.listen(Session, 'after_commit', _despues_commit)
+event.listen(Session, 'after_soft_rollback', lambda sesion, transaccion: _despues_rollback(sesion))
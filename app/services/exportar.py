@@ -0,0 +1,113 @@
+# app/services/exportar.py
+import csv
+import io
+import zipfile
+from werkzeug.utils import secure_filename
+from app import db
+from app.models.users import Aprendiz, Evidencia, Programa
+from app.services.blobs import abrir_evidencia
+
+# Formatos que ya vienen comprimidos: se guardan tal cual en el ZIP
+SIN_COMPRIMIR = {'docx', 'xlsx', 'pdf'}
+BLOQUE = 256 * 1024
+
+COLUMNAS_MANIFIESTO = ['archivo', 'documento', 'aprendiz', 'tipo', 'sesion_excel', 'fecha_subida',
+                       'nota', 'tamano', 'sha256', 'estado']
+
+
+class _Salida:
+    """Destino del ZipFile que solo acumula lo escrito hasta que el generador lo entrega."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def evidencias_para_zip(aprendiz_id=None, ficha_id=None):
+    """Datos de las evidencias con archivo de un aprendiz o de una ficha completa (sin los archivos)."""
+    consulta = db.session.query(
+        Evidencia.id_evidencia, Evidencia.tipo, Evidencia.formato, Evidencia.nombre_archivo,
+        Evidencia.url_archivo, Evidencia.sesion_excel, Evidencia.fecha_subida, Evidencia.nota,
+        Evidencia.tamano, Evidencia.sha256, Aprendiz.documento, Aprendiz.nombre, Aprendiz.apellido,
+    ).join(Aprendiz, Evidencia.aprendiz_id_aprendiz == Aprendiz.id_aprendiz).filter(
+        Evidencia.url_archivo != ''
+    )
+    if aprendiz_id is not None:
+        consulta = consulta.filter(Aprendiz.id_aprendiz == aprendiz_id)
+    if ficha_id is not None:
+        consulta = consulta.join(Programa, Aprendiz.programa_id == Programa.id_programa).filter(
+            Programa.ficha_id == ficha_id
+        )
+    return consulta.order_by(Aprendiz.apellido, Aprendiz.nombre, Evidencia.tipo, Evidencia.id_evidencia).all()
+
+
+def _nombre_en_zip(fila, por_aprendiz):
+    nombre = secure_filename(fila.nombre_archivo) or f"evidencia.{fila.formato}"
+    ruta = f"{fila.tipo}/{fila.id_evidencia}_{nombre}"
+    if por_aprendiz:
+        carpeta = secure_filename(f"{fila.documento}_{fila.apellido}_{fila.nombre}")
+        ruta = f"{carpeta}/{ruta}"
+    return ruta
+
+
+def generar_zip(filas, por_aprendiz=False):
+    """
+    Genera el ZIP por partes: cada archivo se lee del almacén en bloques y se entrega
+    apenas se comprime, así la memoria no depende del tamaño del archivo ni del ZIP.
+    Al final va manifiesto.csv; las evidencias cuyo archivo falta quedan marcadas ahí.
+    """
+    salida = _Salida()
+    manifiesto = []
+    with zipfile.ZipFile(salida, 'w', allowZip64=True) as archivo_zip:
+        for fila in filas:
+            ruta = _nombre_en_zip(fila, por_aprendiz)
+            datos_fila = {
+                'archivo': ruta, 'documento': fila.documento, 'aprendiz': f"{fila.nombre} {fila.apellido}",
+                'tipo': fila.tipo, 'sesion_excel': fila.sesion_excel or '',
+                'fecha_subida': fila.fecha_subida.isoformat() if fila.fecha_subida else '',
+                'nota': fila.nota or '', 'tamano': fila.tamano or '', 'sha256': fila.sha256 or '',
+                'estado': 'incluido',
+            }
+            try:
+                origen = abrir_evidencia(fila.url_archivo)
+            except FileNotFoundError:
+                datos_fila['estado'] = 'faltante'
+                manifiesto.append(datos_fila)
+                continue
+
+            info = zipfile.ZipInfo(ruta, date_time=fila.fecha_subida.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED if fila.formato.lower() in SIN_COMPRIMIR else zipfile.ZIP_DEFLATED
+            info.file_size = fila.tamano or 0
+            try:
+                with archivo_zip.open(info, 'w', force_zip64=(fila.tamano or 0) > zipfile.ZIP64_LIMIT) as destino:
+                    for bloque in iter(lambda: origen.read(BLOQUE), b''):
+                        destino.write(bloque)
+                        yield salida.vaciar()
+            finally:
+                origen.close()
+            manifiesto.append(datos_fila)
+            yield salida.vaciar()
+
+        texto = io.StringIO()
+        escritor = csv.DictWriter(texto, fieldnames=COLUMNAS_MANIFIESTO)
+        escritor.writeheader()
+        escritor.writerows(manifiesto)
+        # Con BOM para que Excel lo abra en UTF-8
+        archivo_zip.writestr('manifiesto.csv', '\ufeff' + texto.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+    yield salida.vaciar()
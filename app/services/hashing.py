@@ -0,0 +1,79 @@
+# app/services/hashing.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import db
+from app.services.identidad import campos_de
+
+
+class ServicioHash:
+    """
+    Calcula y verifica contraseñas en un pool de hilos acotado. Es un tope de
+    concurrencia, no trabajo en segundo plano: el hilo de la petición espera el
+    resultado. Así, por proceso, no hay más de `hilos` hashes a la vez (cada
+    scrypt usa ~32 MB y un núcleo); el resto espera turno en la cola del pool.
+    Mientras tanto, scrypt y pbkdf2 de hashlib liberan el GIL y los demás hilos
+    del worker siguen atendiendo peticiones.
+    """
+
+    def __init__(self, metodo='scrypt', hilos=None):
+        self.metodo = metodo
+        self.hilos = hilos or os.cpu_count() or 2
+        self._pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='hash')
+        # Werkzeug guarda el método con sus parámetros completos ("scrypt:32768:8:1$..."),
+        # así que se normaliza la política hasheando un valor de prueba una sola vez.
+        self.prefijo = generate_password_hash('politica', method=metodo).split('$', 1)[0]
+
+    def hashear(self, password):
+        return self._pool.submit(generate_password_hash, password, self.metodo).result()
+
+    def verificar(self, password_hash, password):
+        if not password_hash or not password:
+            return False
+        return self._pool.submit(check_password_hash, password_hash, password).result()
+
+    def necesita_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.prefijo
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False)
+
+
+def init_app(app):
+    app.extensions['hash'] = ServicioHash(
+        metodo=app.config['PASSWORD_HASH_METHOD'],
+        hilos=app.config['PASSWORD_HASH_THREADS']
+    )
+
+
+def _servicio():
+    return current_app.extensions['hash']
+
+
+def hashear(password):
+    """Genera el hash de una contraseña con la política configurada."""
+    return _servicio().hashear(password)
+
+
+def verificar_password(usuario, password):
+    """
+    Verifica la contraseña de cualquier rol. Si es correcta pero el hash se generó
+    con una política anterior, se vuelve a hashear y se guarda en el mismo login.
+    """
+    servicio = _servicio()
+    campo = campos_de(usuario)['password']
+    password_hash = getattr(usuario, campo)
+
+    if not servicio.verificar(password_hash, password):
+        return False
+
+    if servicio.necesita_rehash(password_hash):
+        try:
+            setattr(usuario, campo, servicio.hashear(password))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"No se pudo actualizar el hash de {usuario.get_id()}: {e}")
+
+    return True
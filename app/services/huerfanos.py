@@ -0,0 +1,185 @@
+# app/services/huerfanos.py
+import os
+import time
+from flask import current_app
+from app import db
+from app.models.users import Evidencia, ArchivoBlob, Notificacion, NotificacionArchivada
+from app.services.almacen import almacen, PREFIJO_ADJUNTOS
+from app.services.blobs import PREFIJO, abrir_evidencia
+
+# Los archivos huérfanos primero se mueven aquí (dentro de la carpeta revisada) y se
+# borran en una corrida posterior, cuando pasó el margen sin que nada los reclame.
+CUARENTENA = '.cuarentena'
+
+
+def _recorrer(raiz, relativa='', recursivo=True):
+    """(clave relativa, tamaño, mtime) de cada archivo bajo `raiz`, sin listar todo de una vez."""
+    with os.scandir(os.path.join(raiz, relativa) if relativa else raiz) as entradas:
+        for entrada in entradas:
+            clave = f"{relativa}/{entrada.name}" if relativa else entrada.name
+            if entrada.is_dir(follow_symlinks=False):
+                if recursivo and clave != CUARENTENA:
+                    yield from _recorrer(raiz, clave)
+            elif entrada.is_file(follow_symlinks=False) and (recursivo or not entrada.name.startswith('.')):
+                info = entrada.stat(follow_symlinks=False)
+                yield clave, info.st_size, info.st_mtime
+
+
+def _por_lotes(iterable, lote):
+    actual = []
+    for elemento in iterable:
+        actual.append(elemento)
+        if len(actual) >= lote:
+            yield actual
+            actual = []
+    if actual:
+        yield actual
+
+
+def _nombres_heredados(lote):
+    """
+    Nombres de archivo de las evidencias anteriores al almacén. Guardan una ruta
+    absoluta que puede ser de otra instalación, pero el archivo se busca por su
+    nombre en UPLOAD_FOLDER (ver blobs._ruta_heredada), así que se comparan por nombre.
+    """
+    nombres, ultimo = set(), 0
+    while True:
+        filas = db.session.query(Evidencia.id_evidencia, Evidencia.url_archivo).filter(
+            Evidencia.id_evidencia > ultimo, Evidencia.url_archivo != '',
+            ~Evidencia.url_archivo.startswith(PREFIJO)
+        ).order_by(Evidencia.id_evidencia).limit(lote).all()
+        if not filas:
+            return nombres
+        ultimo = filas[-1].id_evidencia
+        nombres.update(os.path.basename(url) for _, url in filas)
+
+
+def _referenciadas(claves, heredados):
+    """Las claves del lote que alguna fila usa: evidencias, blobs (y sus miniaturas) y adjuntos."""
+    nombres = [clave for clave in claves if '/' not in clave]
+    usadas = {nombre for nombre in nombres if nombre in heredados}
+
+    hashes = {}
+    for clave in claves:
+        if clave.startswith(PREFIJO):
+            hashes[clave.rsplit('/', 1)[1].split('.', 1)[0]] = clave
+    if hashes:
+        existentes = {sha for (sha,) in db.session.query(ArchivoBlob.sha256).filter(ArchivoBlob.sha256.in_(list(hashes)))}
+        usadas.update(clave for clave in claves
+                      if clave.startswith(PREFIJO) and clave.rsplit('/', 1)[1].split('.', 1)[0] in existentes)
+
+    # Adjuntos: los anteriores en la raíz, los nuevos en adjuntos/<uuid>_<nombre>
+    adjuntos = nombres + [clave for clave in claves if clave.startswith(PREFIJO_ADJUNTOS)]
+    for modelo in (Notificacion, NotificacionArchivada):
+        if adjuntos:
+            usadas.update(clave for (clave,) in db.session.query(modelo.adjunto).filter(modelo.adjunto.in_(adjuntos)))
+    return usadas
+
+
+def _raices():
+    """
+    (carpeta, recursivo) a revisar: todo EVIDENCIAS_FOLDER y, si es otra carpeta, solo
+    los archivos sueltos de UPLOAD_FOLDER. Ahí quedan las evidencias y los adjuntos
+    anteriores al almacén; sus subcarpetas son recursos públicos y no se tocan.
+    """
+    evidencias = current_app.config['EVIDENCIAS_FOLDER']
+    subidas = current_app.config['UPLOAD_FOLDER']
+    raices = [(evidencias, True)]
+    if os.path.realpath(subidas) != os.path.realpath(evidencias):
+        raices.append((subidas, False))
+    return [(raiz, recursivo) for raiz, recursivo in raices if os.path.isdir(raiz)]
+
+
+def reconciliar_archivos(horas=None, lote=500, simular=False):
+    """
+    Compara EVIDENCIAS_FOLDER y los archivos heredados de UPLOAD_FOLDER con la base de datos:
+      1. Recorre los archivos por lotes (os.scandir) y consulta en bloque cuáles usa
+         alguna fila. Los que nadie usa y llevan más de `horas` sin tocarse pasan a
+         la cuarentena de su carpeta; un archivo recién subido cuya fila aún no hizo
+         commit no se toca.
+      2. En la cuarentena, lo que volvió a estar referenciado se restaura y lo que
+         cumplió el margen se borra.
+      3. Cuenta las evidencias cuyo archivo no está en el almacén.
+    Con el almacén en S3 solo se revisa UPLOAD_FOLDER antes del paso 3. Con `simular`
+    solo informa. Retorna el resumen.
+    """
+    horas = current_app.config['ARCHIVOS_HUERFANOS_GRACIA_HORAS'] if horas is None else horas
+    limite = time.time() - horas * 3600
+    resumen = {
+        'revisados': 0, 'en_cuarentena': 0, 'bytes_en_cuarentena': 0, 'restaurados': 0,
+        'eliminados': 0, 'bytes_recuperados': 0, 'filas_sin_archivo': 0, 'ids_sin_archivo': [],
+    }
+
+    raices = _raices()
+    if almacen().ruta_local('') is None:
+        raices = [(raiz, recursivo) for raiz, recursivo in raices if not recursivo]
+    heredados = _nombres_heredados(lote) if raices else set()
+    for raiz, recursivo in raices:
+        _reconciliar_carpeta(raiz, recursivo, heredados, limite, lote, simular, resumen)
+
+    _contar_filas_sin_archivo(resumen, lote)
+    return resumen
+
+
+def _reconciliar_carpeta(raiz, recursivo, heredados, limite, lote, simular, resumen):
+    cuarentena = os.path.join(raiz, CUARENTENA)
+    for archivos in _por_lotes(_recorrer(raiz, recursivo=recursivo), lote):
+        resumen['revisados'] += len(archivos)
+        usadas = _referenciadas([clave for clave, _, _ in archivos], heredados)
+        for clave, tamano, modificado in archivos:
+            if clave in usadas or modificado >= limite:
+                continue
+            resumen['en_cuarentena'] += 1
+            resumen['bytes_en_cuarentena'] += tamano
+            if not simular:
+                destino = os.path.join(cuarentena, *clave.split('/'))
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                os.replace(os.path.join(raiz, *clave.split('/')), destino)
+                # El mtime marca la entrada a cuarentena: desde ahí corre el margen
+                os.utime(destino)
+        db.session.rollback()
+
+    if os.path.isdir(cuarentena):
+        for archivos in _por_lotes(_recorrer(cuarentena), lote):
+            usadas = _referenciadas([clave for clave, _, _ in archivos], heredados)
+            for clave, tamano, modificado in archivos:
+                ruta = os.path.join(cuarentena, *clave.split('/'))
+                if clave in usadas:
+                    resumen['restaurados'] += 1
+                    if not simular:
+                        original = os.path.join(raiz, *clave.split('/'))
+                        os.makedirs(os.path.dirname(original), exist_ok=True)
+                        os.replace(ruta, original)
+                elif modificado < limite:
+                    resumen['eliminados'] += 1
+                    resumen['bytes_recuperados'] += tamano
+                    if not simular:
+                        os.remove(ruta)
+            db.session.rollback()
+        if not simular:
+            _borrar_carpetas_vacias(cuarentena)
+
+
+def _borrar_carpetas_vacias(carpeta):
+    for actual, _, _ in sorted(os.walk(carpeta), key=lambda item: len(item[0]), reverse=True):
+        if actual != carpeta and not os.listdir(actual):
+            os.rmdir(actual)
+
+
+def _contar_filas_sin_archivo(resumen, lote):
+    ultimo = 0
+    while True:
+        filas = db.session.query(Evidencia.id_evidencia, Evidencia.url_archivo).filter(
+            Evidencia.id_evidencia > ultimo, Evidencia.url_archivo != ''
+        ).order_by(Evidencia.id_evidencia).limit(lote).all()
+        if not filas:
+            break
+        ultimo = filas[-1].id_evidencia
+        for id_evidencia, url in filas:
+            try:
+                abrir_evidencia(url).close()
+            except FileNotFoundError:
+                resumen['filas_sin_archivo'] += 1
+                if len(resumen['ids_sin_archivo']) < 100:
+                    resumen['ids_sin_archivo'].append(id_evidencia)
+        db.session.rollback()
@@ -0,0 +1,223 @@
+# app/services/identidad.py
+from sqlalchemy import event, inspect, or_, and_, case
+from app import db
+from app.models.users import (
+    Administrador, AdministradorSede, Instructor, Aprendiz, IdentidadUsuario
+)
+
+# -------------------------
+# Campos de identidad por rol
+# -------------------------
+# La clave es el prefijo que usa get_id() en cada modelo ("aprendiz-12").
+CAMPOS_POR_ROL = {
+    'administrador': {
+        'modelo': Administrador,
+        'id': 'id_admin',
+        'documento': 'documento',
+        'correo': 'correo',
+        'celular': 'celular',
+        'password': 'password',
+    },
+    'administrador_sede': {
+        'modelo': AdministradorSede,
+        'id': 'id_admin_sede',
+        'documento': 'documento',
+        'correo': 'correo',
+        'celular': 'celular',
+        'password': 'password',
+    },
+    'instructor': {
+        'modelo': Instructor,
+        'id': 'id_instructor',
+        'documento': 'documento',
+        'correo': 'correo_instructor',
+        'celular': 'celular_instructor',
+        'password': 'password_instructor',
+    },
+    'aprendiz': {
+        'modelo': Aprendiz,
+        'id': 'id_aprendiz',
+        'documento': 'documento',
+        'correo': 'correo',
+        'celular': 'celular',
+        'password': 'password_aprendiz',
+    },
+}
+
+CAMPOS_IDENTIDAD = ('documento', 'correo', 'celular')
+
+# Si un documento o correo se repite entre roles (datos anteriores al índice), el
+# login resuelve en el mismo orden en que antes se consultaban las tablas.
+_PRIORIDAD_ROL = case(
+    {rol: orden for orden, rol in enumerate(CAMPOS_POR_ROL)},
+    value=IdentidadUsuario.rol, else_=len(CAMPOS_POR_ROL)
+)
+
+
+def campos_de(usuario):
+    """Devuelve el diccionario de campos del rol del usuario."""
+    return CAMPOS_POR_ROL[usuario.rol_user]
+
+
+def _valores(usuario):
+    campos = campos_de(usuario)
+    return {
+        'rol': usuario.rol_user,
+        'usuario_id': getattr(usuario, campos['id']),
+        'documento': getattr(usuario, campos['documento']),
+        'correo': getattr(usuario, campos['correo']),
+        'celular': getattr(usuario, campos['celular']),
+    }
+
+
+# -------------------------
+# Sincronización (eventos del ORM)
+# -------------------------
+# Se ejecutan dentro de la misma transacción que el INSERT/UPDATE/DELETE del
+# usuario. El índice no rechaza valores repetidos: un usuario con un dato
+# repetido en otro rol sigue pudiendo editar su perfil e iniciar sesión.
+def _al_insertar(mapper, connection, target):
+    connection.execute(IdentidadUsuario.__table__.insert().values(**_valores(target)))
+
+
+def _al_actualizar(mapper, connection, target):
+    campos = campos_de(target)
+    estado = inspect(target)
+    if not any(estado.attrs[campos[c]].history.has_changes() for c in CAMPOS_IDENTIDAD):
+        return
+
+    valores = _valores(target)
+    tabla = IdentidadUsuario.__table__
+    resultado = connection.execute(
+        tabla.update()
+        .where(tabla.c.rol == valores['rol'], tabla.c.usuario_id == valores['usuario_id'])
+        .values(documento=valores['documento'], correo=valores['correo'], celular=valores['celular'])
+    )
+    if resultado.rowcount == 0:
+        connection.execute(tabla.insert().values(**valores))
+
+
+def _al_eliminar(mapper, connection, target):
+    tabla = IdentidadUsuario.__table__
+    connection.execute(
+        tabla.delete().where(
+            tabla.c.rol == target.rol_user,
+            tabla.c.usuario_id == getattr(target, campos_de(target)['id'])
+        )
+    )
+
+
+for _campos in CAMPOS_POR_ROL.values():
+    event.listen(_campos['modelo'], 'after_insert', _al_insertar)
+    event.listen(_campos['modelo'], 'after_update', _al_actualizar)
+    event.listen(_campos['modelo'], 'after_delete', _al_eliminar)
+
+
+# -------------------------
+# Consultas
+# -------------------------
+def obtener_usuario(rol, usuario_id):
+    """Carga el usuario de un rol por su llave primaria."""
+    campos = CAMPOS_POR_ROL.get(rol)
+    if not campos:
+        return None
+    return db.session.get(campos['modelo'], usuario_id)
+
+
+def buscar_por_documento(documento):
+    """Busca un usuario de cualquier rol por documento (una consulta indexada + PK)."""
+    identidad = IdentidadUsuario.query.filter_by(documento=documento).order_by(_PRIORIDAD_ROL).first()
+    if not identidad:
+        return None
+    return obtener_usuario(identidad.rol, identidad.usuario_id)
+
+
+def buscar_por_correo(correo):
+    """Busca un usuario de cualquier rol por correo (una consulta indexada + PK)."""
+    identidad = IdentidadUsuario.query.filter_by(correo=correo).order_by(_PRIORIDAD_ROL).first()
+    if not identidad:
+        return None
+    return obtener_usuario(identidad.rol, identidad.usuario_id)
+
+
+def campo_en_uso(documento=None, correo=None, celular=None, excluir=None):
+    """
+    Verifica en una sola consulta si documento, correo o celular ya están registrados
+    en cualquier rol. `excluir` es el usuario que se está editando (no choca consigo mismo).
+    Retorna 'documento', 'correo', 'celular' o None.
+    """
+    buscados = {'documento': documento, 'correo': correo, 'celular': celular}
+    condiciones = [
+        getattr(IdentidadUsuario, campo) == valor
+        for campo, valor in buscados.items() if valor
+    ]
+    if not condiciones:
+        return None
+
+    query = IdentidadUsuario.query.filter(or_(*condiciones))
+    if excluir is not None:
+        query = query.filter(~and_(
+            IdentidadUsuario.rol == excluir.rol_user,
+            IdentidadUsuario.usuario_id == getattr(excluir, campos_de(excluir)['id'])
+        ))
+
+    encontrados = query.all()
+    for campo in CAMPOS_IDENTIDAD:
+        valor = buscados[campo]
+        if valor and any(getattr(i, campo) == valor for i in encontrados):
+            return campo
+    return None
+
+
+# -------------------------
+# Reconstrucción
+# -------------------------
+def reconstruir_identidades(lote=500):
+    """
+    Vacía el índice y lo reconstruye desde las tablas de usuarios. Todos los usuarios
+    quedan indexados; los valores repetidos entre roles solo se informan.
+    Retorna (filas_insertadas, conflictos) con conflictos = [(rol, usuario_id, [campos])].
+    """
+    tabla = IdentidadUsuario.__table__
+    db.session.execute(tabla.delete())
+
+    vistos = {campo: {} for campo in CAMPOS_IDENTIDAD}
+    filas, conflictos, insertadas = [], [], 0
+
+    for rol, campos in CAMPOS_POR_ROL.items():
+        modelo = campos['modelo']
+        columnas = [getattr(modelo, campos[c]) for c in ('id',) + CAMPOS_IDENTIDAD]
+        for usuario_id, documento, correo, celular in db.session.query(*columnas).yield_per(lote):
+            valores = {'documento': documento, 'correo': correo, 'celular': celular}
+            repetidos = [c for c, v in valores.items() if v and vistos[c].get(v, rol) != rol]
+            if repetidos:
+                conflictos.append((rol, usuario_id, repetidos))
+            for campo, valor in valores.items():
+                if valor:
+                    vistos[campo].setdefault(valor, rol)
+            filas.append(dict(rol=rol, usuario_id=usuario_id, **valores))
+
+            if len(filas) >= lote:
+                db.session.execute(tabla.insert(), filas)
+                insertadas += len(filas)
+                filas = []
+
+    if filas:
+        db.session.execute(tabla.insert(), filas)
+        insertadas += len(filas)
+
+    db.session.commit()
+    return insertadas, conflictos
+
+
+def asegurar_identidades():
+    """Construye el índice la primera vez (tabla vacía con usuarios ya registrados)."""
+    if IdentidadUsuario.query.first() is not None:
+        return None
+    hay_usuarios = any(
+        db.session.query(campos['modelo']).first() is not None
+        for campos in CAMPOS_POR_ROL.values()
+    )
+    if not hay_usuarios:
+        return None
+    return reconstruir_identidades()
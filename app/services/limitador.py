@@ -0,0 +1,161 @@
+# app/services/limitador.py
+import threading
+import time
+from collections import OrderedDict, Counter
+from functools import wraps
+from flask import current_app, request, redirect, flash
+
+try:
+    import redis
+except ImportError:  # El backend compartido es opcional
+    redis = None
+
+
+# -------------------------
+# Backends de cubetas de tokens
+# -------------------------
+class CubetasMemoria:
+    """Cubetas de tokens en memoria del proceso (cada worker lleva su propia cuenta)."""
+
+    def __init__(self, max_claves=100000):
+        self.max_claves = max_claves
+        self._cubetas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, clave, capacidad, ventana):
+        ahora = time.monotonic()
+        tasa = capacidad / ventana
+        with self._lock:
+            tokens, ultimo = self._cubetas.get(clave, (capacidad, ahora))
+            tokens = min(capacidad, tokens + (ahora - ultimo) * tasa)
+            permitido = tokens >= 1
+            if permitido:
+                tokens -= 1
+            self._cubetas[clave] = (tokens, ahora)
+            self._cubetas.move_to_end(clave)
+            while len(self._cubetas) > self.max_claves:
+                self._cubetas.popitem(last=False)
+        return permitido
+
+
+class CubetasRedis:
+    """Cubetas de tokens compartidas entre workers; el cálculo es atómico en Redis."""
+
+    SCRIPT = """
+    local capacidad = tonumber(ARGV[1])
+    local tasa = tonumber(ARGV[2])
+    local ahora = tonumber(ARGV[3])
+    local datos = redis.call('HMGET', KEYS[1], 't', 'u')
+    local tokens = tonumber(datos[1]) or capacidad
+    local ultimo = tonumber(datos[2]) or ahora
+    tokens = math.min(capacidad, tokens + (ahora - ultimo) * tasa)
+    local permitido = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        permitido = 1
+    end
+    redis.call('HSET', KEYS[1], 't', tokens, 'u', ahora)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacidad / tasa))
+    return permitido
+    """
+
+    def __init__(self, url):
+        self._cliente = redis.Redis.from_url(url)
+        self._script = self._cliente.register_script(self.SCRIPT)
+        # Si Redis no responde se sigue limitando por proceso
+        self._respaldo = CubetasMemoria()
+
+    def consumir(self, clave, capacidad, ventana):
+        try:
+            return bool(self._script(
+                keys=[f"limitador:{clave}"],
+                args=[capacidad, capacidad / ventana, time.time()]
+            ))
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Limitador sin Redis, usando memoria local: {e}")
+            return self._respaldo.consumir(clave, capacidad, ventana)
+
+
+class Limitador:
+    def __init__(self, backend, limite_ip, limite_identidad, ventana, activo=True):
+        self.backend = backend
+        self.limite_ip = limite_ip
+        self.limite_identidad = limite_identidad
+        self.ventana = ventana
+        self.activo = activo
+        self.permitidas = 0
+        self.rechazadas = Counter()
+        self._lock = threading.Lock()
+
+    def permitir(self, ruta, ip, identidad=None):
+        """Consume un token de la IP y, si se conoce, otro de la identidad atacada."""
+        if not self.activo:
+            return True
+
+        motivo = None
+        if not self.backend.consumir(f"ip:{ruta}:{ip}", self.limite_ip, self.ventana):
+            motivo = 'ip'
+        elif identidad and not self.backend.consumir(
+                f"id:{ruta}:{identidad}", self.limite_identidad, self.ventana):
+            motivo = 'identidad'
+
+        with self._lock:
+            if motivo:
+                self.rechazadas[f"{ruta}:{motivo}"] += 1
+            else:
+                self.permitidas += 1
+        return motivo is None
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'permitidas': self.permitidas,
+                'rechazadas': sum(self.rechazadas.values()),
+                'rechazadas_por_ruta': dict(self.rechazadas),
+            }
+
+
+def init_app(app):
+    url = app.config.get('RATE_LIMIT_REDIS_URL')
+    if url and redis is None:
+        app.logger.warning("RATE_LIMIT_REDIS_URL definido pero el paquete redis no está instalado.")
+    backend = CubetasRedis(url) if url and redis is not None else CubetasMemoria()
+
+    app.extensions['limitador'] = Limitador(
+        backend,
+        limite_ip=app.config['RATE_LIMIT_IP'],
+        limite_identidad=app.config['RATE_LIMIT_IDENTIDAD'],
+        ventana=app.config['RATE_LIMIT_VENTANA'],
+        activo=app.config['RATE_LIMIT_ENABLED']
+    )
+
+
+def estadisticas():
+    return current_app.extensions['limitador'].estadisticas()
+
+
+# -------------------------------
+# Decorador para rutas de login y recuperación
+# -------------------------------
+def limitar_intentos(campo=None):
+    """
+    Rechaza los POST que superan el límite antes de consultar la base de datos o
+    calcular un hash. `campo` es el dato que identifica a la cuenta atacada: se busca
+    en el formulario y, si no está, en los argumentos de la URL.
+    """
+    def decorador(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method == 'POST':
+                identidad = None
+                if campo:
+                    identidad = request.form.get(campo) or kwargs.get(campo)
+                    identidad = identidad.strip().lower() if identidad else None
+
+                limitador = current_app.extensions['limitador']
+                if not limitador.permitir(request.endpoint, request.remote_addr, identidad):
+                    flash('Demasiados intentos. Espera un momento antes de volver a intentarlo.', 'warning')
+                    return redirect(request.url)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorador
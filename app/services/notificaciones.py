@@ -0,0 +1,879 @@
+# app/services/notificaciones.py
+import atexit
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, exists, select, insert, literal, event, func, inspect, text, bindparam
+from sqlalchemy.orm import object_session, joinedload
+from app import db
+from app.models.users import (
+    Notificacion, NotificacionArchivada, NotificacionLectura, ContadorNotificacion, ContadorDifusion, Evidencia
+)
+from app.services.cache import CacheTTL
+from app.services.eventos import publicar_al_confirmar, canal_usuario, canal_rol, bus
+from app.services.identidad import CAMPOS_POR_ROL
+
+# -------------------------
+# Roles tal como se guardan en notificacion.rol_destinatario
+# -------------------------
+ROL_NOTIFICACION = {
+    'administrador': 'Administrador',
+    'administrador_sede': 'AdministradorSede',
+    'instructor': 'Instructor',
+    'aprendiz': 'Aprendiz',
+}
+
+# Objetos referenciados que las vistas de lista y detalle cargan en la misma consulta
+CARGA_REFERENCIAS = (
+    joinedload(Notificacion.evidencia),
+    joinedload(Notificacion.aprendiz),
+)
+
+# Variantes que aparecen en datos antiguos ("administrador", "Administrador Sede", ...)
+_VARIANTES_ROL = {
+    clave.replace('_', ''): rol for clave, rol in ROL_NOTIFICACION.items()
+}
+
+
+# Rol canónico -> clave de CAMPOS_POR_ROL
+_CLAVE_POR_ROL = {rol: clave for clave, rol in ROL_NOTIFICACION.items()}
+
+# Columnas con el nombre visible de cada rol (por defecto nombre/apellido)
+_CAMPOS_NOMBRE = {
+    'instructor': ('nombre_instructor', 'apellido_instructor'),
+}
+
+
+def init_app(app):
+    app.extensions['cache_remitentes'] = CacheTTL(
+        maxsize=app.config['NOTIFICACIONES_REMITENTES_CACHE_MAXSIZE'],
+        ttl=app.config['NOTIFICACIONES_REMITENTES_CACHE_TTL']
+    )
+    buffer = BufferLecturas(app, intervalo=app.config['NOTIFICACIONES_LECTURAS_INTERVALO'])
+    app.extensions['buffer_lecturas'] = buffer
+    atexit.register(buffer.vaciar)
+
+
+def normalizar_rol(rol):
+    """Convierte cualquier variante de nombre de rol a la forma canónica."""
+    if not rol:
+        return rol
+    return _VARIANTES_ROL.get(rol.replace(' ', '').replace('_', '').lower(), rol)
+
+
+def destinatario_de(usuario):
+    """Retorna (rol, id) del usuario tal como se usan en las notificaciones."""
+    return (
+        ROL_NOTIFICACION[usuario.rol_user],
+        getattr(usuario, CAMPOS_POR_ROL[usuario.rol_user]['id'])
+    )
+
+
+# -------------------------
+# Envío
+# -------------------------
+def difundir(rol_destinatario, mensaje, remitente_id, rol_remitente, motivo=None):
+    """
+    Envía una notificación a todos los usuarios de un rol con una sola fila.
+    No hace commit: se confirma junto con el cambio que la origina.
+    """
+    noti = Notificacion(
+        motivo=motivo,
+        mensaje=mensaje,
+        remitente_id=remitente_id,
+        rol_remitente=rol_remitente,
+        destinatario_id=None,
+        rol_destinatario=normalizar_rol(rol_destinatario),
+        visto=False
+    )
+    db.session.add(noti)
+    return noti
+
+
+# -------------------------
+# Consultas de bandeja
+# -------------------------
+def filtro_bandeja(usuario):
+    """Condición de las notificaciones visibles para el usuario: directas y de su rol."""
+    rol, usuario_id = destinatario_de(usuario)
+    return and_(
+        Notificacion.rol_destinatario == rol,
+        or_(Notificacion.destinatario_id == usuario_id, Notificacion.destinatario_id.is_(None))
+    )
+
+
+def cursor_difusion(rol, usuario_id):
+    """Id de la última difusión que el usuario marcó como leída con "marcar todas" (0 si nunca)."""
+    contador = db.session.get(ContadorNotificacion, (rol, usuario_id))
+    return (contador.ultima_difusion_leida or 0) if contador else 0
+
+
+def contar_no_leidas(usuario):
+    """
+    Notificaciones sin leer leídas de los contadores (dos búsquedas por llave primaria):
+    directas pendientes + difusiones del rol que el usuario aún no ha leído.
+    """
+    return contar_no_leidas_de(*destinatario_de(usuario))
+
+
+def contar_no_leidas_de(rol, usuario_id):
+    """Igual que contar_no_leidas, a partir del rol canónico y el id (sin cargar el usuario)."""
+    contador = db.session.get(ContadorNotificacion, (rol, usuario_id))
+    difusion = db.session.get(ContadorDifusion, rol)
+    # Lecturas de este proceso que aún no se han escrito
+    pendientes = Counter(_buffer().pendientes_de(rol, usuario_id).values())
+
+    directas = (contador.no_leidas if contador else 0) - pendientes[False]
+    leidas = (contador.difusiones_leidas if contador else 0) + pendientes[True]
+    total = difusion.total if difusion else 0
+    return max(directas, 0) + max(total - leidas, 0)
+
+
+def ids_leidos(notificaciones, usuario):
+    """IDs de la lista que el usuario ya leyó (una consulta para las difusiones)."""
+    rol, usuario_id = destinatario_de(usuario)
+    leidos = {n.id for n in notificaciones if n.destinatario_id is not None and n.visto}
+    leidos.update(_buffer().pendientes_de(rol, usuario_id))
+    cursor = cursor_difusion(rol, usuario_id)
+    leidos.update(n.id for n in notificaciones if n.destinatario_id is None and n.id <= cursor)
+    difusiones = [n.id for n in notificaciones if n.destinatario_id is None and n.id > cursor]
+    if difusiones:
+        leidos.update(fila[0] for fila in db.session.query(NotificacionLectura.notificacion_id).filter(
+            NotificacionLectura.notificacion_id.in_(difusiones),
+            NotificacionLectura.rol == rol,
+            NotificacionLectura.usuario_id == usuario_id
+        ))
+    return leidos
+
+
+# -------------------------
+# Paginación por cursor
+# -------------------------
+class PaginaBandeja:
+    """Una página de la bandeja y los cursores para moverse a la siguiente o la anterior."""
+
+    def __init__(self, items, antes_de=None, despues_de=None, total=None):
+        self.items = items
+        self.antes_de = antes_de      # id para pedir las más antiguas (None = no hay)
+        self.despues_de = despues_de  # id para pedir las más recientes (None = es la primera)
+        self.total = total            # aproximado; None si no se pidió
+
+
+def _rama_bandeja(modelo, condicion, cursor, recientes, limite):
+    query = modelo.query.options(joinedload(modelo.evidencia), joinedload(modelo.aprendiz)).filter(condicion)
+    orden = (modelo.fecha_creacion.desc(), modelo.id.desc())
+    if cursor is not None:
+        if recientes:
+            query = query.filter(or_(
+                modelo.fecha_creacion > cursor.fecha_creacion,
+                and_(modelo.fecha_creacion == cursor.fecha_creacion, modelo.id > cursor.id)
+            ))
+            orden = (modelo.fecha_creacion.asc(), modelo.id.asc())
+        else:
+            query = query.filter(or_(
+                modelo.fecha_creacion < cursor.fecha_creacion,
+                and_(modelo.fecha_creacion == cursor.fecha_creacion, modelo.id < cursor.id)
+            ))
+    return query.order_by(*orden).limit(limite).all()
+
+
+def paginar_bandeja(usuario, antes_de=None, despues_de=None, por_pagina=None, archivadas=False):
+    """
+    Página de la bandeja (directas + difusiones del rol) ordenada de la más reciente a
+    la más antigua, a partir del id de la última (antes_de) o la primera (despues_de)
+    notificación de la página vista. Sin COUNT ni OFFSET: cada rama usa
+    ix_notificacion_bandeja_fecha y lee a lo sumo por_pagina + 1 filas.
+    Con archivadas=True recorre notificacion_archivada (solo hay directas).
+    """
+    por_pagina = por_pagina or current_app.config['NOTIFICACIONES_POR_PAGINA']
+    rol, usuario_id = destinatario_de(usuario)
+    recientes = antes_de is None and despues_de is not None
+    modelo = NotificacionArchivada if archivadas else Notificacion
+
+    cursor = None
+    if antes_de is not None or despues_de is not None:
+        cursor = db.session.get(modelo, despues_de if recientes else antes_de)
+        if cursor is None or cursor.rol_destinatario != rol:
+            cursor, recientes = None, False
+
+    ramas = [and_(modelo.rol_destinatario == rol, modelo.destinatario_id == usuario_id)]
+    if not archivadas:
+        ramas.append(and_(modelo.rol_destinatario == rol, modelo.destinatario_id.is_(None)))
+    filas = [n for rama in ramas for n in _rama_bandeja(modelo, rama, cursor, recientes, por_pagina + 1)]
+    filas.sort(key=lambda n: (n.fecha_creacion, n.id), reverse=not recientes)
+    hay_mas = len(filas) > por_pagina
+    items = filas[:por_pagina]
+
+    if recientes:
+        items.reverse()
+        antes = items[-1].id if items else None
+        despues = items[0].id if items and hay_mas else None
+    else:
+        antes = items[-1].id if items and hay_mas else None
+        despues = items[0].id if items and cursor is not None else None
+
+    total = None
+    if current_app.config['NOTIFICACIONES_TOTAL_APROXIMADO'] and not archivadas:
+        total = total_aproximado(usuario)
+    return PaginaBandeja(items, antes_de=antes, despues_de=despues, total=total)
+
+
+def archivada_de(usuario, noti_id):
+    """Notificación archivada dirigida al usuario, o 404."""
+    rol, usuario_id = destinatario_de(usuario)
+    return NotificacionArchivada.query.options(
+        joinedload(NotificacionArchivada.evidencia), joinedload(NotificacionArchivada.aprendiz)
+    ).filter_by(id=noti_id, rol_destinatario=rol, destinatario_id=usuario_id).first_or_404()
+
+
+def puede_ver_adjunto(usuario, nombre):
+    """True si el adjunto viene en una notificación (vigente o archivada) que el usuario recibió o envió."""
+    rol, usuario_id = destinatario_de(usuario)
+    for modelo in (Notificacion, NotificacionArchivada):
+        filas = db.session.query(
+            modelo.rol_destinatario, modelo.destinatario_id, modelo.rol_remitente, modelo.remitente_id
+        ).filter(modelo.adjunto == nombre)
+        for rol_destinatario, destinatario_id, rol_remitente, remitente_id in filas:
+            if normalizar_rol(rol_destinatario) == rol and destinatario_id in (usuario_id, None):
+                return True
+            if normalizar_rol(rol_remitente) == rol and remitente_id == usuario_id:
+                return True
+    return False
+
+
+def total_aproximado(usuario):
+    """
+    Total de la bandeja. En PostgreSQL usa la estimación del planificador (no recorre
+    la tabla); en otros motores hace el COUNT exacto.
+    """
+    query = Notificacion.query.filter(filtro_bandeja(usuario))
+    if db.engine.dialect.name != 'postgresql':
+        return query.count()
+
+    sql = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    plan = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+# -------------------------
+# Nombres de remitentes
+# -------------------------
+def _cache_remitentes():
+    return current_app.extensions['cache_remitentes']
+
+
+def _clave_remitente(noti):
+    clave = _CLAVE_POR_ROL.get(normalizar_rol((noti.rol_remitente or "").strip()))
+    if clave is None or noti.remitente_id is None:
+        return None
+    return clave, noti.remitente_id
+
+
+def nombres_remitentes(notificaciones):
+    """
+    Asigna noti.remitente_nombre a cada notificación de la página ("Sistema" si no se
+    encuentra). Lo que no está en la cache se resuelve con un solo IN por rol.
+    """
+    cache = _cache_remitentes()
+    nombres, pendientes = {}, {}
+    for noti in notificaciones:
+        clave = _clave_remitente(noti)
+        if clave is None or clave in nombres:
+            continue
+        nombre = cache.get(clave)
+        if nombre is None:
+            pendientes.setdefault(clave[0], set()).add(clave[1])
+        else:
+            nombres[clave] = nombre
+
+    for rol, ids in pendientes.items():
+        campos = CAMPOS_POR_ROL[rol]
+        modelo = campos['modelo']
+        columna_nombre, columna_apellido = _CAMPOS_NOMBRE.get(rol, ('nombre', 'apellido'))
+        filas = db.session.query(
+            getattr(modelo, campos['id']), getattr(modelo, columna_nombre), getattr(modelo, columna_apellido)
+        ).filter(getattr(modelo, campos['id']).in_(ids))
+        for usuario_id, nombre, apellido in filas:
+            nombres[(rol, usuario_id)] = f"{nombre or ''} {apellido or ''}".strip()
+            cache.set((rol, usuario_id), nombres[(rol, usuario_id)])
+
+    for noti in notificaciones:
+        noti.remitente_nombre = nombres.get(_clave_remitente(noti)) or "Sistema"
+    return notificaciones
+
+
+def nombre_remitente(noti):
+    """Nombre simple del remitente de una notificación (o "Sistema")."""
+    return nombres_remitentes([noti])[0].remitente_nombre
+
+
+def _al_cambiar_perfil(mapper, connection, target):
+    cache = current_app.extensions.get('cache_remitentes') if current_app else None
+    if cache is not None:
+        cache.invalidar((target.rol_user, getattr(target, CAMPOS_POR_ROL[target.rol_user]['id'])))
+
+
+for _campos in CAMPOS_POR_ROL.values():
+    event.listen(_campos['modelo'], 'after_update', _al_cambiar_perfil)
+    event.listen(_campos['modelo'], 'after_delete', _al_cambiar_perfil)
+
+
+# -------------------------
+# Lectura (sin commit)
+# -------------------------
+def _avisar_lectura(rol, usuario_id):
+    publicar_al_confirmar(db.session(), db.session.connection(), canal_usuario(rol, usuario_id), {'tipo': 'leida'})
+
+
+def marcar_leida(noti, usuario):
+    rol, usuario_id = destinatario_de(usuario)
+    if noti.destinatario_id is not None:
+        if not noti.visto:
+            noti.visto = True
+            _avisar_lectura(rol, usuario_id)
+        return
+
+    if noti.id <= cursor_difusion(rol, usuario_id):
+        return
+    if db.session.get(NotificacionLectura, (noti.id, rol, usuario_id)) is None:
+        db.session.add(NotificacionLectura(notificacion_id=noti.id, rol=rol, usuario_id=usuario_id))
+        _avisar_lectura(rol, usuario_id)
+
+
+def marcar_todas_leidas(usuario):
+    """
+    Un UPDATE para las directas pendientes y, para las difusiones, una sola fila:
+    el cursor del usuario avanza hasta la última difusión del rol.
+    """
+    rol, usuario_id = destinatario_de(usuario)
+    connection = db.session.connection()
+
+    directas = Notificacion.query.filter_by(
+        rol_destinatario=rol, destinatario_id=usuario_id, visto=False
+    ).update({Notificacion.visto: True}, synchronize_session=False)
+
+    # Las operaciones masivas no disparan los eventos del ORM: ajustar a mano
+    _ajustar_contador(connection, rol, usuario_id, no_leidas=-directas)
+
+    # Máximo del canal y total del rol en la misma sentencia, así no se cuela una
+    # difusión nueva entre la lectura de uno y otro
+    tabla = ContadorNotificacion.__table__
+    maximo = select(func.max(Notificacion.id)).where(
+        Notificacion.rol_destinatario == rol, Notificacion.destinatario_id.is_(None)
+    ).scalar_subquery()
+    total = select(ContadorDifusion.total).where(ContadorDifusion.rol == rol).scalar_subquery()
+    valores = {
+        'ultima_difusion_leida': maximo,
+        'difusiones_leidas': func.coalesce(total, 0),
+    }
+    difusiones = connection.execute(
+        tabla.update()
+        .where(tabla.c.rol == rol, tabla.c.usuario_id == usuario_id,
+               func.coalesce(tabla.c.ultima_difusion_leida, 0) < func.coalesce(maximo, 0))
+        .values(**valores)
+    ).rowcount
+    if not difusiones and db.session.get(ContadorNotificacion, (rol, usuario_id)) is None:
+        difusiones = connection.execute(tabla.insert().values(
+            rol=rol, usuario_id=usuario_id, no_leidas=0, **valores
+        )).rowcount
+
+    if directas or difusiones:
+        _avisar_lectura(rol, usuario_id)
+
+
+# -------------------------
+# Lectura diferida (vistas de detalle)
+# -------------------------
+class BufferLecturas:
+    """
+    Acumula en memoria las lecturas hechas al abrir una notificación y las escribe
+    en bloque cada `intervalo` segundos y al apagar el proceso. Si el worker muere
+    antes, se pierden sin daño: la notificación vuelve a verse como no leída y se
+    marca en la siguiente visita. Con intervalo 0 se escriben en el momento.
+    """
+
+    def __init__(self, app, intervalo=0.3, maximo=5000):
+        self.app = app
+        self.intervalo = intervalo
+        self.maximo = maximo
+        self.escritas = 0
+        self.descartadas = 0
+        self._pendientes = {}  # (rol, usuario_id) -> {notificacion_id: es_difusion}
+        self._en_curso = {}
+        self._cantidad = 0
+        self._lock = threading.Lock()
+        self._vaciando = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = None
+
+    def registrar(self, rol, usuario_id, notificacion_id, difusion):
+        with self._lock:
+            ids = self._pendientes.setdefault((rol, usuario_id), {})
+            if notificacion_id not in ids:
+                ids[notificacion_id] = difusion
+                self._cantidad += 1
+            lleno = self._cantidad >= self.maximo
+        if self.intervalo <= 0:
+            self.vaciar()
+            return
+        self._iniciar()
+        if lleno:
+            self._despertar.set()
+
+    def pendientes_de(self, rol, usuario_id):
+        """{notificacion_id: es_difusion} leídas por el usuario y aún sin escribir."""
+        with self._lock:
+            ids = dict(self._en_curso.get((rol, usuario_id), {}))
+            ids.update(self._pendientes.get((rol, usuario_id), {}))
+        return ids
+
+    def vaciar(self):
+        """Escribe todo lo pendiente en una transacción propia. Retorna las filas escritas."""
+        with self._vaciando:
+            with self._lock:
+                lote, self._pendientes, self._cantidad = self._pendientes, {}, 0
+                self._en_curso = lote
+            if not lote:
+                return 0
+            try:
+                with self.app.app_context():
+                    escritas = _escribir_lecturas(lote)
+                    db.session.commit()
+            except Exception as e:
+                escritas = 0
+                self.app.logger.warning(f"No se pudieron escribir {len(lote)} grupos de lecturas: {e}")
+                self._reintentar(lote)
+            finally:
+                with self._lock:
+                    self._en_curso = {}
+            self.escritas += escritas
+            return escritas
+
+    def estadisticas(self):
+        with self._lock:
+            return {'pendientes': self._cantidad, 'escritas': self.escritas, 'descartadas': self.descartadas}
+
+    def _reintentar(self, lote):
+        # Se vuelven a encolar mientras quepan; perderlas solo deja la notificación sin leer
+        with self._lock:
+            for clave, ids in lote.items():
+                destino = self._pendientes.setdefault(clave, {})
+                for notificacion_id, difusion in ids.items():
+                    if notificacion_id in destino:
+                        continue
+                    if self._cantidad >= self.maximo:
+                        self.descartadas += 1
+                        continue
+                    destino[notificacion_id] = difusion
+                    self._cantidad += 1
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._ejecutar, name='lecturas-notificaciones', daemon=True)
+                self._hilo.start()
+
+    def _ejecutar(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            self.vaciar()
+
+
+def _buffer():
+    return current_app.extensions['buffer_lecturas']
+
+
+def estadisticas():
+    return _buffer().estadisticas()
+
+
+def _escribir_lecturas(lote):
+    """
+    Un UPDATE ... WHERE id IN (...) para todas las directas del lote y un INSERT ... SELECT
+    por usuario para sus difusiones. Lo que ya estaba leído (por otra vía o con el cursor
+    de "marcar todas") se filtra en la misma sentencia. Retorna las filas escritas.
+    """
+    connection = db.session.connection()
+    afectados = set()
+    escritas = 0
+
+    directas = [i for ids in lote.values() for i, difusion in ids.items() if not difusion]
+    if directas:
+        tabla = Notificacion.__table__
+        marcadas = connection.execute(
+            tabla.update()
+            .where(tabla.c.id.in_(directas), tabla.c.destinatario_id.isnot(None),
+                   or_(tabla.c.visto.is_(False), tabla.c.visto.is_(None)))
+            .values(visto=True)
+            .returning(tabla.c.rol_destinatario, tabla.c.destinatario_id)
+        ).all()
+        for (rol, usuario_id), total in Counter(map(tuple, marcadas)).items():
+            _ajustar_contador(connection, rol, usuario_id, no_leidas=-total)
+            afectados.add((rol, usuario_id))
+        escritas += len(marcadas)
+
+    ahora = datetime.utcnow()
+    for (rol, usuario_id), ids in lote.items():
+        difusiones = [i for i, difusion in ids.items() if difusion]
+        if not difusiones:
+            continue
+        cursor = select(ContadorNotificacion.ultima_difusion_leida).where(
+            ContadorNotificacion.rol == rol, ContadorNotificacion.usuario_id == usuario_id
+        ).scalar_subquery()
+        ya_leida = exists().where(
+            NotificacionLectura.notificacion_id == Notificacion.id,
+            NotificacionLectura.rol == rol,
+            NotificacionLectura.usuario_id == usuario_id
+        )
+        nuevas = select(Notificacion.id, literal(rol), literal(usuario_id), literal(ahora)).where(
+            Notificacion.id.in_(difusiones),
+            Notificacion.rol_destinatario == rol,
+            Notificacion.destinatario_id.is_(None),
+            Notificacion.id > func.coalesce(cursor, 0),
+            ~ya_leida
+        )
+        insertadas = connection.execute(insert(NotificacionLectura).from_select(
+            ['notificacion_id', 'rol', 'usuario_id', 'fecha_lectura'], nuevas
+        )).rowcount
+        if insertadas:
+            _ajustar_contador(connection, rol, usuario_id, difusiones_leidas=insertadas)
+            afectados.add((rol, usuario_id))
+            escritas += insertadas
+
+    # Avisa a los streams de otros workers (en este ya se avisó al registrar)
+    for rol, usuario_id in afectados:
+        _avisar_lectura(rol, usuario_id)
+    return escritas
+
+
+def registrar_lectura(noti, usuario):
+    """
+    Marca la notificación como leída sin abrir una transacción de escritura: la lectura
+    se encola en el buffer del proceso y el badge se actualiza en el momento.
+    """
+    rol, usuario_id = destinatario_de(usuario)
+    if noti.destinatario_id is not None:
+        if noti.visto:
+            return
+    elif noti.id <= cursor_difusion(rol, usuario_id) or \
+            db.session.get(NotificacionLectura, (noti.id, rol, usuario_id)) is not None:
+        return
+
+    buffer = _buffer()
+    if noti.id in buffer.pendientes_de(rol, usuario_id):
+        return
+    buffer.registrar(rol, usuario_id, noti.id, noti.destinatario_id is None)
+    bus().publicar(canal_usuario(rol, usuario_id), {'tipo': 'leida'})
+
+
+# -------------------------
+# Contadores de no leídas (eventos del ORM)
+# -------------------------
+# Se actualizan con UPDATE ... SET x = x + n dentro de la misma transacción que
+# la notificación o la lectura, así que nunca quedan a medias.
+def _ajustar_contador(connection, rol, usuario_id, no_leidas=0, difusiones_leidas=0):
+    if not rol or usuario_id is None or not (no_leidas or difusiones_leidas):
+        return
+    tabla = ContadorNotificacion.__table__
+    resultado = connection.execute(
+        tabla.update()
+        .where(tabla.c.rol == rol, tabla.c.usuario_id == usuario_id)
+        .values(no_leidas=tabla.c.no_leidas + no_leidas,
+                difusiones_leidas=tabla.c.difusiones_leidas + difusiones_leidas)
+    )
+    if resultado.rowcount == 0:
+        connection.execute(tabla.insert().values(
+            rol=rol, usuario_id=usuario_id, no_leidas=no_leidas, difusiones_leidas=difusiones_leidas
+        ))
+
+
+def _ajustar_difusiones(connection, rol, delta):
+    if not rol:
+        return
+    tabla = ContadorDifusion.__table__
+    resultado = connection.execute(
+        tabla.update().where(tabla.c.rol == rol).values(total=tabla.c.total + delta)
+    )
+    if resultado.rowcount == 0:
+        connection.execute(tabla.insert().values(rol=rol, total=delta))
+
+
+def _al_insertar_notificacion(mapper, connection, target):
+    if target.destinatario_id is None:
+        _ajustar_difusiones(connection, target.rol_destinatario, 1)
+    elif not target.visto:
+        _ajustar_contador(connection, target.rol_destinatario, target.destinatario_id, no_leidas=1)
+
+    # Aviso en vivo para los streams SSE (se entrega solo si hay commit)
+    sesion = object_session(target)
+    if sesion is not None and target.rol_destinatario:
+        canal = (canal_rol(target.rol_destinatario) if target.destinatario_id is None
+                 else canal_usuario(target.rol_destinatario, target.destinatario_id))
+        publicar_al_confirmar(sesion, connection, canal, {
+            'tipo': 'notificacion',
+            'id': target.id,
+            'motivo': (target.motivo or '')[:100],
+        })
+
+
+def _al_actualizar_notificacion(mapper, connection, target):
+    if target.destinatario_id is None:
+        return
+    historial = inspect(target).attrs.visto.history
+    if not historial.has_changes():
+        return
+    antes = bool(historial.deleted[0]) if historial.deleted else False
+    if antes != bool(target.visto):
+        _ajustar_contador(connection, target.rol_destinatario, target.destinatario_id,
+                          no_leidas=1 if antes else -1)
+
+
+def _antes_de_eliminar_notificacion(mapper, connection, target):
+    if target.destinatario_id is not None:
+        if not target.visto:
+            _ajustar_contador(connection, target.rol_destinatario, target.destinatario_id, no_leidas=-1)
+        return
+
+    # La difusión contaba como leída para quien la pasó con el cursor o tiene su
+    # lectura (que se borra en cascada): descontarla antes de que desaparezca
+    lecturas = NotificacionLectura.__table__
+    tabla = ContadorNotificacion.__table__
+    connection.execute(
+        tabla.update()
+        .where(tabla.c.rol == target.rol_destinatario, or_(
+            tabla.c.ultima_difusion_leida >= target.id,
+            tabla.c.usuario_id.in_(
+                select(lecturas.c.usuario_id).where(
+                    lecturas.c.notificacion_id == target.id,
+                    lecturas.c.rol == target.rol_destinatario
+                )
+            )
+        ))
+        .values(difusiones_leidas=tabla.c.difusiones_leidas - 1)
+    )
+    _ajustar_difusiones(connection, target.rol_destinatario, -1)
+
+
+def _al_insertar_lectura(mapper, connection, target):
+    _ajustar_contador(connection, target.rol, target.usuario_id, difusiones_leidas=1)
+
+
+event.listen(Notificacion, 'after_insert', _al_insertar_notificacion)
+event.listen(Notificacion, 'after_update', _al_actualizar_notificacion)
+event.listen(Notificacion, 'before_delete', _antes_de_eliminar_notificacion)
+event.listen(NotificacionLectura, 'after_insert', _al_insertar_lectura)
+
+
+# -------------------------
+# Reconstrucción
+# -------------------------
+def reconstruir_contadores():
+    """
+    Vacía los contadores y los recalcula desde notificacion y notificacion_lectura,
+    conservando el cursor de difusiones de cada usuario.
+    No hace commit. Retorna (filas_por_destinatario, filas_por_rol).
+    """
+    cursores = {
+        (rol, usuario_id): cursor
+        for rol, usuario_id, cursor in db.session.query(
+            ContadorNotificacion.rol, ContadorNotificacion.usuario_id,
+            ContadorNotificacion.ultima_difusion_leida
+        ).filter(ContadorNotificacion.ultima_difusion_leida.isnot(None))
+    }
+    db.session.execute(ContadorNotificacion.__table__.delete())
+    db.session.execute(ContadorDifusion.__table__.delete())
+
+    filas = {}
+
+    def fila_de(rol, usuario_id):
+        return filas.setdefault((rol, usuario_id), {
+            'rol': rol, 'usuario_id': usuario_id, 'no_leidas': 0, 'difusiones_leidas': 0,
+            'ultima_difusion_leida': cursores.get((rol, usuario_id)),
+        })
+
+    directas = db.session.query(
+        Notificacion.rol_destinatario, Notificacion.destinatario_id, func.count()
+    ).filter(
+        Notificacion.rol_destinatario.isnot(None),
+        Notificacion.destinatario_id.isnot(None),
+        or_(Notificacion.visto.is_(False), Notificacion.visto.is_(None))
+    ).group_by(Notificacion.rol_destinatario, Notificacion.destinatario_id)
+    for rol, usuario_id, total in directas:
+        fila_de(rol, usuario_id)['no_leidas'] = total
+
+    leidas = db.session.query(
+        NotificacionLectura.rol, NotificacionLectura.usuario_id, func.count()
+    ).group_by(NotificacionLectura.rol, NotificacionLectura.usuario_id)
+    for rol, usuario_id, total in leidas:
+        fila_de(rol, usuario_id)['difusiones_leidas'] = total
+
+    # Con cursor: las difusiones que cubre (conteo por rango en el canal) más las
+    # lecturas sueltas por encima de él
+    for (rol, usuario_id), cursor in cursores.items():
+        cubiertas = db.session.query(func.count()).filter(
+            Notificacion.rol_destinatario == rol,
+            Notificacion.destinatario_id.is_(None),
+            Notificacion.id <= cursor
+        ).scalar()
+        sueltas = db.session.query(func.count()).filter(
+            NotificacionLectura.rol == rol,
+            NotificacionLectura.usuario_id == usuario_id,
+            NotificacionLectura.notificacion_id > cursor
+        ).scalar()
+        fila_de(rol, usuario_id)['difusiones_leidas'] = cubiertas + sueltas
+
+    difusiones = [
+        {'rol': rol, 'total': total}
+        for rol, total in db.session.query(Notificacion.rol_destinatario, func.count()).filter(
+            Notificacion.rol_destinatario.isnot(None),
+            Notificacion.destinatario_id.is_(None)
+        ).group_by(Notificacion.rol_destinatario)
+    ]
+
+    if filas:
+        db.session.execute(ContadorNotificacion.__table__.insert(), list(filas.values()))
+    if difusiones:
+        db.session.execute(ContadorDifusion.__table__.insert(), difusiones)
+    return len(filas), len(difusiones)
+
+
+def normalizar_roles():
+    """
+    Unifica los nombres de rol guardados ("administrador" -> "Administrador", ...).
+    Los UPDATE masivos no pasan por los eventos del ORM, así que al final se
+    reconstruyen los contadores con las claves de rol nuevas. No hace commit.
+    Retorna la cantidad de valores cambiados.
+    """
+    total = 0
+    for columna in (Notificacion.rol_destinatario, Notificacion.rol_remitente):
+        for (rol,) in db.session.query(columna).distinct():
+            canonico = normalizar_rol(rol)
+            if rol and canonico != rol:
+                total += Notificacion.query.filter(columna == rol).update(
+                    {columna: canonico}, synchronize_session=False
+                )
+    if total:
+        reconstruir_contadores()
+    return total
+
+
+def asegurar_contadores():
+    """Construye los contadores la primera vez (tablas vacías con notificaciones ya guardadas)."""
+    if ContadorNotificacion.query.first() is not None or ContadorDifusion.query.first() is not None:
+        return None
+    if Notificacion.query.first() is None:
+        return None
+    return reconstruir_contadores()
+
+
+# -------------------------
+# Migración de referencias guardadas en el texto
+# -------------------------
+_PATRON_EVIDENCIA = re.compile(r"\(ID: (\d+)\)")
+_PATRON_ADJUNTO = re.compile(r"Archivo adjunto: ([^\n]+)")
+
+
+def migrar_referencias(lote=500):
+    """
+    Llena evidencia_id, aprendiz_id y adjunto en las notificaciones antiguas que los
+    traen dentro del mensaje. Recorre por id en lotes y hace commit de cada uno.
+    Retorna la cantidad de notificaciones actualizadas.
+    """
+    tabla = Notificacion.__table__
+    ultimo, actualizadas = 0, 0
+    while True:
+        filas = db.session.query(
+            Notificacion.id, Notificacion.mensaje, Notificacion.remitente_id, Notificacion.rol_remitente
+        ).filter(
+            Notificacion.id > ultimo,
+            Notificacion.evidencia_id.is_(None),
+            Notificacion.adjunto.is_(None),
+            or_(Notificacion.mensaje.like('%(ID: %'), Notificacion.mensaje.like('%Archivo adjunto: %'))
+        ).order_by(Notificacion.id).limit(lote).all()
+        if not filas:
+            break
+        ultimo = filas[-1].id
+
+        evidencias = {}
+        for fila in filas:
+            encontrado = _PATRON_EVIDENCIA.search(fila.mensaje)
+            if encontrado:
+                evidencias[fila.id] = int(encontrado.group(1))
+        existentes = dict(db.session.query(Evidencia.id_evidencia, Evidencia.aprendiz_id_aprendiz).filter(
+            Evidencia.id_evidencia.in_(set(evidencias.values()))
+        )) if evidencias else {}
+
+        cambios = []
+        for fila in filas:
+            valores = {}
+            evidencia_id = evidencias.get(fila.id)
+            if evidencia_id in existentes:
+                valores['evidencia_id'] = evidencia_id
+                valores['aprendiz_id'] = existentes[evidencia_id]
+            adjunto = _PATRON_ADJUNTO.search(fila.mensaje)
+            if adjunto:
+                valores['adjunto'] = adjunto.group(1).strip()[:255]
+            if valores:
+                cambios.append({'_id': fila.id, 'evidencia_id': None, 'aprendiz_id': None,
+                                'adjunto': None, **valores})
+
+        if cambios:
+            db.session.execute(
+                tabla.update().where(tabla.c.id == bindparam('_id')).values(
+                    evidencia_id=bindparam('evidencia_id'),
+                    aprendiz_id=bindparam('aprendiz_id'),
+                    adjunto=bindparam('adjunto')
+                ),
+                cambios
+            )
+            actualizadas += len(cambios)
+        db.session.commit()
+    return actualizadas
+
+
+# -------------------------
+# Archivo de notificaciones vistas
+# -------------------------
+_COLUMNAS_ARCHIVO = (
+    'id', 'motivo', 'mensaje', 'remitente_id', 'rol_remitente', 'destinatario_id',
+    'rol_destinatario', 'visto', 'fecha_creacion', 'evidencia_id', 'aprendiz_id', 'adjunto',
+)
+
+
+def archivar_notificaciones(dias=None, lote=500):
+    """
+    Mueve a notificacion_archivada las directas vistas con más de `dias` días.
+    Recorre por id en lotes: cada lote copia y borra en su propia transacción, así
+    que los bloqueos duran lo que tarda un lote. Las difusiones no se archivan
+    (su lectura es por usuario). Retorna (movidas, segundos).
+    """
+    dias = current_app.config['NOTIFICACIONES_ARCHIVAR_DIAS'] if dias is None else dias
+    limite = datetime.utcnow() - timedelta(days=dias)
+    tabla = Notificacion.__table__
+    archivo = NotificacionArchivada.__table__
+    inicio = time.monotonic()
+    ultimo, movidas = 0, 0
+    while True:
+        ids = [fila[0] for fila in db.session.query(Notificacion.id).filter(
+            Notificacion.id > ultimo,
+            Notificacion.destinatario_id.isnot(None),
+            Notificacion.visto.is_(True),
+            Notificacion.fecha_creacion < limite
+        ).order_by(Notificacion.id).limit(lote)]
+        if not ids:
+            break
+        ultimo = ids[-1]
+
+        copiar = select(*(tabla.c[c] for c in _COLUMNAS_ARCHIVO), literal(datetime.utcnow())).where(
+            tabla.c.id.in_(ids), tabla.c.visto.is_(True)
+        )
+        db.session.execute(archivo.insert().from_select([*_COLUMNAS_ARCHIVO, 'fecha_archivo'], copiar))
+        movidas += db.session.execute(
+            tabla.delete().where(tabla.c.id.in_(ids), tabla.c.visto.is_(True))
+        ).rowcount
+        db.session.commit()
+    return movidas, time.monotonic() - inicio
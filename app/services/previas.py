@@ -0,0 +1,278 @@
+# app/services/previas.py
+import atexit
+import io
+import multiprocessing
+import re
+import shutil
+import tempfile
+import threading
+import urllib.request
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from xml.etree import ElementTree
+from flask import current_app
+from app import db
+from app.models.users import ArchivoBlob, Evidencia
+from app.services.almacen import almacen
+from app.services.blobs import es_blob, clave_miniatura
+
+try:
+    import pypdf  # Texto y páginas de PDF
+except ImportError:
+    pypdf = None
+
+try:
+    import fitz  # PyMuPDF: miniatura de la primera página de un PDF
+except ImportError:
+    fitz = None
+
+EXTRACTO = 300
+ANCHO_MINIATURA = 240
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_S = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_PROPIEDADES = '{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}'
+
+
+# -------------------------
+# Extracción (corre en los procesos del pool: sin app ni base de datos)
+# -------------------------
+def _extracto(partes):
+    return ' '.join(' '.join(partes).split())[:EXTRACTO]
+
+
+def _paginas_docx(archivo_zip):
+    try:
+        with archivo_zip.open('docProps/app.xml') as xml:
+            paginas = ElementTree.parse(xml).find(_PROPIEDADES + 'Pages')
+        return int(paginas.text) if paginas is not None else None
+    except (KeyError, ValueError, ElementTree.ParseError):
+        return None
+
+
+def _previa_docx(ruta):
+    partes, largo, palabras = [], 0, 0
+    with zipfile.ZipFile(ruta) as archivo_zip:
+        with archivo_zip.open('word/document.xml') as xml:
+            # iterparse + clear: la memoria no crece con el largo del documento
+            for _, nodo in ElementTree.iterparse(xml):
+                if nodo.tag != _W + 'p':
+                    continue
+                texto = ''.join(t.text or '' for t in nodo.iter(_W + 't'))
+                palabras += len(texto.split())
+                if texto.strip() and largo < EXTRACTO:
+                    partes.append(texto)
+                    largo += len(texto)
+                nodo.clear()
+        paginas = _paginas_docx(archivo_zip)
+    return {'paginas': paginas, 'palabras': palabras, 'extracto': _extracto(partes)}, None
+
+
+def _previa_xlsx(ruta):
+    partes, largo, palabras = [], 0, 0
+    with zipfile.ZipFile(ruta) as archivo_zip:
+        with archivo_zip.open('xl/workbook.xml') as xml:
+            hojas = [hoja.get('name') for hoja in ElementTree.parse(xml).iter(_S + 'sheet')]
+        if 'xl/sharedStrings.xml' in archivo_zip.namelist():
+            with archivo_zip.open('xl/sharedStrings.xml') as xml:
+                for _, nodo in ElementTree.iterparse(xml):
+                    if nodo.tag != _S + 'si':
+                        continue
+                    texto = ''.join(t.text or '' for t in nodo.iter(_S + 't'))
+                    palabras += len(texto.split())
+                    if texto.strip() and largo < EXTRACTO:
+                        partes.append(texto)
+                        largo += len(texto)
+                    nodo.clear()
+    return {'hojas': len(hojas), 'nombres_hojas': hojas[:20], 'palabras': palabras,
+            'extracto': _extracto(partes)}, None
+
+
+def _previa_pdf(ruta):
+    previa = {'paginas': None, 'palabras': None, 'extracto': ''}
+    if pypdf is not None:
+        lector = pypdf.PdfReader(ruta)
+        previa['paginas'] = len(lector.pages)
+        palabras = 0
+        for numero, pagina in enumerate(lector.pages):
+            texto = pagina.extract_text() or ''
+            palabras += len(texto.split())
+            if numero == 0:
+                previa['extracto'] = _extracto([texto])
+        previa['palabras'] = palabras
+    else:
+        # Sin pypdf solo se cuentan los objetos /Type /Page sin comprimir
+        with open(ruta, 'rb') as archivo:
+            paginas = len(re.findall(rb'/Type\s*/Page(?![A-Za-z])', archivo.read()))
+        previa['paginas'] = paginas or None
+
+    miniatura = None
+    if fitz is not None:
+        with fitz.open(ruta) as documento:
+            pagina = documento[0]
+            escala = ANCHO_MINIATURA / pagina.rect.width
+            miniatura = pagina.get_pixmap(matrix=fitz.Matrix(escala, escala)).tobytes('png')
+    return previa, miniatura
+
+
+EXTRACTORES = {'docx': _previa_docx, 'xlsx': _previa_xlsx, 'pdf': _previa_pdf}
+
+
+def extraer_previa(origen, formato):
+    """
+    Datos de la previa y PNG de miniatura (o None) del archivo en `origen`, una ruta
+    local o una URL firmada del bucket (se descarga a un temporal del proceso).
+    """
+    if not origen.startswith(('http://', 'https://')):
+        return EXTRACTORES[formato](origen)
+    with tempfile.NamedTemporaryFile(suffix='.' + formato) as temporal:
+        with urllib.request.urlopen(origen, timeout=60) as respuesta:
+            shutil.copyfileobj(respuesta, temporal)
+        temporal.flush()
+        return EXTRACTORES[formato](temporal.name)
+
+
+# -------------------------
+# Pool de procesos
+# -------------------------
+class ProcesadorPrevias:
+    """
+    Genera las previas en un pool de procesos acotado, fuera de la petición. Un
+    documento grande o mal formado ocupa un proceso del pool, no un worker web. Si
+    hay más de `maximo` previas pendientes, las nuevas se descartan (quedan para
+    `flask evidencias previas`).
+    """
+
+    def __init__(self, app, procesos=2, maximo=200):
+        self.app = app
+        self.procesos = procesos
+        self._pool = None
+        self._candado = threading.Lock()
+        self._cupos = threading.BoundedSemaphore(maximo)
+        self.generadas = 0
+        self.errores = 0
+        self.descartadas = 0
+
+    def _ejecutor(self):
+        with self._candado:
+            if self._pool is None:
+                # spawn: los hijos no heredan los hilos ni las conexiones del worker
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.procesos, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def encolar(self, sha256, formato, origen):
+        if not self._cupos.acquire(blocking=False):
+            self.descartadas += 1
+            return None
+        try:
+            futuro = self._ejecutor().submit(extraer_previa, origen, formato)
+        except Exception:
+            self._cupos.release()
+            raise
+        # Se resuelve cuando la previa ya quedó guardada, no solo extraída
+        guardada = Future()
+        futuro.add_done_callback(lambda f: self._guardar(sha256, f, guardada))
+        return guardada
+
+    def _guardar(self, sha256, futuro, guardada):
+        previa = None
+        try:
+            with self.app.app_context():
+                try:
+                    previa, miniatura = futuro.result()
+                    previa['estado'] = 'lista'
+                    if miniatura:
+                        almacen().guardar(clave_miniatura(sha256), io.BytesIO(miniatura))
+                        previa['miniatura'] = True
+                    self.generadas += 1
+                except Exception as e:
+                    previa = {'estado': 'error', 'error': str(e)[:200]}
+                    self.errores += 1
+                    self.app.logger.warning(f"No se pudo generar la previa de {sha256}: {e}")
+                try:
+                    db.session.query(ArchivoBlob).filter_by(sha256=sha256).update(
+                        {'previa': previa}, synchronize_session=False
+                    )
+                    db.session.commit()
+                finally:
+                    db.session.remove()
+        finally:
+            self._cupos.release()
+            guardada.set_result(previa)
+
+    def estadisticas(self):
+        return {'procesos': self.procesos, 'generadas': self.generadas,
+                'errores': self.errores, 'descartadas': self.descartadas}
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def init_app(app):
+    procesador = ProcesadorPrevias(
+        app, procesos=app.config['PREVIAS_PROCESOS'], maximo=app.config['PREVIAS_MAXIMO_PENDIENTES']
+    )
+    app.extensions['previas'] = procesador
+    atexit.register(procesador.cerrar)
+
+
+def estadisticas():
+    return current_app.extensions['previas'].estadisticas()
+
+
+def generar_previa(evidencia):
+    """
+    Encola la previa del archivo de la evidencia si su blob aún no la tiene. Se llama
+    después del commit que registra o reemplaza el archivo; como el blob es por
+    contenido, un archivo nuevo siempre tiene su propia previa. Retorna el futuro o None.
+    """
+    formato = (evidencia.formato or '').lower()
+    if not evidencia.sha256 or not es_blob(evidencia.url_archivo) or formato not in EXTRACTORES:
+        return None
+    if db.session.query(ArchivoBlob.previa).filter_by(sha256=evidencia.sha256).scalar() is not None:
+        return None
+    clave = evidencia.url_archivo
+    origen = almacen().ruta_local(clave) or almacen().url_descarga(clave, evidencia.nombre_archivo)
+    try:
+        return current_app.extensions['previas'].encolar(evidencia.sha256, formato, origen)
+    except Exception as e:
+        # La evidencia ya quedó guardada; la previa se puede generar después
+        current_app.logger.warning(f"No se pudo encolar la previa de {evidencia.sha256}: {e}")
+        return None
+
+
+def previas_de(evidencias):
+    """{sha256: previa} de las evidencias listadas, en una sola consulta."""
+    hashes = {evidencia.sha256 for evidencia in evidencias if evidencia.sha256}
+    if not hashes:
+        return {}
+    return dict(db.session.query(ArchivoBlob.sha256, ArchivoBlob.previa).filter(
+        ArchivoBlob.sha256.in_(hashes), ArchivoBlob.previa.isnot(None)
+    ))
+
+
+def generar_previas_pendientes(lote=50):
+    """
+    Genera las previas que faltan (archivos anteriores a las previas o descartados
+    con la cola llena). Recorre los blobs por sha256 en lotes y espera cada lote.
+    Retorna cuántas se procesaron.
+    """
+    ultimo, total = '', 0
+    while True:
+        hashes = [sha for (sha,) in db.session.query(ArchivoBlob.sha256).filter(
+            ArchivoBlob.sha256 > ultimo, ArchivoBlob.previa.is_(None)
+        ).order_by(ArchivoBlob.sha256).limit(lote)]
+        if not hashes:
+            return total
+        ultimo = hashes[-1]
+        futuros = []
+        for sha256 in hashes:
+            evidencia = Evidencia.query.filter_by(sha256=sha256).first()
+            futuro = generar_previa(evidencia) if evidencia else None
+            if futuro is not None:
+                futuros.append(futuro)
+        wait(futuros)
+        total += len(futuros)
@@ -0,0 +1,151 @@
+# app/services/reanudables.py
+import base64
+import fcntl
+import hashlib
+import json
+import os
+import time
+from uuid import uuid4
+from flask import current_app
+from app.services.blobs import guardar_blob_de_ruta
+
+# Subidas por bloques que se pueden retomar (al estilo tus). Cada subida tiene en
+# la carpeta de estado un <id>.json (dueño, tipo, nombre, tamaño y offset
+# confirmado) y un <id>.parcial con los bytes recibidos hasta ese offset.
+
+
+class DesfaseSubida(Exception):
+    """El bloque no empieza donde terminó el último confirmado."""
+
+    def __init__(self, offset):
+        super().__init__(f"La subida va en el byte {offset}.")
+        self.offset = offset
+
+
+class ChecksumInvalido(Exception):
+    """El SHA-256 del bloque no coincide con el declarado."""
+
+
+def _carpeta():
+    carpeta = current_app.config['SUBIDAS_REANUDABLES_CARPETA'] or os.path.join(current_app.instance_path, 'subidas')
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def _rutas(id_subida):
+    base = os.path.join(_carpeta(), id_subida)
+    return base + '.json', base + '.parcial'
+
+
+def _guardar_estado(id_subida, estado):
+    ruta_estado, _ = _rutas(id_subida)
+    temporal = f"{ruta_estado}.{uuid4().hex}"
+    with open(temporal, 'w') as archivo:
+        json.dump(estado, archivo)
+    os.replace(temporal, ruta_estado)
+
+
+def iniciar_subida(aprendiz_id, tipo, nombre, tamano):
+    """Registra una subida nueva y retorna su id."""
+    id_subida = uuid4().hex
+    _, ruta_parcial = _rutas(id_subida)
+    open(ruta_parcial, 'wb').close()
+    _guardar_estado(id_subida, {
+        'aprendiz_id': aprendiz_id, 'tipo': tipo, 'nombre': nombre,
+        'tamano': tamano, 'offset': 0, 'creada': time.time(),
+    })
+    return id_subida
+
+
+def estado_subida(id_subida, aprendiz_id):
+    """Estado de la subida si existe y es del aprendiz; None si no."""
+    if not id_subida or len(id_subida) != 32 or any(c not in '0123456789abcdef' for c in id_subida):
+        return None
+    ruta_estado, _ = _rutas(id_subida)
+    try:
+        with open(ruta_estado) as archivo:
+            estado = json.load(archivo)
+    except (OSError, ValueError):
+        return None
+    return estado if estado['aprendiz_id'] == aprendiz_id else None
+
+
+def agregar_bloque(id_subida, estado, offset, flujo, checksum):
+    """
+    Escribe el bloque de `flujo` en `offset` verificando su SHA-256 (en base64, como
+    la cabecera Upload-Checksum). El offset solo avanza si el bloque es correcto; si
+    no, lo escrito se recorta. Retorna el offset nuevo.
+    """
+    esperado = base64.b64decode(checksum or '', validate=True)
+    if not esperado:
+        raise ChecksumInvalido('Falta el checksum del bloque.')
+
+    ruta_estado, ruta_parcial = _rutas(id_subida)
+    with open(ruta_parcial, 'r+b') as parcial:
+        # Un reintento del cliente puede llegar mientras el bloque anterior sigue escribiéndose
+        try:
+            fcntl.flock(parcial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise DesfaseSubida(estado['offset'])
+        with open(ruta_estado) as archivo:
+            estado.update(json.load(archivo))
+        if offset != estado['offset']:
+            raise DesfaseSubida(estado['offset'])
+
+        sha256, escritos = hashlib.sha256(), 0
+        parcial.seek(offset)
+        parcial.truncate()
+        try:
+            for datos in iter(lambda: flujo.read(64 * 1024), b''):
+                escritos += len(datos)
+                if offset + escritos > estado['tamano']:
+                    raise ValueError('El bloque excede el tamaño declarado.')
+                sha256.update(datos)
+                parcial.write(datos)
+            if sha256.digest() != esperado:
+                raise ChecksumInvalido('El bloque llegó dañado.')
+        except BaseException:
+            # Bloque incompleto (conexión cortada) o inválido: se descarta entero
+            parcial.truncate(offset)
+            raise
+
+        estado['offset'] = offset + escritos
+        _guardar_estado(id_subida, estado)
+    return estado['offset']
+
+
+def completar_subida(id_subida, estado):
+    """Pasa el archivo completo al almacén de evidencias. Retorna (clave, sha256, tamaño)."""
+    if estado['offset'] != estado['tamano']:
+        raise ValueError('La subida no está completa.')
+    ruta_estado, ruta_parcial = _rutas(id_subida)
+    resultado = guardar_blob_de_ruta(ruta_parcial)
+    os.remove(ruta_estado)
+    return resultado
+
+
+def limpiar_subidas(horas=None):
+    """Borra las subidas sin actividad en `horas`. Retorna (subidas, bytes) liberados."""
+    horas = current_app.config['SUBIDAS_REANUDABLES_HORAS'] if horas is None else horas
+    limite = time.time() - horas * 3600
+    carpeta = _carpeta()
+    archivos = {}
+    for nombre in os.listdir(carpeta):
+        archivos.setdefault(nombre.split('.', 1)[0], []).append(os.path.join(carpeta, nombre))
+
+    subidas, liberados = 0, 0
+    for rutas in archivos.values():
+        # Cada bloque toca el .json y el .parcial: su mtime es la última actividad
+        try:
+            if max(os.path.getmtime(ruta) for ruta in rutas) >= limite:
+                continue
+        except OSError:
+            continue
+        subidas += 1
+        for ruta in rutas:
+            try:
+                liberados += os.path.getsize(ruta)
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+    return subidas, liberados
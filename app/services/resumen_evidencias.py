@@ -0,0 +1,144 @@
+# app/services/resumen_evidencias.py
+from sqlalchemy import event, inspect, func, select, case, and_
+from app import db
+from app.models.users import Aprendiz, Evidencia, ResumenEvidencias
+
+TOTAL_REQUERIDO = 17
+
+_CONTEOS = ('subidas', 'word', 'excel_15', 'excel_3', 'pdf')
+_FECHAS = ('primera_subida_word', 'primera_subida_excel_15', 'primera_subida_excel_3')
+_CAMPOS = ('aprendiz_id_aprendiz', 'tipo', 'sesion_excel', 'fecha_subida', 'url_archivo') + _FECHAS
+
+
+def resumen_de(aprendiz_id):
+    """Resumen del aprendiz; uno en ceros (sin guardar) si no tiene evidencias."""
+    return db.session.get(ResumenEvidencias, aprendiz_id) or ResumenEvidencias(
+        aprendiz_id=aprendiz_id, **{campo: 0 for campo in _CONTEOS}
+    )
+
+
+def _clave_tipo(tipo, sesion_excel):
+    tipo = (tipo or '').lower()
+    if tipo == 'excel':
+        return {'15_dias': 'excel_15', '3_meses': 'excel_3'}.get(sesion_excel)
+    return tipo if tipo in ('word', 'pdf') else None
+
+
+def _aporte(valores):
+    """Lo que una evidencia suma a los conteos de su aprendiz: solo cuenta si tiene archivo."""
+    if not (valores['fecha_subida'] and valores['url_archivo']):
+        return {}
+    aporte = {'subidas': 1}
+    clave = _clave_tipo(valores['tipo'], valores['sesion_excel'])
+    if clave:
+        aporte[clave] = 1
+    return aporte
+
+
+def _valores(target):
+    return {campo: getattr(target, campo) for campo in _CAMPOS}
+
+
+def _agregado():
+    """SELECT con el resumen de cada aprendiz calculado desde la tabla de evidencias."""
+    evidencias = Evidencia.__table__
+    con_archivo = and_(evidencias.c.fecha_subida.isnot(None), evidencias.c.url_archivo != '')
+    tipo = func.lower(evidencias.c.tipo)
+
+    def contar(*condiciones):
+        return func.coalesce(func.sum(case((and_(con_archivo, *condiciones), 1), else_=0)), 0)
+
+    return select(
+        evidencias.c.aprendiz_id_aprendiz.label('aprendiz_id'),
+        contar().label('subidas'),
+        contar(tipo == 'word').label('word'),
+        contar(tipo == 'excel', evidencias.c.sesion_excel == '15_dias').label('excel_15'),
+        contar(tipo == 'excel', evidencias.c.sesion_excel == '3_meses').label('excel_3'),
+        contar(tipo == 'pdf').label('pdf'),
+        *(func.min(evidencias.c[campo]).label(campo) for campo in _FECHAS),
+    ).group_by(evidencias.c.aprendiz_id_aprendiz)
+
+
+def _ajustar(connection, aprendiz_id, conteos, fechas):
+    """
+    Suma `conteos` a la fila del aprendiz con UPDATE ... SET x = x + n y, si `fechas`,
+    recalcula las primeras subidas desde la tabla de evidencias (MIN por columna).
+    """
+    conteos = {campo: delta for campo, delta in conteos.items() if delta}
+    if aprendiz_id is None or not (conteos or fechas):
+        return
+    tabla = ResumenEvidencias.__table__
+    evidencias = Evidencia.__table__
+    valores = {campo: tabla.c[campo] + delta for campo, delta in conteos.items()}
+    if fechas:
+        for campo in _FECHAS:
+            valores[campo] = select(func.min(evidencias.c[campo])).where(
+                evidencias.c.aprendiz_id_aprendiz == aprendiz_id
+            ).scalar_subquery()
+    resultado = connection.execute(tabla.update().where(tabla.c.aprendiz_id == aprendiz_id).values(**valores))
+    if resultado.rowcount == 0 and any(delta > 0 for delta in conteos.values()):
+        valores.update({campo: max(delta, 0) for campo, delta in conteos.items()})
+        connection.execute(tabla.insert().values(aprendiz_id=aprendiz_id, **valores))
+
+
+def _al_insertar_evidencia(mapper, connection, target):
+    valores = _valores(target)
+    _ajustar(connection, target.aprendiz_id_aprendiz, _aporte(valores),
+             any(valores[campo] for campo in _FECHAS))
+
+
+def _recalcular(connection, aprendiz_id):
+    if aprendiz_id is None:
+        return
+    tabla = ResumenEvidencias.__table__
+    fila = connection.execute(
+        _agregado().where(Evidencia.__table__.c.aprendiz_id_aprendiz == aprendiz_id)
+    ).mappings().first()
+    if fila is None:
+        connection.execute(tabla.delete().where(tabla.c.aprendiz_id == aprendiz_id))
+    elif not connection.execute(tabla.update().where(tabla.c.aprendiz_id == aprendiz_id).values(**fila)).rowcount:
+        connection.execute(tabla.insert().values(**fila))
+
+
+def _al_actualizar_evidencia(mapper, connection, target):
+    # Una edición puede cambiar varios campos a la vez (y el valor anterior no siempre
+    # está cargado): se recalcula la fila del aprendiz en vez de sumar diferencias
+    estado = inspect(target)
+    if not any(estado.attrs[campo].history.has_changes() for campo in _CAMPOS):
+        return
+    anterior = estado.attrs.aprendiz_id_aprendiz.history.deleted
+    if anterior and anterior[0] != target.aprendiz_id_aprendiz:
+        _recalcular(connection, anterior[0])
+    _recalcular(connection, target.aprendiz_id_aprendiz)
+
+
+def _al_eliminar_evidencia(mapper, connection, target):
+    valores = _valores(target)
+    _ajustar(connection, target.aprendiz_id_aprendiz, {c: -d for c, d in _aporte(valores).items()},
+             any(valores[campo] for campo in _FECHAS))
+
+
+def _al_eliminar_aprendiz(mapper, connection, target):
+    tabla = ResumenEvidencias.__table__
+    connection.execute(tabla.delete().where(tabla.c.aprendiz_id == target.id_aprendiz))
+
+
+event.listen(Evidencia, 'after_insert', _al_insertar_evidencia)
+event.listen(Evidencia, 'after_update', _al_actualizar_evidencia)
+event.listen(Evidencia, 'after_delete', _al_eliminar_evidencia)
+event.listen(Aprendiz, 'after_delete', _al_eliminar_aprendiz)
+
+
+# -------------------------
+# Reconstrucción
+# -------------------------
+def reconstruir_resumenes():
+    """
+    Vacía los resúmenes y los recalcula con una consulta agrupada por aprendiz.
+    No hace commit. Retorna la cantidad de aprendices con evidencias.
+    """
+    filas = [dict(fila) for fila in db.session.execute(_agregado()).mappings()]
+    db.session.execute(ResumenEvidencias.__table__.delete())
+    if filas:
+        db.session.execute(ResumenEvidencias.__table__.insert(), filas)
+    return len(filas)
@@ -0,0 +1,88 @@
+# app/services/smtp_sink.py
+# Servidor SMTP mínimo que acepta todo y guarda los mensajes en memoria.
+# Sirve para probar la bandeja de salida sin enviar correos reales:
+#
+#   flask correo sumidero --puerto 1025
+#   MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_SSL=false flask correo trabajador
+import socketserver
+import threading
+from email import message_from_bytes
+
+
+class _ManejadorSMTP(socketserver.StreamRequestHandler):
+
+    def _responder(self, linea):
+        self.wfile.write(f"{linea}\r\n".encode())
+
+    def handle(self):
+        remitente, destinatarios = None, []
+        self._responder("220 sumidero SMTP listo")
+
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            comando = linea.decode(errors='replace').strip()
+            verbo = comando[:4].upper()
+
+            if verbo in ('HELO', 'EHLO'):
+                self._responder("250 sumidero")
+            elif verbo == 'MAIL':
+                remitente, destinatarios = comando.split(':', 1)[1].strip(), []
+                self._responder("250 OK")
+            elif verbo == 'RCPT':
+                destinatarios.append(comando.split(':', 1)[1].strip())
+                self._responder("250 OK")
+            elif verbo == 'DATA':
+                self._responder("354 Fin con <CRLF>.<CRLF>")
+                lineas = []
+                while True:
+                    dato = self.rfile.readline()
+                    if not dato or dato in (b".\r\n", b".\n"):
+                        break
+                    lineas.append(dato[1:] if dato.startswith(b"..") else dato)
+                self.server.registrar(remitente, destinatarios, b"".join(lineas))
+                self._responder("250 OK")
+            elif verbo == 'RSET':
+                remitente, destinatarios = None, []
+                self._responder("250 OK")
+            elif verbo == 'NOOP':
+                self._responder("250 OK")
+            elif verbo == 'QUIT':
+                self._responder("221 Adiós")
+                return
+            else:
+                self._responder("502 Comando no implementado")
+
+
+class SumideroSMTP(socketserver.ThreadingTCPServer):
+    """Servidor SMTP local; los mensajes recibidos quedan en `self.mensajes`."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', puerto=1025, al_recibir=None):
+        super().__init__((host, puerto), _ManejadorSMTP)
+        self.mensajes = []
+        self.al_recibir = al_recibir
+        self._lock = threading.Lock()
+
+    @property
+    def puerto(self):
+        return self.server_address[1]
+
+    def registrar(self, remitente, destinatarios, datos):
+        mensaje = message_from_bytes(datos)
+        with self._lock:
+            self.mensajes.append((remitente, destinatarios, mensaje))
+        if self.al_recibir:
+            self.al_recibir(remitente, destinatarios, mensaje)
+
+    def iniciar_en_segundo_plano(self):
+        hilo = threading.Thread(target=self.serve_forever, daemon=True)
+        hilo.start()
+        return hilo
+
+    def detener(self):
+        self.shutdown()
+        self.server_close()
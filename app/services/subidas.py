@@ -0,0 +1,125 @@
+# app/services/subidas.py
+import hashlib
+import os
+import shutil
+import tempfile
+from flask import current_app, request
+from flask.wrappers import Request
+
+# Holgura para los campos del formulario y las cabeceras multipart
+MARGEN_MULTIPART = 64 * 1024
+
+
+class ArchivoEntrante:
+    """
+    Archivo de un formulario que se escribe directamente en la carpeta de destino
+    mientras llega, calculando el SHA-256 y el tamaño en la misma pasada. Queda con
+    un nombre temporal oculto hasta que `mover` lo renombra (sin copiarlo).
+    """
+
+    def __init__(self, carpeta):
+        self._archivo = tempfile.NamedTemporaryFile(
+            dir=carpeta, prefix='.subida-', suffix='.parcial', delete=False
+        )
+        self.ruta_temporal = self._archivo.name
+        self._hash = hashlib.sha256()
+        self.tamano = 0
+
+    def write(self, datos):
+        self._hash.update(datos)
+        self.tamano += len(datos)
+        return self._archivo.write(datos)
+
+    def __getattr__(self, nombre):
+        return getattr(self._archivo, nombre)
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def mover(self, destino):
+        self._archivo.close()
+        os.replace(self.ruta_temporal, destino)
+        self.ruta_temporal = None
+
+    def descartar(self):
+        self._archivo.close()
+        if self.ruta_temporal and os.path.exists(self.ruta_temporal):
+            os.remove(self.ruta_temporal)
+        self.ruta_temporal = None
+
+
+class PeticionSubida(Request):
+    """
+    Request de la aplicación. En las vistas que llaman a `preparar_subida`, los
+    archivos del formulario se escriben en la carpeta final en lugar de un temporal
+    de werkzeug; los que no se muevan se borran al cerrar la petición.
+    """
+
+    destino_subida = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.destino_subida is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        archivo = ArchivoEntrante(self.destino_subida)
+        self.__dict__.setdefault('_archivos_entrantes', []).append(archivo)
+        return archivo
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            for archivo in self.__dict__.pop('_archivos_entrantes', ()):
+                archivo.descartar()
+
+
+def init_app(app):
+    app.request_class = PeticionSubida
+
+
+def limite_para(tipo):
+    """Tamaño máximo en bytes de una evidencia del tipo (word, excel, pdf)."""
+    return current_app.config['EVIDENCIA_LIMITES'].get((tipo or '').lower())
+
+
+def preparar_subida(tipo, carpeta=None):
+    """
+    Debe llamarse antes de leer request.files. Fija el límite del tipo para esta
+    petición y el destino de los archivos. Retorna False si el Content-Length ya
+    declara un cuerpo mayor: se rechaza sin leerlo. Si no viene Content-Length, el
+    límite corta la lectura con un 413 y el archivo parcial se borra.
+    """
+    limite = limite_para(tipo)
+    if limite is not None:
+        request.max_content_length = limite + MARGEN_MULTIPART
+        if request.content_length is not None and request.content_length > request.max_content_length:
+            return False
+    request.destino_subida = carpeta or current_app.config['EVIDENCIAS_FOLDER']
+    return True
+
+
+def guardar_subida(archivo, nombre, carpeta=None):
+    """
+    Deja el archivo recibido en `carpeta/nombre` y retorna (ruta, sha256, tamaño).
+    Con `preparar_subida` es solo un renombrado; si no, se copia calculando el hash.
+    """
+    ruta = os.path.join(carpeta or current_app.config['EVIDENCIAS_FOLDER'], nombre)
+    entrante = archivo.stream
+    if isinstance(entrante, ArchivoEntrante):
+        entrante.mover(ruta)
+        return ruta, entrante.sha256, entrante.tamano
+
+    sha256, tamano = hashlib.sha256(), 0
+    parcial = ruta + '.parcial'
+    try:
+        with open(parcial, 'wb') as destino:
+            for bloque in iter(lambda: entrante.read(1024 * 1024), b''):
+                sha256.update(bloque)
+                tamano += len(bloque)
+                destino.write(bloque)
+        shutil.move(parcial, ruta)
+    except Exception:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        raise
+    return ruta, sha256.hexdigest(), tamano
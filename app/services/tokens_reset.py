@@ -0,0 +1,56 @@
+# app/services/tokens_reset.py
+import hashlib
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from app.services.identidad import campos_de, obtener_usuario
+
+SALT = 'reset-password'
+
+
+def _serializador():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=SALT)
+
+
+def _huella(password_hash):
+    """Resumen corto del hash actual: cambia en cuanto se cambia la contraseña."""
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+
+def generar_token_reset(usuario):
+    """Token firmado con rol, id y la huella de la contraseña vigente del usuario."""
+    campos = campos_de(usuario)
+    return _serializador().dumps({
+        'rol': usuario.rol_user,
+        'id': getattr(usuario, campos['id']),
+        'huella': _huella(getattr(usuario, campos['password'])),
+    })
+
+
+def leer_token_reset(token):
+    """
+    Valida firma y vigencia sin consultar la base de datos.
+    Retorna (datos, None) o (None, 'expirado' | 'invalido').
+    """
+    try:
+        datos = _serializador().loads(token, max_age=current_app.config['RESET_TOKEN_MAX_AGE'])
+    except SignatureExpired:
+        return None, 'expirado'
+    except BadSignature:
+        return None, 'invalido'
+
+    if not isinstance(datos, dict) or not {'rol', 'id', 'huella'} <= datos.keys():
+        return None, 'invalido'
+    return datos, None
+
+
+def usuario_del_token(datos):
+    """
+    Carga el usuario del token (una consulta por PK). Si la contraseña ya cambió desde
+    que se emitió el token la huella no coincide y el enlace se considera usado.
+    """
+    usuario = obtener_usuario(datos['rol'], datos['id'])
+    if usuario is None:
+        return None
+    if _huella(getattr(usuario, campos_de(usuario)['password'])) != datos['huella']:
+        return None
+    return usuario
@@ -2,8 +2,10 @@ from app import create_app, db
 import pytest
 
 @pytest.fixture
-def app():
-    app = create_app()
+def app(tmp_path_factory):
+    # Cada prueba usa su propia base SQLite: nunca la de instance/ ni la de DATABASE_URL
+    base = tmp_path_factory.mktemp('base') / 'pruebas.db'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{base}"})
     with app.app_context():
         db.create_all()  # Create tables within the context
         yield app
@@ -22,4 +24,64 @@ def user(app):
     db.session.add(user)
     db.session.commit()  # Commit changes within the context
     yield user    
-  # Cleanup changes within the context
\ No newline at end of file
+  # Cleanup changes within the context
+
+@pytest.fixture
+def crear_admin(app):
+    from werkzeug.security import generate_password_hash
+    from app.models.users import Administrador
+
+    def crear(documento='100', correo='admin@sena.edu.co', celular='3000000000'):
+        admin = Administrador(
+            nombre='Ana', apellido='Admin', tipo_documento='Cedula de Ciudadania',
+            documento=documento, correo=correo, celular=celular,
+            password=generate_password_hash('clave-segura', method='pbkdf2:sha256:1000')
+        )
+        db.session.add(admin)
+        db.session.commit()
+        return admin
+    return crear
+
+
+@pytest.fixture
+def crear_aprendiz(app):
+    from werkzeug.security import generate_password_hash
+    from app.models.users import Aprendiz, Sede
+
+    def crear(documento='200', correo=None, celular=None):
+        sede = Sede.query.filter_by(nombre_sede='CTIC').first() or Sede(nombre_sede='CTIC', ciudad='Cartagena')
+        aprendiz = Aprendiz(
+            nombre='Luis', apellido='Aprendiz', tipo_documento='Tarjeta de Identidad',
+            documento=documento, correo=correo or f'aprendiz{documento}@sena.edu.co',
+            celular=celular or f'310000{documento}', jornada='Mañana',
+            password_aprendiz=generate_password_hash('clave-segura', method='pbkdf2:sha256:1000'),
+            sede=sede
+        )
+        db.session.add(aprendiz)
+        db.session.commit()
+        return aprendiz
+    return crear
+
+
+@pytest.fixture
+def evidencia_de():
+    from datetime import date
+    from app.models.users import Evidencia
+
+    def crear(aprendiz, url, nombre='informe.pdf', **campos):
+        campos = {'formato': 'pdf', 'tipo': 'Pdf', **campos}
+        return Evidencia(nombre_archivo=nombre, url_archivo=url, fecha_subida=date.today(),
+                         aprendiz_rel=aprendiz, **campos)
+    return crear
+
+
+@pytest.fixture
+def usar_carpeta(app):
+    """Evidencias en `carpeta` con el almacén local; retorna la ruta en disco de una clave."""
+    from app.services.almacen import AlmacenLocal
+
+    def usar(carpeta):
+        app.config['UPLOAD_FOLDER'] = app.config['EVIDENCIAS_FOLDER'] = str(carpeta)
+        app.extensions['almacen'] = AlmacenLocal(str(carpeta))
+        return app.extensions['almacen'].ruta_local
+    return usar
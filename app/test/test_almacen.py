@@ -0,0 +1,187 @@
+import hashlib
+import io
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from app import db
+from app.models.users import ArchivoBlob, Evidencia, Notificacion
+from app.services.almacen import AlmacenLocal, AlmacenS3, guardar_adjunto, url_adjunto, nombre_adjunto
+from app.services.blobs import guardar_blob, confirmar_blob, url_evidencia, liberar_blobs, clave_blob
+from app.services.notificaciones import puede_ver_adjunto
+
+
+class NoEncontrado(Exception):
+    response = {'Error': {'Code': '404'}}
+
+
+class BucketEnMemoria:
+    """Reemplazo de un cliente boto3 contra MinIO: guarda los objetos en un dict."""
+
+    def __init__(self):
+        self.objetos = {}
+        self.firmadas = []
+
+    def upload_file(self, ruta, bucket, clave):
+        with open(ruta, 'rb') as archivo:
+            self.objetos[(bucket, clave)] = archivo.read()
+
+    def upload_fileobj(self, flujo, bucket, clave):
+        self.objetos[(bucket, clave)] = flujo.read()
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objetos:
+            raise NoEncontrado()
+        return {'ContentLength': len(self.objetos[(Bucket, Key)])}
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objetos[(Bucket, Key)])}
+
+    def delete_object(self, Bucket, Key):
+        self.objetos.pop((Bucket, Key), None)
+
+    def copy_object(self, Bucket, Key, CopySource):
+        self.objetos[(Bucket, Key)] = self.objetos[(CopySource['Bucket'], CopySource['Key'])]
+
+    def generate_presigned_url(self, operacion, Params, ExpiresIn):
+        self.firmadas.append((operacion, Params))
+        return f"https://minio.local/{Params['Bucket']}/{Params['Key']}?firmada={operacion}"
+
+
+def usar_bucket(app, tmp_path):
+    app.config['UPLOAD_FOLDER'] = app.config['EVIDENCIAS_FOLDER'] = str(tmp_path)
+    cliente = BucketEnMemoria()
+    app.extensions['almacen'] = AlmacenS3(cliente, 'evidencias', prefijo='sena/')
+    return cliente
+
+
+def test_blobs_en_bucket(app, tmp_path, crear_aprendiz, evidencia_de):
+    cliente = usar_bucket(app, tmp_path)
+    aprendiz = crear_aprendiz()
+
+    for _ in range(2):
+        clave, sha256, tamano = guardar_blob(FileStorage(io.BytesIO(b'%PDF bucket'), 'informe.pdf'))
+        db.session.add(evidencia_de(aprendiz, clave, sha256=sha256, tamano=tamano))
+    db.session.commit()
+
+    assert list(cliente.objetos) == [('evidencias', 'sena/' + clave)]
+    assert list(tmp_path.iterdir()) == []
+
+    url = url_evidencia(Evidencia.query.first(), adjunto=False)
+    assert url.startswith('https://minio.local/evidencias/sena/blobs/')
+    operacion, parametros = cliente.firmadas[-1]
+    assert operacion == 'get_object'
+    assert parametros['ResponseContentDisposition'] == "inline; filename*=UTF-8''informe.pdf"
+    assert parametros['ResponseContentType'] == 'application/pdf'
+
+    for evidencia in Evidencia.query.all():
+        db.session.delete(evidencia)
+    db.session.commit()
+    assert liberar_blobs(horas=0) == (1, len(b'%PDF bucket'))
+    assert cliente.objetos == {}
+    assert ArchivoBlob.query.count() == 0
+
+
+def iniciar_sesion(client, usuario):
+    with client.session_transaction() as sesion:
+        sesion['_user_id'] = usuario.get_id()
+        sesion['_fresh'] = True
+
+
+def test_subida_directa_firmada_y_confirmada(app, client, tmp_path, crear_aprendiz):
+    cliente = usar_bucket(app, tmp_path)
+    aprendiz = crear_aprendiz()
+    iniciar_sesion(client, aprendiz)
+    contenido = b'%PDF directo'
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    clave = clave_blob(sha256)
+    datos = {'sha256': sha256, 'tamano': len(contenido), 'nombre': 'informe.pdf'}
+
+    # El PUT va a una clave temporal del aprendiz, nunca a blobs/
+    firma = client.post('/evidencia/upload/pdf/firmar', json=datos).get_json()
+    operacion, parametros = cliente.firmadas[-1]
+    assert operacion == 'put_object' and parametros['ContentLength'] == len(contenido)
+    assert parametros['Key'].startswith(f'sena/temporales/{aprendiz.id_aprendiz}/')
+    assert firma['headers']['x-amz-checksum-sha256'] == parametros['ChecksumSHA256']
+
+    cliente.objetos[('evidencias', parametros['Key'])] = contenido
+    respuesta = client.post('/evidencia/upload/pdf', data={'sha256': sha256, 'nombre_archivo': 'informe.pdf'})
+    assert respuesta.status_code == 302
+    assert Evidencia.query.one().url_archivo == clave
+    assert list(cliente.objetos) == [('evidencias', 'sena/' + clave)]
+
+    # Sin firma previa en la sesión, un hash cualquiera no se acepta
+    client.post('/evidencia/upload/pdf', data={'sha256': sha256, 'nombre_archivo': 'otra.pdf'})
+    assert Evidencia.query.count() == 1
+
+    # Ese contenido ya es suyo: no hace falta subirlo otra vez
+    assert client.post('/evidencia/upload/pdf/firmar', json=datos).get_json() == {'existe': True}
+
+
+def test_subida_directa_no_revela_archivos_ajenos(app, client, tmp_path, crear_aprendiz):
+    cliente = usar_bucket(app, tmp_path)
+    contenido = b'%PDF de otro aprendiz'
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    cliente.objetos[('evidencias', 'sena/' + clave_blob(sha256))] = contenido
+    iniciar_sesion(client, crear_aprendiz())
+
+    firma = client.post('/evidencia/upload/pdf/firmar', json={
+        'sha256': sha256, 'tamano': len(contenido), 'nombre': 'informe.pdf'
+    }).get_json()
+    assert 'existe' not in firma and 'url' in firma
+
+    with pytest.raises(ValueError):
+        confirmar_blob({'sha256': sha256, 'tamano': 4, 'temporal': 'temporales/1/x'})
+    cliente.objetos[('evidencias', 'sena/temporales/1/x')] = contenido
+    with pytest.raises(ValueError):
+        confirmar_blob({'sha256': sha256, 'tamano': len(contenido), 'temporal': 'temporales/1/x'}, limite=4)
+    assert ('evidencias', 'sena/temporales/1/x') not in cliente.objetos
+
+
+def test_sin_bucket_no_hay_subida_directa(app, client, tmp_path, crear_aprendiz, usar_carpeta):
+    usar_carpeta(tmp_path)
+    iniciar_sesion(client, crear_aprendiz())
+    with client.session_transaction() as sesion:
+        sesion['subida_directa'] = {'tipo': 'pdf', 'sha256': 'a' * 64, 'tamano': 4}
+
+    respuesta = client.post('/evidencia/upload/pdf', data={'sha256': 'a' * 64, 'nombre_archivo': 'informe.pdf'})
+    assert respuesta.status_code == 302 and Evidencia.query.count() == 0
+    assert client.post('/evidencia/upload/pdf/firmar', json={}).status_code == 404
+
+
+def test_adjuntos_en_bucket(app, tmp_path):
+    cliente = usar_bucket(app, tmp_path)
+    with app.test_request_context():
+        nombre = guardar_adjunto(FileStorage(io.BytesIO(b'acta'), 'acta de reunión.pdf'))
+        otro = guardar_adjunto(FileStorage(io.BytesIO(b'otra acta'), 'acta de reunión.pdf'))
+        assert nombre.startswith('adjuntos/') and nombre != otro
+        assert nombre_adjunto(nombre) == 'acta_de_reunion.pdf'
+        assert cliente.objetos[('evidencias', 'sena/' + nombre)] == b'acta'
+        assert url_adjunto(nombre).startswith('https://minio.local/evidencias/sena/adjuntos/')
+        assert 'acta_de_reunion.pdf' in cliente.firmadas[-1][1]['ResponseContentDisposition']
+
+
+def test_evidencias_y_adjuntos_fuera_de_static(app, tmp_path, crear_aprendiz):
+    publica, privada = tmp_path / 'uploads', tmp_path / 'evidencias'
+    app.config['UPLOAD_FOLDER'], app.config['EVIDENCIAS_FOLDER'] = str(publica), str(privada)
+    app.extensions['almacen'] = AlmacenLocal(str(privada))
+
+    aprendiz, otro = crear_aprendiz(), crear_aprendiz(documento='201')
+    with app.test_request_context():
+        nombre = guardar_adjunto(FileStorage(io.BytesIO(b'acta'), 'acta.pdf'))
+        assert url_adjunto(nombre).endswith('/notificacion/adjunto/' + nombre)
+    url = '/notificacion/adjunto/' + nombre
+    assert not (publica / nombre).exists()
+    db.session.add(Notificacion(
+        mensaje='Acta', remitente_id=1, rol_remitente='Administrador',
+        destinatario_id=aprendiz.id_aprendiz, rol_destinatario='Aprendiz', adjunto=nombre
+    ))
+    db.session.commit()
+
+    assert puede_ver_adjunto(aprendiz, nombre) and not puede_ver_adjunto(otro, nombre)
+
+    client = app.test_client()
+    iniciar_sesion(client, aprendiz)
+    respuesta = client.get(url)
+    assert respuesta.status_code == 200 and respuesta.data == b'acta'
+    assert 'filename=acta.pdf' in respuesta.headers['Content-Disposition']
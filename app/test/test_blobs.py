@@ -0,0 +1,88 @@
+import io
+import os
+from datetime import datetime, timedelta
+
+from werkzeug.datastructures import FileStorage
+
+from app import db
+from app.models.users import Evidencia, ArchivoBlob
+from app.services.blobs import guardar_blob, liberar_blobs, deduplicar_evidencias
+
+
+def test_mismo_contenido_un_solo_archivo_con_referencias(app, tmp_path, crear_aprendiz, evidencia_de, usar_carpeta):
+    ruta_de = usar_carpeta(tmp_path)
+    aprendiz = crear_aprendiz()
+
+    claves = []
+    for _ in range(2):
+        clave, sha256, tamano = guardar_blob(FileStorage(io.BytesIO(b'%PDF plantilla'), 'informe.pdf'))
+        db.session.add(evidencia_de(aprendiz, clave, sha256=sha256, tamano=tamano))
+        claves.append(clave)
+    db.session.commit()
+
+    assert claves[0] == claves[1]
+    archivos = [os.path.join(r, f) for r, _, fs in os.walk(tmp_path) for f in fs]
+    assert archivos == [ruta_de(claves[0])]
+    blob = ArchivoBlob.query.one()
+    assert blob.referencias == 2
+
+    db.session.delete(aprendiz.evidencias[0])
+    db.session.commit()
+    assert db.session.get(ArchivoBlob, blob.sha256).referencias == 1
+    assert liberar_blobs(horas=0) == (0, 0)
+
+    # Borrar el aprendiz borra sus evidencias en cascada y suelta la referencia
+    db.session.delete(aprendiz)
+    db.session.commit()
+    blob = db.session.get(ArchivoBlob, blob.sha256)
+    assert blob.referencias == 0 and blob.liberado_en is not None
+
+    assert liberar_blobs(horas=0) == (1, len(b'%PDF plantilla'))
+    assert not os.path.exists(ruta_de(claves[0]))
+    assert ArchivoBlob.query.count() == 0
+
+
+def test_reutilizar_un_blob_liberado_reinicia_el_margen(app, tmp_path, crear_aprendiz, evidencia_de, usar_carpeta):
+    ruta_de = usar_carpeta(tmp_path)
+    aprendiz = crear_aprendiz()
+    archivo = lambda: FileStorage(io.BytesIO(b'%PDF reutilizado'), 'informe.pdf')
+    clave, sha256, tamano = guardar_blob(archivo())
+    db.session.add(evidencia_de(aprendiz, clave, sha256=sha256, tamano=tamano))
+    db.session.commit()
+    db.session.delete(aprendiz.evidencias[0])
+    db.session.commit()
+    db.session.get(ArchivoBlob, sha256).liberado_en = datetime.utcnow() - timedelta(hours=48)
+    db.session.commit()
+
+    # La subida encuentra el archivo; su evidencia aún no hizo commit cuando corre la limpieza
+    assert guardar_blob(archivo())[0] == clave
+    assert liberar_blobs(horas=24) == (0, 0)
+    assert os.path.exists(ruta_de(clave))
+
+    db.session.add(evidencia_de(aprendiz, clave, sha256=sha256, tamano=tamano))
+    db.session.commit()
+    assert db.session.get(ArchivoBlob, sha256).referencias == 1
+
+
+def test_deduplicar_archivos_existentes(app, tmp_path, crear_aprendiz, evidencia_de, usar_carpeta):
+    ruta_de = usar_carpeta(tmp_path)
+    aprendiz = crear_aprendiz()
+    for nombre, contenido in (('a_plantilla.pdf', b'igual' * 100), ('b_plantilla.pdf', b'igual' * 100),
+                              ('c_otro.pdf', b'distinto')):
+        (tmp_path / nombre).write_bytes(contenido)
+    db.session.add_all([
+        evidencia_de(aprendiz, str(tmp_path / 'a_plantilla.pdf')),
+        evidencia_de(aprendiz, 'b_plantilla.pdf'),
+        evidencia_de(aprendiz, str(tmp_path / 'c_otro.pdf')),
+        evidencia_de(aprendiz, str(tmp_path / 'no_existe.pdf')),
+    ])
+    db.session.commit()
+
+    resumen = deduplicar_evidencias(lote=2)
+
+    assert resumen == {'migradas': 3, 'duplicadas': 1, 'faltantes': 1, 'bytes_recuperados': 500}
+    assert not any(f.endswith('.pdf') for f in os.listdir(tmp_path))
+    referencias = {b.tamano: b.referencias for b in ArchivoBlob.query}
+    assert referencias == {500: 2, len(b'distinto'): 1}
+    for evidencia in Evidencia.query.filter(Evidencia.sha256.isnot(None)):
+        assert os.path.isfile(ruta_de(evidencia.url_archivo))
@@ -0,0 +1,38 @@
+from flask import g
+
+from app import db, load_user
+
+
+def test_load_user_usa_cache_e_invalida_al_editar(app, crear_admin):
+    admin = crear_admin()
+    user_id = admin.get_id()
+    cache = app.extensions['cache_usuarios']
+
+    assert load_user(user_id).nombre == 'Ana'
+    assert load_user(user_id).nombre == 'Ana'
+    assert cache.estadisticas()['misses'] == 1
+    assert cache.estadisticas()['hits'] == 1
+
+    admin.nombre = 'Ana María'
+    db.session.commit()
+    assert cache.get(user_id) is None
+    assert load_user(user_id).nombre == 'Ana María'
+
+    db.session.delete(admin)
+    db.session.commit()
+    assert load_user(user_id) is None
+
+
+def test_metricas_solo_para_administrador(app, client, crear_admin):
+    admin = crear_admin()
+    assert client.get('/estado/metricas').status_code == 302
+
+    with client.session_transaction() as sesion:
+        sesion['_user_id'] = admin.get_id()
+        sesion['_fresh'] = True
+    # El contexto de la app del fixture se comparte entre peticiones
+    g.pop('_login_user', None)
+    response = client.get('/estado/metricas')
+
+    assert response.status_code == 200
+    assert 'hits' in response.get_json()['cache_usuarios']
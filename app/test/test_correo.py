@@ -0,0 +1,57 @@
+import socket
+
+from app import db, mail
+from app.models.users import CorreoPendiente
+from app.services.correo import crear_trabajador
+from app.services.smtp_sink import SumideroSMTP
+
+
+def configurar_smtp(app, puerto):
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=puerto, MAIL_USE_SSL=False,
+                      MAIL_USE_TLS=False, MAIL_USERNAME=None, MAIL_PASSWORD=None,
+                      MAIL_DEFAULT_SENDER='sena@localhost')
+    mail.init_app(app)
+
+
+def test_reset_encola_y_el_trabajador_envia(app, client, crear_admin):
+    crear_admin()
+    sumidero = SumideroSMTP(puerto=0)
+    sumidero.iniciar_en_segundo_plano()
+    configurar_smtp(app, sumidero.puerto)
+
+    try:
+        client.post('/auth/forgot_password', data={'email': 'admin@sena.edu.co'})
+        correo = CorreoPendiente.query.one()
+        assert correo.estado == 'pendiente'
+
+        crear_trabajador().ejecutar(una_vez=True)
+    finally:
+        sumidero.detener()
+
+    assert correo.estado == 'enviado'
+    assert len(sumidero.mensajes) == 1
+    _, destinatarios, mensaje = sumidero.mensajes[0]
+    assert destinatarios == ['<admin@sena.edu.co>']
+    assert '/auth/reset_password/' in mensaje.get_payload(decode=True).decode()
+
+
+def test_fallo_smtp_reintenta_con_espera(app):
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        puerto_cerrado = s.getsockname()[1]
+    configurar_smtp(app, puerto_cerrado)
+
+    db.session.add(CorreoPendiente(destinatario='a@sena.edu.co', asunto='Prueba', cuerpo='Hola'))
+    db.session.commit()
+
+    trabajador = crear_trabajador(max_intentos=2)
+    trabajador.procesar_lote()
+    correo = CorreoPendiente.query.one()
+    assert correo.estado == 'pendiente'
+    assert correo.intentos == 1
+    assert trabajador.procesar_lote() == 0  # aún no vence la espera
+
+    correo.proximo_intento = correo.creado_en
+    db.session.commit()
+    trabajador.procesar_lote()
+    assert correo.estado == 'fallido'
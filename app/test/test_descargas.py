@@ -0,0 +1,50 @@
+from app.services.almacen import enviar_archivo
+
+
+def registrar_vista(app, tmp_path, modo):
+    app.config['EVIDENCIAS_FOLDER'] = str(tmp_path)
+    app.config['DESCARGAS_MODO'] = modo
+    (tmp_path / 'blobs').mkdir()
+    (tmp_path / 'blobs' / 'informe final.pdf').write_bytes(b'%PDF ' + b'x' * 1000)
+
+    @app.route('/prueba-descarga')
+    def prueba_descarga():
+        return enviar_archivo(str(tmp_path / 'blobs' / 'informe final.pdf'), 'informe.pdf', adjunto=False)
+
+    return app.test_client()
+
+
+def test_descarga_python_con_range_y_etag(app, tmp_path):
+    cliente = registrar_vista(app, tmp_path, 'python')
+
+    completa = cliente.get('/prueba-descarga')
+    assert completa.status_code == 200 and len(completa.data) == 1005
+    assert cliente.get('/prueba-descarga', headers={'Range': 'bytes=0-4'}).data == b'%PDF '
+    assert cliente.get('/prueba-descarga', headers={'If-None-Match': completa.headers['ETag']}).status_code == 304
+
+
+def test_descarga_x_accel_la_envia_nginx(app, tmp_path):
+    app.config['DESCARGAS_ACCEL_PREFIJO'] = '/protegido/'
+    cliente = registrar_vista(app, tmp_path, 'x-accel')
+
+    respuesta = cliente.get('/prueba-descarga', headers={'Range': 'bytes=0-4'})
+
+    assert respuesta.status_code == 200 and respuesta.data == b''
+    assert respuesta.headers['X-Accel-Redirect'] == '/protegido/blobs/informe%20final.pdf'
+    assert 'X-Sendfile' not in respuesta.headers
+    assert respuesta.headers['Accept-Ranges'] == 'bytes'
+    assert respuesta.headers['Content-Disposition'].startswith('inline')
+
+    sin_cambios = cliente.get('/prueba-descarga', headers={'If-Modified-Since': respuesta.headers['Last-Modified']})
+    assert sin_cambios.status_code == 304 and 'X-Accel-Redirect' not in sin_cambios.headers
+
+
+def test_descarga_x_sendfile(app, tmp_path):
+    cliente = registrar_vista(app, tmp_path, 'x-sendfile')
+
+    respuesta = cliente.get('/prueba-descarga')
+
+    assert respuesta.headers['X-Sendfile'] == str(tmp_path / 'blobs' / 'informe final.pdf')
+    assert respuesta.data == b''
+    etag = respuesta.headers['ETag']
+    assert cliente.get('/prueba-descarga', headers={'If-None-Match': etag}).status_code == 304
@@ -0,0 +1,71 @@
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import upgrade
+from sqlalchemy import event, inspect
+
+from app import db
+from app.services.esquema import registrar_verificacion, verificar_esquema
+
+
+def test_salud_expone_la_verificacion_de_arranque(app, client):
+    registrar_verificacion(app)
+
+    response = client.get('/estado/salud')
+
+    assert response.status_code == 200
+    assert response.get_json() == {'estado': 'ok'}
+
+
+def test_detalle_del_esquema_requiere_token(app, client):
+    registrar_verificacion(app)
+    app.config['ESTADO_TOKEN'] = 'secreto'
+
+    assert client.get('/estado/esquema').status_code == 403
+    assert client.get('/estado/esquema', headers={'X-Estado-Token': 'otro'}).status_code == 403
+    response = client.get('/estado/esquema', headers={'X-Estado-Token': 'secreto'})
+    assert response.status_code == 200
+    assert response.get_json()['esquema']['ok'] is True
+
+
+def test_forgot_password_no_inspecciona_el_esquema(app, client, crear_admin):
+    crear_admin()
+    app.config['MAIL_USERNAME'] = None
+
+    sentencias = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        response = client.post('/auth/forgot_password', data={'email': 'admin@sena.edu.co'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+
+    assert response.status_code == 302
+    assert len(sentencias) <= 3
+    assert not any('sqlite_master' in s or 'information_schema' in s for s in sentencias)
+
+
+def test_migraciones_sobre_una_base_anterior(app):
+    # Base creada con create_all() antes de las migraciones: solo las tablas de la
+    # revisión base y sin alembic_version
+    db.drop_all()
+    try:
+        upgrade(revision='0001')
+        with db.engine.begin() as conexion:
+            conexion.exec_driver_sql('DROP TABLE alembic_version')
+
+        upgrade()
+
+        inspector = inspect(db.engine)
+        assert not any(i['unique'] for i in inspector.get_indexes('identidad_usuario'))
+        claves = {fk['name']: fk for fk in inspector.get_foreign_keys('notificacion')}
+        assert claves['notificacion_evidencia_id_fkey']['options'] == {'ondelete': 'SET NULL'}
+        assert claves['notificacion_aprendiz_id_fkey']['referred_table'] == 'aprendiz'
+        with db.engine.connect() as conexion:
+            assert compare_metadata(MigrationContext.configure(conexion), db.metadata) == []
+        assert verificar_esquema()['ok'] is True
+    finally:
+        with db.engine.begin() as conexion:
+            conexion.exec_driver_sql('DROP TABLE IF EXISTS alembic_version')
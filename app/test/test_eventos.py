@@ -0,0 +1,52 @@
+from app import db
+from app.models.users import Notificacion
+from app.services.eventos import bus, canal_usuario, canal_rol
+from app.services.notificaciones import difundir, marcar_leida
+
+
+def test_se_publica_solo_al_confirmar(app, crear_admin):
+    admin = crear_admin()
+    suscripcion = bus().suscribir([canal_usuario('Administrador', admin.id_admin), canal_rol('Administrador')])
+
+    difundir('Administrador', mensaje='Descartada', remitente_id=1, rol_remitente='Aprendiz')
+    db.session.flush()
+    db.session.rollback()
+    assert suscripcion.esperar(timeout=0) is None
+
+    noti = difundir('Administrador', mensaje='General', remitente_id=1, rol_remitente='Aprendiz',
+                    motivo='Registro de aprendiz')
+    db.session.commit()
+    evento = suscripcion.esperar(timeout=0)
+    assert evento == {'tipo': 'notificacion', 'id': noti.id, 'motivo': 'Registro de aprendiz'}
+
+    marcar_leida(noti, admin)
+    db.session.commit()
+    assert suscripcion.esperar(timeout=0) == {'tipo': 'leida'}
+    bus().cancelar(suscripcion)
+
+
+def test_stream_sse_envia_conteo_y_nuevas(app, client, crear_admin):
+    admin = crear_admin()
+    app.config['NOTIFICACIONES_SSE_KEEPALIVE'] = 0.01
+    with client.session_transaction() as sesion:
+        sesion['_user_id'] = admin.get_id()
+        sesion['_fresh'] = True
+
+    respuesta = client.get('/notificacion/eventos', buffered=False)
+    assert respuesta.mimetype == 'text/event-stream'
+    partes = iter(respuesta.response)
+    assert 'event: no_leidas\ndata: 0' in next(partes).decode()
+
+    db.session.add(Notificacion(
+        mensaje='Directa', remitente_id=1, rol_remitente='Aprendiz',
+        destinatario_id=admin.id_admin, rol_destinatario='Administrador'
+    ))
+    db.session.commit()
+
+    recibido = ''
+    while 'event: no_leidas' not in recibido:
+        recibido += next(partes).decode()
+    assert 'event: notificacion' in recibido
+    assert 'data: 1' in recibido
+    respuesta.close()
+    assert bus().estadisticas()['streams'] == 0
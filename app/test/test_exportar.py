@@ -0,0 +1,79 @@
+import csv
+import io
+import os
+import zipfile
+
+from werkzeug.datastructures import FileStorage
+
+from app import db
+from app.models.users import Instructor, Ficha, Programa, Sede
+from app.services.blobs import guardar_blob
+from app.services.exportar import BLOQUE
+
+
+def crear_instructor():
+    instructor = Instructor(
+        nombre_instructor='Ana', apellido_instructor='Instructora', correo_instructor='ana@sena.edu.co',
+        celular_instructor='3200000000', tipo_documento='Cedula de Ciudadania', documento='900',
+        password_instructor='x', administrador_sede_id=1
+    )
+    db.session.add(instructor)
+    db.session.commit()
+    return instructor
+
+
+def test_zip_de_ficha_por_partes_con_manifiesto(app, client, tmp_path, crear_aprendiz, evidencia_de, usar_carpeta):
+    usar_carpeta(tmp_path)
+    uno, otro = crear_aprendiz('201'), crear_aprendiz('202')
+    ficha = Ficha(numero_ficha=2567890, sede_rel=Sede.query.one())
+    programa = Programa(nombre_programa='ADSO', titulo='Tecnologo', ficha_rel=ficha)
+    grande = os.urandom(3 * BLOQUE)
+    for aprendiz in (uno, otro):
+        aprendiz.programa = programa
+    clave, sha256, tamano = guardar_blob(FileStorage(io.BytesIO(grande), 'informe.pdf'))
+    db.session.add_all([
+        evidencia_de(uno, clave, sha256=sha256, tamano=tamano, nota='Primer informe'),
+        evidencia_de(otro, str(tmp_path / 'bitacora.xls'), nombre='bitacora.xls',
+                     formato='xls', tipo='Excel', sesion_excel='15_dias'),
+        evidencia_de(otro, str(tmp_path / 'no_existe.pdf')),
+    ])
+    (tmp_path / 'bitacora.xls').write_bytes(b'hoja ' * 2000)
+    db.session.commit()
+
+    instructor = crear_instructor()
+    with client.session_transaction() as sesion:
+        sesion['_user_id'] = instructor.get_id()
+        sesion['_fresh'] = True
+
+    respuesta = client.get(f'/evidencia/ficha/{ficha.id_ficha}/zip', buffered=False)
+    assert respuesta.mimetype == 'application/zip'
+    partes = list(respuesta.response)
+    assert len(partes) > 3
+    assert max(len(parte) for parte in partes) < 2 * BLOQUE
+
+    archivo_zip = zipfile.ZipFile(io.BytesIO(b''.join(partes)))
+    assert archivo_zip.testzip() is None
+    por_nombre = {info.filename: info for info in archivo_zip.infolist()}
+    pdf = next(n for n in por_nombre if n.endswith('informe.pdf'))
+    xls = next(n for n in por_nombre if n.endswith('bitacora.xls'))
+    assert pdf.startswith('201_') and xls.startswith('202_')
+    assert por_nombre[pdf].compress_type == zipfile.ZIP_STORED
+    assert por_nombre[xls].compress_type == zipfile.ZIP_DEFLATED
+    assert archivo_zip.read(pdf) == grande
+
+    manifiesto = list(csv.DictReader(io.StringIO(archivo_zip.read('manifiesto.csv').decode('utf-8-sig'))))
+    assert [fila['estado'] for fila in manifiesto].count('faltante') == 1
+    excel = next(fila for fila in manifiesto if fila['tipo'] == 'Excel')
+    assert excel['sesion_excel'] == '15_dias' and excel['archivo'] == xls
+    assert next(fila for fila in manifiesto if fila['archivo'] == pdf)['nota'] == 'Primer informe'
+
+
+def test_zip_solo_para_instructores(app, client, tmp_path, crear_aprendiz):
+    aprendiz = crear_aprendiz()
+    with client.session_transaction() as sesion:
+        sesion['_user_id'] = aprendiz.get_id()
+        sesion['_fresh'] = True
+
+    respuesta = client.get(f'/evidencia/aprendiz/{aprendiz.id_aprendiz}/zip')
+
+    assert respuesta.status_code == 302
@@ -0,0 +1,15 @@
+from app.services.hashing import ServicioHash, verificar_password
+
+
+def test_verificar_password_rehashea_con_la_politica_actual(app, crear_admin):
+    app.extensions['hash'].cerrar()
+    app.extensions['hash'] = ServicioHash(metodo='pbkdf2:sha256:2000', hilos=2)
+
+    admin = crear_admin()
+
+    assert not verificar_password(admin, 'otra-clave')
+    assert admin.password.startswith('pbkdf2:sha256:1000$')
+
+    assert verificar_password(admin, 'clave-segura')
+    assert admin.password.startswith('pbkdf2:sha256:2000$')
+    assert verificar_password(admin, 'clave-segura')
@@ -0,0 +1,97 @@
+import io
+import os
+import time
+
+from werkzeug.datastructures import FileStorage
+
+from app import db
+from app.models.users import Notificacion
+from app.services.almacen import guardar_adjunto
+from app.services.blobs import guardar_blob
+from app.services.huerfanos import CUARENTENA, reconciliar_archivos
+
+
+def envejecer(ruta, horas=48):
+    antes = time.time() - horas * 3600
+    os.utime(ruta, (antes, antes))
+
+
+def test_huerfanos_van_a_cuarentena_y_luego_se_borran(app, tmp_path, crear_aprendiz, evidencia_de, usar_carpeta):
+    ruta_de = usar_carpeta(tmp_path)
+    aprendiz = crear_aprendiz()
+    clave, sha256, tamano = guardar_blob(FileStorage(io.BytesIO(b'%PDF usado'), 'informe.pdf'))
+    (tmp_path / 'heredado.pdf').write_bytes(b'viejo')
+    db.session.add_all([
+        evidencia_de(aprendiz, clave, sha256=sha256, tamano=tamano),
+        evidencia_de(aprendiz, '/otra/instalacion/uploads/heredado.pdf'),
+        evidencia_de(aprendiz, 'no_existe.pdf'),
+    ])
+    db.session.commit()
+
+    with app.test_request_context():
+        adjunto = guardar_adjunto(FileStorage(io.BytesIO(b'acta'), 'acta.pdf'))
+    db.session.add(Notificacion(mensaje='Acta', remitente_id=1, rol_remitente='Administrador',
+                                rol_destinatario='Aprendiz', adjunto=adjunto))
+    db.session.commit()
+
+    (tmp_path / 'huerfano.pdf').write_bytes(b'x' * 10)
+    (tmp_path / 'reciente.pdf').write_bytes(b'y' * 10)
+    os.makedirs(os.path.dirname(ruta_de('blobs/ff/ff/ffff')))
+    (tmp_path / 'blobs' / 'ff' / 'ff' / 'ffff').write_bytes(b'z' * 20)
+    for ruta in (ruta_de(clave), ruta_de(adjunto), tmp_path / 'heredado.pdf', tmp_path / 'huerfano.pdf', ruta_de('blobs/ff/ff/ffff')):
+        envejecer(ruta)
+
+    simulado = reconciliar_archivos(horas=24, simular=True)
+    assert simulado['en_cuarentena'] == 2 and (tmp_path / 'huerfano.pdf').exists()
+
+    resumen = reconciliar_archivos(horas=24)
+    assert resumen['revisados'] == 6
+    assert resumen['en_cuarentena'] == 2 and resumen['bytes_en_cuarentena'] == 30
+    assert resumen['eliminados'] == 0
+    assert resumen['filas_sin_archivo'] == 1
+    assert not (tmp_path / 'huerfano.pdf').exists()
+    assert (tmp_path / CUARENTENA / 'huerfano.pdf').exists()
+    assert (tmp_path / 'reciente.pdf').exists() and (tmp_path / 'heredado.pdf').exists()
+    assert os.path.exists(ruta_de(clave)) and os.path.exists(ruta_de(adjunto))
+
+    # Un adjunto que reaparece en la base sale de la cuarentena
+    (tmp_path / CUARENTENA / 'huerfano.pdf').rename(tmp_path / CUARENTENA / 'informe_anexo.pdf')
+    db.session.add(evidencia_de(aprendiz, 'informe_anexo.pdf'))
+    db.session.commit()
+    envejecer(tmp_path / CUARENTENA / 'blobs' / 'ff' / 'ff' / 'ffff')
+
+    resumen = reconciliar_archivos(horas=24)
+    assert resumen['restaurados'] == 1 and (tmp_path / 'informe_anexo.pdf').exists()
+    assert resumen['eliminados'] == 1 and resumen['bytes_recuperados'] == 20
+    assert not (tmp_path / CUARENTENA / 'blobs').exists()
+
+
+def test_huerfanos_heredados_en_la_carpeta_publica(app, tmp_path, crear_aprendiz, evidencia_de, usar_carpeta):
+    publica, privada = tmp_path / 'uploads', tmp_path / 'evidencias'
+    publica.mkdir()
+    usar_carpeta(privada)
+    app.config['UPLOAD_FOLDER'] = str(publica)
+    aprendiz = crear_aprendiz()
+
+    # Evidencias y adjuntos anteriores al almacén: nombre suelto en UPLOAD_FOLDER
+    for nombre in ('heredado.pdf', 'acta.pdf', 'huerfano.pdf', '.gitkeep'):
+        (publica / nombre).write_bytes(b'viejo')
+        envejecer(publica / nombre)
+    (publica / 'img').mkdir()
+    (publica / 'img' / 'logo.png').write_bytes(b'png')
+    envejecer(publica / 'img' / 'logo.png')
+    db.session.add(evidencia_de(aprendiz, '/otra/instalacion/uploads/heredado.pdf'))
+    db.session.add(Notificacion(mensaje='Acta', remitente_id=1, rol_remitente='Administrador',
+                                rol_destinatario='Aprendiz', adjunto='acta.pdf'))
+    db.session.commit()
+
+    resumen = reconciliar_archivos(horas=24)
+    assert resumen['revisados'] == 3 and resumen['en_cuarentena'] == 1
+    assert (publica / CUARENTENA / 'huerfano.pdf').exists()
+    assert (publica / 'heredado.pdf').exists() and (publica / 'acta.pdf').exists()
+    assert (publica / '.gitkeep').exists() and (publica / 'img' / 'logo.png').exists()
+    assert not (privada / CUARENTENA).exists()
+
+    envejecer(publica / CUARENTENA / 'huerfano.pdf')
+    assert reconciliar_archivos(horas=24)['eliminados'] == 1
+    assert not any((publica / CUARENTENA).iterdir())
@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.users import IdentidadUsuario
+from app.services.identidad import buscar_por_documento, campo_en_uso, reconstruir_identidades
+
+
+def test_indice_se_sincroniza_al_crear_editar_y_eliminar(app, crear_admin, crear_aprendiz):
+    admin = crear_admin()
+    aprendiz = crear_aprendiz()
+
+    assert buscar_por_documento('100') is admin
+    assert buscar_por_documento('200') is aprendiz
+
+    aprendiz.correo = 'nuevo@sena.edu.co'
+    db.session.commit()
+    assert campo_en_uso(correo='aprendiz200@sena.edu.co') is None
+    assert campo_en_uso(correo='nuevo@sena.edu.co') == 'correo'
+    assert campo_en_uso(correo='nuevo@sena.edu.co', excluir=aprendiz) is None
+
+    db.session.delete(aprendiz)
+    db.session.commit()
+    assert buscar_por_documento('200') is None
+    assert IdentidadUsuario.query.count() == 1
+
+
+def test_unicidad_entre_roles(app, crear_admin, crear_aprendiz):
+    crear_admin()
+
+    assert campo_en_uso(documento='100', correo='otro@sena.edu.co', celular='1') == 'documento'
+    assert campo_en_uso(documento='999', correo='otro@sena.edu.co', celular='3000000000') == 'celular'
+
+    # El índice no impone unicidad entre roles (solo la revisión de los formularios)
+    aprendiz = crear_aprendiz(celular='3000000000')
+    assert IdentidadUsuario.query.filter_by(celular='3000000000').count() == 2
+
+    # La unicidad propia de cada tabla se mantiene
+    with pytest.raises(IntegrityError):
+        crear_aprendiz(documento='201', correo='otro@sena.edu.co', celular=aprendiz.celular)
+    db.session.rollback()
+
+
+def test_reconstruir_identidades(app, crear_admin, crear_aprendiz):
+    crear_admin()
+    crear_aprendiz()
+    db.session.execute(IdentidadUsuario.__table__.delete())
+    db.session.commit()
+
+    insertadas, conflictos = reconstruir_identidades()
+
+    assert insertadas == 2
+    assert conflictos == []
+    assert buscar_por_documento('200').rol_user == 'aprendiz'
+
+
+def test_reconstruir_conserva_usuarios_con_datos_repetidos(app, crear_admin, crear_aprendiz):
+    admin = crear_admin(documento='100')
+    aprendiz = crear_aprendiz(documento='100', celular=admin.celular)
+    db.session.execute(IdentidadUsuario.__table__.delete())
+    db.session.commit()
+
+    insertadas, conflictos = reconstruir_identidades()
+
+    assert insertadas == 2
+    assert conflictos == [('aprendiz', aprendiz.id_aprendiz, ['documento', 'celular'])]
+    # Mismo orden que el login anterior: primero administrador
+    assert buscar_por_documento('100') is admin
+
+    aprendiz.celular = '3100000009'
+    db.session.commit()
+    assert IdentidadUsuario.query.filter_by(rol='aprendiz').one().celular == '3100000009'
+
+
+def test_login_unificado_por_documento(app, client, crear_aprendiz):
+    crear_aprendiz()
+
+    response = client.post('/auth/login', data={'documento': '200', 'password': 'clave-segura'})
+
+    assert response.status_code == 302
+    assert '/aprendiz/dashboard' in response.headers['Location']
+
+
+def test_login_limita_intentos_por_documento(app, client, crear_aprendiz):
+    crear_aprendiz()
+    limitador = app.extensions['limitador']
+
+    for _ in range(limitador.limite_identidad):
+        response = client.post('/auth/login', data={'documento': '200', 'password': 'incorrecta'})
+        assert response.headers['Location'].endswith('/auth/login')
+
+    response = client.post('/auth/login', data={'documento': '200', 'password': 'clave-segura'})
+
+    assert '/aprendiz/dashboard' not in response.headers['Location']
+    assert limitador.estadisticas()['rechazadas_por_ruta'] == {'auth.login:identidad': 1}
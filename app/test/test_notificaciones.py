@@ -0,0 +1,356 @@
+from sqlalchemy import event
+
+from app import db
+from app.models.users import (
+    Notificacion, NotificacionLectura, ContadorNotificacion, ContadorDifusion
+)
+from app.services.notificaciones import (
+    difundir, contar_no_leidas, ids_leidos, marcar_leida, marcar_todas_leidas, normalizar_rol,
+    reconstruir_contadores, paginar_bandeja, nombres_remitentes, normalizar_roles
+)
+
+
+def test_difusion_es_una_sola_fila_con_lectura_por_usuario(app, crear_admin):
+    uno = crear_admin('100', 'uno@sena.edu.co', '3000000001')
+    dos = crear_admin('101', 'dos@sena.edu.co', '3000000002')
+
+    noti = difundir('administrador', mensaje='Nuevo aprendiz', remitente_id=1, rol_remitente='Aprendiz')
+    db.session.commit()
+
+    assert Notificacion.query.count() == 1
+    assert noti.rol_destinatario == 'Administrador'
+    assert contar_no_leidas(uno) == 1
+    assert contar_no_leidas(dos) == 1
+
+    marcar_leida(noti, uno)
+    marcar_leida(noti, uno)
+    db.session.commit()
+
+    assert NotificacionLectura.query.count() == 1
+    assert contar_no_leidas(uno) == 0
+    assert contar_no_leidas(dos) == 1
+    assert ids_leidos([noti], uno) == {noti.id}
+    assert ids_leidos([noti], dos) == set()
+
+
+def test_marcar_todas_leidas_incluye_directas_y_difusiones(app, crear_admin):
+    admin = crear_admin('100', 'uno@sena.edu.co', '3000000001')
+    difundir('Administrador', mensaje='General', remitente_id=1, rol_remitente='Aprendiz')
+    difundir('Administrador', mensaje='Otra', remitente_id=2, rol_remitente='Instructor')
+    db.session.add(Notificacion(
+        mensaje='Directa', remitente_id=1, rol_remitente='Aprendiz',
+        destinatario_id=admin.id_admin, rol_destinatario='Administrador'
+    ))
+    db.session.commit()
+    assert contar_no_leidas(admin) == 3
+
+    marcar_todas_leidas(admin)
+    db.session.commit()
+    assert contar_no_leidas(admin) == 0
+
+    # Las difusiones quedan cubiertas por el cursor: ninguna fila por notificación
+    marcar_todas_leidas(admin)
+    db.session.commit()
+    assert NotificacionLectura.query.count() == 0
+    assert ids_leidos(Notificacion.query.all(), admin) == {n.id for n in Notificacion.query}
+
+
+def test_cursor_de_difusiones(app, crear_admin):
+    admin = crear_admin('100', 'uno@sena.edu.co', '3000000001')
+    vieja = difundir('Administrador', mensaje='Vieja', remitente_id=1, rol_remitente='Aprendiz')
+    db.session.commit()
+    marcar_todas_leidas(admin)
+    db.session.commit()
+    contador = db.session.get(ContadorNotificacion, ('Administrador', admin.id_admin))
+    assert contador.ultima_difusion_leida == vieja.id
+
+    nueva = difundir('Administrador', mensaje='Nueva', remitente_id=1, rol_remitente='Aprendiz')
+    otra = difundir('Administrador', mensaje='Otra', remitente_id=1, rol_remitente='Aprendiz')
+    db.session.commit()
+    assert contar_no_leidas(admin) == 2
+
+    # Por debajo del cursor no se crean lecturas; por encima, sí
+    marcar_leida(vieja, admin)
+    marcar_leida(nueva, admin)
+    db.session.commit()
+    assert [l.notificacion_id for l in NotificacionLectura.query] == [nueva.id]
+    assert contar_no_leidas(admin) == 1
+
+    # Reconstruir conserva el cursor y suma las lecturas sueltas por encima
+    assert reconstruir_contadores() == (1, 1)
+    db.session.commit()
+    contador = db.session.get(ContadorNotificacion, ('Administrador', admin.id_admin))
+    assert (contador.ultima_difusion_leida, contador.difusiones_leidas) == (vieja.id, 2)
+    assert contar_no_leidas(admin) == 1
+
+    # Borrar una difusión cubierta por el cursor la descuenta de las leídas
+    db.session.delete(vieja)
+    db.session.commit()
+    assert contar_no_leidas(admin) == 1
+
+    marcar_todas_leidas(admin)
+    db.session.commit()
+    contador = db.session.get(ContadorNotificacion, ('Administrador', admin.id_admin))
+    assert contador.ultima_difusion_leida == otra.id
+    assert contar_no_leidas(admin) == 0
+
+
+def test_normalizar_rol():
+    assert normalizar_rol('administrador') == 'Administrador'
+    assert normalizar_rol('Administrador Sede') == 'AdministradorSede'
+    assert normalizar_rol('administrador_sede') == 'AdministradorSede'
+    assert normalizar_rol('Sistema') == 'Sistema'
+
+
+def test_contadores_siguen_envios_lecturas_y_borrados(app, crear_admin):
+    admin = crear_admin('100', 'uno@sena.edu.co', '3000000001')
+    directa = Notificacion(
+        mensaje='Directa', remitente_id=1, rol_remitente='Aprendiz',
+        destinatario_id=admin.id_admin, rol_destinatario='Administrador'
+    )
+    db.session.add(directa)
+    difusion = difundir('Administrador', mensaje='General', remitente_id=1, rol_remitente='Aprendiz')
+    db.session.commit()
+    assert contar_no_leidas(admin) == 2
+
+    marcar_leida(directa, admin)
+    marcar_leida(difusion, admin)
+    db.session.commit()
+    assert contar_no_leidas(admin) == 0
+
+    db.session.delete(difusion)
+    db.session.commit()
+    difundir('Administrador', mensaje='Nueva', remitente_id=1, rol_remitente='Aprendiz')
+    db.session.commit()
+    assert contar_no_leidas(admin) == 1
+
+
+def test_reconstruir_contadores(app, crear_admin):
+    admin = crear_admin('100', 'uno@sena.edu.co', '3000000001')
+    difundir('Administrador', mensaje='General', remitente_id=1, rol_remitente='Aprendiz')
+    db.session.add(Notificacion(
+        mensaje='Directa', remitente_id=1, rol_remitente='Aprendiz',
+        destinatario_id=admin.id_admin, rol_destinatario='Administrador'
+    ))
+    db.session.commit()
+
+    db.session.execute(ContadorNotificacion.__table__.delete())
+    db.session.execute(ContadorDifusion.__table__.delete())
+    db.session.commit()
+    assert contar_no_leidas(admin) == 0
+
+    assert reconstruir_contadores() == (1, 1)
+    db.session.commit()
+    assert contar_no_leidas(admin) == 2
+
+
+def test_normalizar_roles_reconstruye_contadores(app, crear_admin):
+    admin = crear_admin('100', 'uno@sena.edu.co', '3000000001')
+    db.session.add(Notificacion(
+        mensaje='Antigua', remitente_id=1, rol_remitente='aprendiz',
+        destinatario_id=admin.id_admin, rol_destinatario='administrador'
+    ))
+    db.session.commit()
+    assert contar_no_leidas(admin) == 0
+
+    assert normalizar_roles() == 2
+    db.session.commit()
+    assert contar_no_leidas(admin) == 1
+    assert db.session.get(ContadorNotificacion, ('administrador', admin.id_admin)) is None
+
+
+def test_paginar_bandeja_por_cursor(app, crear_admin):
+    admin = crear_admin('100', 'uno@sena.edu.co', '3000000001')
+    for i in range(5):
+        difundir('Administrador', mensaje=f'General {i}', remitente_id=1, rol_remitente='Aprendiz')
+        db.session.add(Notificacion(
+            mensaje=f'Directa {i}', remitente_id=1, rol_remitente='Aprendiz',
+            destinatario_id=admin.id_admin, rol_destinatario='Administrador'
+        ))
+    db.session.add(Notificacion(
+        mensaje='De otro', remitente_id=1, rol_remitente='Aprendiz',
+        destinatario_id=admin.id_admin + 1, rol_destinatario='Administrador'
+    ))
+    db.session.commit()
+    esperadas = [n.id for n in Notificacion.query.filter(
+        Notificacion.destinatario_id.is_(None) | (Notificacion.destinatario_id == admin.id_admin)
+    ).order_by(Notificacion.fecha_creacion.desc(), Notificacion.id.desc())]
+
+    primera = paginar_bandeja(admin, por_pagina=4)
+    segunda = paginar_bandeja(admin, antes_de=primera.antes_de, por_pagina=4)
+    tercera = paginar_bandeja(admin, antes_de=segunda.antes_de, por_pagina=4)
+
+    assert primera.despues_de is None
+    assert [n.id for n in primera.items + segunda.items + tercera.items] == esperadas
+    assert tercera.antes_de is None
+
+    volver = paginar_bandeja(admin, despues_de=segunda.despues_de, por_pagina=4)
+    assert [n.id for n in volver.items] == [n.id for n in primera.items]
+    assert volver.despues_de is None
+
+
+def test_nombres_remitentes_un_in_por_rol_y_cache(app, crear_admin):
+    uno = crear_admin('100', 'uno@sena.edu.co', '3000000001')
+    dos = crear_admin('101', 'dos@sena.edu.co', '3000000002')
+    pagina = [
+        Notificacion(mensaje='a', remitente_id=uno.id_admin, rol_remitente='administrador'),
+        Notificacion(mensaje='b', remitente_id=dos.id_admin, rol_remitente='Administrador'),
+        Notificacion(mensaje='c', remitente_id=uno.id_admin, rol_remitente='Administrador'),
+        Notificacion(mensaje='d', remitente_id=0, rol_remitente='Sistema'),
+    ]
+
+    sentencias = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        nombres_remitentes(pagina)
+        primera = len(sentencias)
+        nombres_remitentes(pagina)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+
+    assert [n.remitente_nombre for n in pagina] == ['Ana Admin', 'Ana Admin', 'Ana Admin', 'Sistema']
+    assert primera == 1
+    assert len(sentencias) == 1
+
+    dos.nombre = 'Berta'
+    db.session.commit()
+    nombres_remitentes(pagina)
+    assert pagina[1].remitente_nombre == 'Berta Admin'
+
+
+def test_migrar_referencias_del_texto(app, crear_aprendiz, evidencia_de):
+    from app.services.notificaciones import migrar_referencias
+
+    aprendiz = crear_aprendiz()
+    evidencia = evidencia_de(aprendiz, 'informe.pdf', tipo='pdf')
+    db.session.add(evidencia)
+    db.session.commit()
+
+    db.session.add_all([
+        Notificacion(motivo='Nueva Evidencia subida', remitente_id=aprendiz.id_aprendiz,
+                     rol_remitente='Aprendiz', destinatario_id=1, rol_destinatario='Instructor',
+                     mensaje=f'El aprendiz Luis ha Subido una nueva evidencia (ID: {evidencia.id_evidencia}).'),
+        Notificacion(remitente_id=1, rol_remitente='Instructor', destinatario_id=1,
+                     rol_destinatario='Aprendiz', mensaje='Revisa esto\n\nArchivo adjunto: guia.docx'),
+        Notificacion(remitente_id=1, rol_remitente='Instructor', destinatario_id=1,
+                     rol_destinatario='Aprendiz', mensaje='Evidencia borrada (ID: 999).'),
+    ])
+    db.session.commit()
+
+    assert migrar_referencias(lote=1) == 2
+    subida, con_adjunto, huerfana = Notificacion.query.order_by(Notificacion.id).all()
+    assert subida.evidencia is evidencia and subida.aprendiz_id == aprendiz.id_aprendiz
+    assert con_adjunto.adjunto == 'guia.docx'
+    assert huerfana.evidencia_id is None
+    assert migrar_referencias() == 0
+
+
+def test_buffer_de_lecturas_escribe_en_bloque(app, crear_admin):
+    from app.services.notificaciones import BufferLecturas, registrar_lectura
+
+    buffer = BufferLecturas(app, intervalo=60)
+    app.extensions['buffer_lecturas'] = buffer
+    admin = crear_admin('100', 'uno@sena.edu.co', '3000000001')
+    directas = [
+        Notificacion(mensaje=f'Directa {i}', remitente_id=1, rol_remitente='Aprendiz',
+                     destinatario_id=admin.id_admin, rol_destinatario='Administrador')
+        for i in range(2)
+    ]
+    db.session.add_all(directas)
+    difusion = difundir('Administrador', mensaje='General', remitente_id=1, rol_remitente='Aprendiz')
+    db.session.commit()
+    assert contar_no_leidas(admin) == 3
+
+    # Sin escritura todavía, pero el badge y la bandeja ya lo reflejan
+    for noti in directas + [difusion, difusion]:
+        registrar_lectura(noti, admin)
+    assert buffer.estadisticas()['pendientes'] == 3
+    assert contar_no_leidas(admin) == 0
+    assert ids_leidos(directas + [difusion], admin) == {n.id for n in directas + [difusion]}
+
+    assert buffer.vaciar() == 3
+    db.session.expire_all()
+    assert all(n.visto for n in directas)
+    assert NotificacionLectura.query.count() == 1
+    assert contar_no_leidas(admin) == 0
+    assert buffer.vaciar() == 0
+
+
+def test_buffer_de_lecturas_ignora_lo_ya_leido(app, crear_admin):
+    from app.services.notificaciones import BufferLecturas
+
+    buffer = BufferLecturas(app, intervalo=60)
+    app.extensions['buffer_lecturas'] = buffer
+    admin = crear_admin('100', 'uno@sena.edu.co', '3000000001')
+    difusion = difundir('Administrador', mensaje='General', remitente_id=1, rol_remitente='Aprendiz')
+    db.session.commit()
+
+    # Encolada en un worker y cubierta por "marcar todas" en otro antes de escribirse
+    buffer.registrar('Administrador', admin.id_admin, difusion.id, True)
+    marcar_todas_leidas(admin)
+    db.session.commit()
+
+    assert buffer.vaciar() == 0
+    assert NotificacionLectura.query.count() == 0
+    db.session.expire_all()
+    assert contar_no_leidas(admin) == 0
+    assert db.session.get(ContadorNotificacion, ('Administrador', admin.id_admin)).difusiones_leidas == 1
+
+
+def test_archivar_notificaciones_vistas(app, crear_admin):
+    from datetime import datetime, timedelta
+    from app.models.users import NotificacionArchivada
+    from app.services.notificaciones import archivar_notificaciones
+
+    admin = crear_admin('100', 'uno@sena.edu.co', '3000000001')
+    vieja = datetime.utcnow() - timedelta(days=60)
+
+    def directa(mensaje, visto, fecha):
+        return Notificacion(mensaje=mensaje, remitente_id=1, rol_remitente='Aprendiz', visto=visto,
+                            destinatario_id=admin.id_admin, rol_destinatario='Administrador',
+                            fecha_creacion=fecha)
+
+    vistas = [directa(f'Vista {i}', True, vieja + timedelta(minutes=i)) for i in range(3)]
+    db.session.add_all(vistas + [directa('Sin ver', False, vieja), directa('Reciente', True, datetime.utcnow())])
+    difundir('Administrador', mensaje='General', remitente_id=1, rol_remitente='Aprendiz').fecha_creacion = vieja
+    db.session.commit()
+    ids_vistas = [n.id for n in vistas]
+
+    movidas, segundos = archivar_notificaciones(dias=30, lote=2)
+    assert movidas == 3 and segundos >= 0
+    assert sorted(a.id for a in NotificacionArchivada.query) == ids_vistas
+    assert Notificacion.query.count() == 3
+    assert contar_no_leidas(admin) == 2
+    assert archivar_notificaciones(dias=30)[0] == 0
+
+    bandeja = paginar_bandeja(admin)
+    assert not set(ids_vistas) & {n.id for n in bandeja.items}
+
+    primera = paginar_bandeja(admin, por_pagina=2, archivadas=True)
+    segunda = paginar_bandeja(admin, antes_de=primera.antes_de, por_pagina=2, archivadas=True)
+    assert [n.id for n in primera.items + segunda.items] == ids_vistas[::-1]
+    assert segunda.antes_de is None
+
+
+def test_respuesta_a_una_fila_antigua_usa_el_rol_canonico(app, client, crear_admin, crear_aprendiz):
+    admin, aprendiz = crear_admin(), crear_aprendiz()
+    antigua = Notificacion(
+        mensaje='Antigua', remitente_id=admin.id_admin, rol_remitente='administrador',
+        destinatario_id=aprendiz.id_aprendiz, rol_destinatario='Aprendiz'
+    )
+    db.session.add(antigua)
+    db.session.commit()
+    with client.session_transaction() as sesion:
+        sesion['_user_id'] = aprendiz.get_id()
+        sesion['_fresh'] = True
+
+    respuesta = client.post(f'/aprendiz/notificacion/{antigua.id}/responder', data={'respuesta': 'Recibido'})
+
+    assert respuesta.status_code == 302
+    nueva = Notificacion.query.filter_by(mensaje='Recibido').one()
+    assert nueva.rol_destinatario == 'Administrador'
+    assert contar_no_leidas(admin) == 1
@@ -0,0 +1,81 @@
+import io
+import zipfile
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from app import db
+from app.models.users import ArchivoBlob
+from app.services import previas
+from app.services.blobs import guardar_blob
+from app.services.previas import generar_previa, previas_de
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def docx(parrafos, paginas=3):
+    contenido = io.BytesIO()
+    with zipfile.ZipFile(contenido, 'w') as archivo_zip:
+        cuerpo = ''.join(f'<w:p><w:r><w:t>{a}</w:t></w:r><w:r><w:t>{b}</w:t></w:r></w:p>' for a, b in parrafos)
+        archivo_zip.writestr('word/document.xml', f'<w:document {W}><w:body>{cuerpo}</w:body></w:document>')
+        archivo_zip.writestr('docProps/app.xml', (
+            '<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties">'
+            f'<Pages>{paginas}</Pages></Properties>'
+        ))
+    return contenido.getvalue()
+
+
+def xlsx():
+    s = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    contenido = io.BytesIO()
+    with zipfile.ZipFile(contenido, 'w') as archivo_zip:
+        archivo_zip.writestr('xl/workbook.xml', f'<workbook {s}><sheets><sheet name="Enero"/><sheet name="Febrero"/></sheets></workbook>')
+        archivo_zip.writestr('xl/sharedStrings.xml', f'<sst {s}><si><t>Horas de práctica</t></si><si><t>Total</t></si></sst>')
+    return contenido.getvalue()
+
+
+def test_extractores_docx_y_xlsx(tmp_path):
+    ruta = tmp_path / 'acta.docx'
+    ruta.write_bytes(docx([('Acta de ', 'seguimiento'), ('Se revisaron', ' las tareas pendientes')]))
+    previa, miniatura = previas.extraer_previa(str(ruta), 'docx')
+    assert previa == {'paginas': 3, 'palabras': 8, 'extracto': 'Acta de seguimiento Se revisaron las tareas pendientes'}
+    assert miniatura is None
+
+    ruta = tmp_path / 'bitacora.xlsx'
+    ruta.write_bytes(xlsx())
+    previa, _ = previas.extraer_previa(str(ruta), 'xlsx')
+    assert previa['hojas'] == 2 and previa['nombres_hojas'] == ['Enero', 'Febrero']
+    assert previa['palabras'] == 4 and previa['extracto'] == 'Horas de práctica Total'
+
+
+@pytest.mark.skipif(previas.pypdf is not None, reason='con pypdf se usa su conteo')
+def test_pdf_sin_pypdf_cuenta_paginas(tmp_path):
+    ruta = tmp_path / 'informe.pdf'
+    ruta.write_bytes(b'%PDF-1.4\n1 0 obj <</Type /Pages /Count 2>>\n2 0 obj <</Type/Page>>\n3 0 obj <</Type /Page>>\n')
+    previa, _ = previas.extraer_previa(str(ruta), 'pdf')
+    assert previa['paginas'] == 2
+
+
+def test_previa_en_el_pool_y_en_el_listado(app, client, tmp_path, crear_aprendiz, evidencia_de, usar_carpeta):
+    usar_carpeta(tmp_path)
+    aprendiz = crear_aprendiz()
+    clave, sha256, tamano = guardar_blob(FileStorage(io.BytesIO(docx([('Informe', ' mensual')])), 'informe.docx'))
+    evidencia = evidencia_de(aprendiz, clave, nombre='informe.docx', formato='docx', tipo='Word',
+                             sha256=sha256, tamano=tamano)
+    db.session.add(evidencia)
+    db.session.commit()
+
+    futuro = generar_previa(evidencia)
+    assert futuro.result(timeout=60)['estado'] == 'lista'
+    db.session.expire_all()
+    assert db.session.get(ArchivoBlob, sha256).previa['palabras'] == 2
+    # Ya procesada: no se vuelve a encolar
+    assert generar_previa(evidencia) is None
+    assert previas_de([evidencia])[sha256]['extracto'] == 'Informe mensual'
+
+    with client.session_transaction() as sesion:
+        sesion['_user_id'] = aprendiz.get_id()
+        sesion['_fresh'] = True
+    html = client.get('/evidencia/').get_data(as_text=True)
+    assert 'Informe mensual' in html and '3 pág.' in html
+    app.extensions['previas'].cerrar()
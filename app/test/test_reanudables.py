@@ -0,0 +1,77 @@
+import base64
+import hashlib
+import os
+import time
+
+from app.models.users import Evidencia
+from app.services.almacen import AlmacenLocal
+from app.services.reanudables import limpiar_subidas, iniciar_subida
+
+
+def checksum(datos):
+    return 'sha256 ' + base64.b64encode(hashlib.sha256(datos).digest()).decode()
+
+
+def preparar(app, client, tmp_path, aprendiz):
+    app.config['EVIDENCIAS_FOLDER'] = str(tmp_path / 'evidencias')
+    app.config['SUBIDAS_REANUDABLES_CARPETA'] = str(tmp_path / 'subidas')
+    app.extensions['almacen'] = AlmacenLocal(app.config['EVIDENCIAS_FOLDER'])
+    with client.session_transaction() as sesion:
+        sesion['_user_id'] = aprendiz.get_id()
+        sesion['_fresh'] = True
+    return aprendiz
+
+
+def test_subida_por_bloques_se_retoma_y_se_finaliza(app, client, tmp_path, crear_aprendiz):
+    aprendiz = preparar(app, client, tmp_path, crear_aprendiz())
+    contenido = b'%PDF' + os.urandom(3000)
+    bloques = [contenido[:1000], contenido[1000:2000], contenido[2000:]]
+
+    inicio = client.post('/evidencia/reanudable/pdf', json={'nombre': 'informe.pdf', 'tamano': len(contenido)})
+    assert inicio.status_code == 201
+    url = inicio.json['url']
+
+    def enviar(offset, datos, suma=None):
+        return client.patch(url, data=datos, headers={
+            'Upload-Offset': str(offset), 'Upload-Checksum': suma or checksum(datos)
+        })
+
+    assert enviar(0, bloques[0]).headers['Upload-Offset'] == '1000'
+    # Bloque dañado en el camino: no avanza
+    danado = enviar(1000, bloques[1], suma=checksum(b'otro'))
+    assert danado.status_code == 460 and danado.headers['Upload-Offset'] == '1000'
+    # Reintento con un offset que ya no corresponde
+    desfase = enviar(0, bloques[0])
+    assert desfase.status_code == 409 and desfase.json['offset'] == 1000
+
+    assert client.get(url).json == {'offset': 1000, 'tamano': len(contenido)}
+    assert enviar(1000, bloques[1]).status_code == 204
+    assert enviar(2000, bloques[2]).headers['Upload-Offset'] == str(len(contenido))
+
+    respuesta = client.post('/evidencia/upload/pdf', data={'reanudable': url.rsplit('/', 1)[1], 'nota': 'ok'})
+
+    assert respuesta.status_code == 302
+    evidencia = Evidencia.query.filter_by(aprendiz_id_aprendiz=aprendiz.id_aprendiz).one()
+    assert evidencia.nombre_archivo == 'informe.pdf'
+    assert evidencia.sha256 == hashlib.sha256(contenido).hexdigest()
+    with open(app.extensions['almacen'].ruta_local(evidencia.url_archivo), 'rb') as archivo:
+        assert archivo.read() == contenido
+    assert os.listdir(tmp_path / 'subidas') == []
+    assert client.get(url).status_code == 404
+
+
+def test_subida_incompleta_no_se_finaliza_y_se_limpia(app, client, tmp_path, crear_aprendiz):
+    aprendiz = preparar(app, client, tmp_path, crear_aprendiz())
+    id_subida = iniciar_subida(aprendiz.id_aprendiz, 'pdf', 'informe.pdf', 5000)
+
+    respuesta = client.post('/evidencia/upload/pdf', data={'reanudable': id_subida})
+    assert respuesta.status_code == 302
+    assert Evidencia.query.count() == 0
+
+    assert limpiar_subidas(horas=1) == (0, 0)
+    viejo = time.time() - 2 * 3600
+    for nombre in os.listdir(tmp_path / 'subidas'):
+        os.utime(tmp_path / 'subidas' / nombre, (viejo, viejo))
+    subidas, _ = limpiar_subidas(horas=1)
+    assert subidas == 1
+    assert os.listdir(tmp_path / 'subidas') == []
@@ -0,0 +1,39 @@
+from app import db
+from app.models.users import Administrador
+from app.services.hashing import verificar_password
+from app.services.tokens_reset import generar_token_reset
+
+
+def restablecer(client, token, password='nueva-clave-123'):
+    return client.post(f'/auth/reset_password/{token}', data={
+        'password': password, 'confirm_password': password
+    })
+
+
+def test_token_firmado_es_de_un_solo_uso(app, client, crear_admin):
+    admin = crear_admin()
+    with app.test_request_context():
+        token = generar_token_reset(admin)
+
+    assert client.get(f'/auth/reset_password/{token}').status_code == 200
+
+    response = restablecer(client, token)
+    assert response.headers['Location'].endswith('/auth/login')
+    assert verificar_password(db.session.get(Administrador, admin.id_admin), 'nueva-clave-123')
+
+    # La huella de la contraseña cambió: el mismo enlace ya no sirve
+    restablecer(client, token, password='otra-clave-456')
+    assert verificar_password(db.session.get(Administrador, admin.id_admin), 'nueva-clave-123')
+
+
+def test_token_alterado_o_vencido(app, client, crear_admin):
+    admin = crear_admin()
+    with app.test_request_context():
+        token = generar_token_reset(admin)
+
+    response = client.get(f'/auth/reset_password/{token}x')
+    assert response.headers['Location'].endswith('/auth/login')
+
+    app.config['RESET_TOKEN_MAX_AGE'] = -1
+    response = client.get(f'/auth/reset_password/{token}')
+    assert response.headers['Location'].endswith('/auth/forgot_password')
@@ -0,0 +1,63 @@
+import io
+from datetime import date
+
+from app import db
+from app.models.users import Evidencia, ResumenEvidencias
+from app.services.resumen_evidencias import resumen_de, reconstruir_resumenes
+
+
+def conteos(aprendiz_id):
+    resumen = resumen_de(aprendiz_id)
+    return (resumen.subidas, resumen.word, resumen.excel_15, resumen.excel_3, resumen.pdf)
+
+
+def test_resumen_se_mantiene_al_subir_editar_y_eliminar(app, crear_aprendiz, evidencia_de):
+    aprendiz = crear_aprendiz()
+    inicio = date(2026, 1, 10)
+    word = evidencia_de(aprendiz, 'a.docx', formato='docx', tipo='Word', primera_subida_word=inicio)
+    excel = evidencia_de(aprendiz, 'b.xlsx', formato='xlsx', tipo='Excel', sesion_excel='15_dias',
+                         primera_subida_excel_15=inicio)
+    db.session.add_all([word, excel, evidencia_de(aprendiz, 'c.pdf'), evidencia_de(aprendiz, '')])
+    db.session.commit()
+
+    assert conteos(aprendiz.id_aprendiz) == (3, 1, 1, 0, 1)
+    assert resumen_de(aprendiz.id_aprendiz).primera_subida_word == inicio
+
+    excel.sesion_excel = '3_meses'
+    db.session.commit()
+    assert conteos(aprendiz.id_aprendiz) == (3, 1, 0, 1, 1)
+
+    db.session.delete(word)
+    db.session.commit()
+    resumen = resumen_de(aprendiz.id_aprendiz)
+    assert conteos(aprendiz.id_aprendiz) == (2, 0, 0, 1, 1)
+    assert resumen.primera_subida_word is None
+    assert resumen.primera_subida_excel_15 == inicio
+
+    db.session.execute(ResumenEvidencias.__table__.delete())
+    assert reconstruir_resumenes() == 1
+    db.session.commit()
+    assert conteos(aprendiz.id_aprendiz) == (2, 0, 0, 1, 1)
+
+    db.session.delete(aprendiz)
+    db.session.commit()
+    assert ResumenEvidencias.query.count() == 0
+
+
+def test_tope_de_evidencias_lee_el_resumen(app, client, tmp_path, crear_aprendiz, evidencia_de, usar_carpeta):
+    usar_carpeta(tmp_path)
+    aprendiz = crear_aprendiz()
+    db.session.add_all([evidencia_de(aprendiz, f'{numero}.pdf') for numero in range(17)])
+    db.session.commit()
+    with client.session_transaction() as sesion:
+        sesion['_user_id'] = aprendiz.get_id()
+        sesion['_fresh'] = True
+
+    respuesta = client.post('/evidencia/upload/pdf', data={
+        'archivo': (io.BytesIO(b'%PDF otra'), 'otra.pdf'),
+    }, content_type='multipart/form-data')
+
+    assert respuesta.status_code == 302
+    assert Evidencia.query.count() == 17
+    with client.session_transaction() as sesion:
+        assert 'máximo de 17' in dict(sesion['_flashes'])['danger']
@@ -0,0 +1,58 @@
+import hashlib
+import io
+import os
+
+from flask import request
+
+from app.services.subidas import preparar_subida, guardar_subida
+
+
+def registrar_vista(app, carpeta, mover=True):
+    @app.route('/prueba-subida', methods=['POST'])
+    def prueba_subida():
+        if not preparar_subida('pdf', carpeta=str(carpeta)):
+            return 'rechazado', 413
+        archivo = request.files['archivo']
+        if not mover:
+            raise RuntimeError('falla después de recibir el archivo')
+        ruta, sha256, tamano = guardar_subida(archivo, 'final.pdf', carpeta=str(carpeta))
+        return {'ruta': ruta, 'sha256': sha256, 'tamano': tamano}
+
+
+def enviar(app, contenido, **opciones):
+    return app.test_client().post('/prueba-subida', data={
+        'archivo': (io.BytesIO(contenido), 'informe.pdf'), 'nota': 'ok'
+    }, content_type='multipart/form-data', **opciones)
+
+
+def test_subida_se_escribe_en_destino_con_hash(app, tmp_path):
+    registrar_vista(app, tmp_path)
+    contenido = os.urandom(700 * 1024)
+
+    respuesta = enviar(app, contenido)
+
+    assert respuesta.status_code == 200
+    assert respuesta.json['sha256'] == hashlib.sha256(contenido).hexdigest()
+    assert respuesta.json['tamano'] == len(contenido)
+    assert os.listdir(tmp_path) == ['final.pdf']
+    assert (tmp_path / 'final.pdf').read_bytes() == contenido
+
+
+def test_subida_demasiado_grande_se_rechaza_sin_escribir(app, tmp_path):
+    app.config['EVIDENCIA_LIMITES'] = {'pdf': 1024}
+    registrar_vista(app, tmp_path)
+
+    respuesta = enviar(app, b'x' * (200 * 1024))
+
+    assert respuesta.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_subida_fallida_borra_el_parcial(app, tmp_path):
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    registrar_vista(app, tmp_path, mover=False)
+
+    respuesta = enviar(app, b'%PDF' * 1000)
+
+    assert respuesta.status_code == 500
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,59 @@
+# benchmarks/hash_login.py
+# Mide cuántos logins por segundo puede verificar un worker con cada política de hash.
+#
+#   python benchmarks/hash_login.py --hilos 4 --concurrencia 16 --logins 200
+#
+# Cada "login" es una verificación de contraseña enviada desde un hilo de petición
+# al pool de ServicioHash, igual que hace verificar_password() en las rutas.
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.hashing import ServicioHash  # noqa: E402
+
+POLITICAS = [
+    'scrypt',
+    'scrypt:16384:8:1',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:260000',
+]
+
+
+def medir(metodo, hilos, concurrencia, logins):
+    servicio = ServicioHash(metodo=metodo, hilos=hilos)
+    password_hash = servicio.hashear('clave-de-prueba')
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as peticiones:
+        resultados = list(peticiones.map(
+            lambda _: servicio.verificar(password_hash, 'clave-de-prueba'),
+            range(logins)
+        ))
+    duracion = time.perf_counter() - inicio
+    servicio.cerrar()
+
+    assert all(resultados)
+    return logins / duracion, duracion / logins * concurrencia
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Logins por segundo por worker según la política de hash.')
+    parser.add_argument('--hilos', type=int, default=os.cpu_count(), help='Hilos del pool de hash.')
+    parser.add_argument('--concurrencia', type=int, default=16, help='Peticiones de login simultáneas.')
+    parser.add_argument('--logins', type=int, default=100, help='Logins por política.')
+    parser.add_argument('--politica', action='append', help='Política a medir (se puede repetir).')
+    args = parser.parse_args()
+
+    print(f"Pool: {args.hilos} hilos | concurrencia: {args.concurrencia} | logins: {args.logins}")
+    print(f"{'política':<24}{'logins/s':>12}{'latencia (ms)':>16}")
+    for metodo in args.politica or POLITICAS:
+        por_segundo, latencia = medir(metodo, args.hilos, args.concurrencia, args.logins)
+        print(f"{metodo:<24}{por_segundo:>12.1f}{latencia * 1000:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,59 @@ class Config:
         'static',
         'uploads'
     )
+    # Evidencias y adjuntos de notificaciones (almacén local). Queda fuera de
+    # app/static: estos archivos solo se descargan por vistas que revisan permisos.
+    # UPLOAD_FOLDER se reserva para archivos públicos (y los heredados).
+    EVIDENCIAS_FOLDER = os.getenv('EVIDENCIAS_FOLDER') or os.path.join(
+        os.path.dirname(__file__),
+        'instance',
+        'evidencias'
+    )
+
+    # Tamaño máximo de cada evidencia por tipo. Se fija por petición en las vistas
+    # de subida: si el Content-Length ya lo supera, se rechaza sin leer el cuerpo.
+    EVIDENCIA_LIMITES = {
+        'word': int(os.getenv('EVIDENCIA_MAX_MB_WORD', 10)) * 1024 * 1024,
+        'excel': int(os.getenv('EVIDENCIA_MAX_MB_EXCEL', 10)) * 1024 * 1024,
+        'pdf': int(os.getenv('EVIDENCIA_MAX_MB_PDF', 20)) * 1024 * 1024,
+    }
+    # Subidas por bloques: tamaño máximo de cada bloque, carpeta del estado (por
+    # defecto instance/subidas) y horas sin actividad antes de descartarlas
+    SUBIDAS_BLOQUE_MAX = int(os.getenv('SUBIDAS_BLOQUE_MB', 4)) * 1024 * 1024
+    SUBIDAS_REANUDABLES_CARPETA = os.getenv('SUBIDAS_REANUDABLES_CARPETA')
+    SUBIDAS_REANUDABLES_HORAS = int(os.getenv('SUBIDAS_REANUDABLES_HORAS', 24))
+    # Previas de evidencias (páginas, palabras, extracto): procesos del pool y
+    # cuántas pueden quedar pendientes antes de descartar las nuevas
+    PREVIAS_PROCESOS = int(os.getenv('PREVIAS_PROCESOS', 2))
+    PREVIAS_MAXIMO_PENDIENTES = int(os.getenv('PREVIAS_MAXIMO_PENDIENTES', 200))
+    # Horas que un archivo de evidencia sin referencias se conserva antes de borrarlo
+    EVIDENCIA_BLOBS_GRACIA_HORAS = int(os.getenv('EVIDENCIA_BLOBS_GRACIA_HORAS', 24))
+    # Horas que un archivo de EVIDENCIAS_FOLDER (o heredado en UPLOAD_FOLDER) sin fila que
+    # lo use espera antes de ir a cuarentena, y luego en cuarentena antes de borrarse
+    # (flask evidencias reconciliar)
+    ARCHIVOS_HUERFANOS_GRACIA_HORAS = int(os.getenv('ARCHIVOS_HUERFANOS_GRACIA_HORAS', 24))
+    # Tope para cualquier otra petición (adjuntos, formularios)
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_MB', 32)) * 1024 * 1024
+
+    # Dónde quedan evidencias y adjuntos: "local" (EVIDENCIAS_FOLDER) o "s3" (requiere boto3)
+    EVIDENCIA_ALMACEN = os.getenv('EVIDENCIA_ALMACEN', 'local').lower()
+    # Bucket S3 compatible (AWS, MinIO...). Para que el navegador suba directo al
+    # bucket, su política CORS debe permitir PUT desde el dominio de la aplicación.
+    # Las subidas directas que no se confirman quedan en temporales/: conviene una
+    # regla de ciclo de vida del bucket que expire ese prefijo (p. ej. a 1 día).
+    S3_BUCKET = os.getenv('S3_BUCKET')
+    S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+    S3_REGION = os.getenv('S3_REGION')
+    S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY')
+    S3_SECRET_KEY = os.getenv('S3_SECRET_KEY')
+    S3_PREFIJO = os.getenv('S3_PREFIJO', '')
+    # Segundos de validez de las URLs firmadas de descarga y subida
+    S3_URL_EXPIRA = int(os.getenv('S3_URL_EXPIRA', 300))
+    # Quién envía los archivos locales: "python" (el worker), "x-accel" (Nginx) o
+    # "x-sendfile" (Apache/Lighttpd). Con x-accel, Nginx necesita una location
+    # interna en DESCARGAS_ACCEL_PREFIJO con alias a EVIDENCIAS_FOLDER.
+    DESCARGAS_MODO = os.getenv('DESCARGAS_MODO', 'python').lower()
+    DESCARGAS_ACCEL_PREFIJO = os.getenv('DESCARGAS_ACCEL_PREFIJO', '/archivos-protegidos/')
 
     # ============================
     # BASE DE DATOS
@@ -40,6 +93,12 @@ class Config:
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Compara modelos y base de datos una vez al arrancar (ver /estado/salud y /estado/esquema)
+    SCHEMA_CHECK_ON_STARTUP = os.getenv('SCHEMA_CHECK_ON_STARTUP', 'true').lower() == 'true'
+    # Token para consultar /estado/esquema sin sesión de administrador (cabecera
+    # X-Estado-Token); vacío = solo administradores
+    ESTADO_TOKEN = os.getenv('ESTADO_TOKEN', '')
+
     # ============================
     # POOL
     # ============================
@@ -49,14 +108,73 @@ class Config:
     SQLALCHEMY_POOL_RECYCLE = 1800
     SQLALCHEMY_MAX_OVERFLOW = 10
 
+    # ============================
+    # CACHE DE USUARIOS (load_user)
+    # ============================
+
+    # Cada proceso tiene su propia cache: un cambio hecho en otro worker
+    # se ve, como mucho, USER_CACHE_TTL segundos después.
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))
+    USER_CACHE_MAXSIZE = int(os.getenv('USER_CACHE_MAXSIZE', 2048))
+
+    # ============================
+    # CONTRASEÑAS
+    # ============================
+
+    # Método de werkzeug con sus parámetros, p. ej. "scrypt:32768:8:1" o
+    # "pbkdf2:sha256:600000". Los hashes con otra política se regeneran al iniciar sesión.
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    # Máximo de hashes simultáneos por proceso (0 = uno por CPU). La petición espera
+    # su turno; con varios workers conviene CPUs / workers para no sobrecargar.
+    PASSWORD_HASH_THREADS = int(os.getenv('PASSWORD_HASH_THREADS', 0))
+
+    # Vigencia en segundos de los enlaces firmados para restablecer la contraseña
+    RESET_TOKEN_MAX_AGE = int(os.getenv('RESET_TOKEN_MAX_AGE', 3600))
+
+    # ============================
+    # LÍMITE DE INTENTOS (login y recuperación)
+    # ============================
+
+    # Cubetas de tokens: cada IP y cada documento/correo pueden hacer
+    # RATE_LIMIT_* intentos seguidos y recuperan uno cada VENTANA/límite segundos.
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_IP = int(os.getenv('RATE_LIMIT_IP', 20))
+    RATE_LIMIT_IDENTIDAD = int(os.getenv('RATE_LIMIT_IDENTIDAD', 5))
+    RATE_LIMIT_VENTANA = int(os.getenv('RATE_LIMIT_VENTANA', 60))
+    # Opcional: comparte los contadores entre workers (requiere el paquete redis)
+    RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL')
+
+    # ============================
+    # NOTIFICACIONES
+    # ============================
+
+    NOTIFICACIONES_POR_PAGINA = int(os.getenv('NOTIFICACIONES_POR_PAGINA', 10))
+    # Muestra un total aproximado en la bandeja (en PostgreSQL, estimación del planificador)
+    NOTIFICACIONES_TOTAL_APROXIMADO = os.getenv('NOTIFICACIONES_TOTAL_APROXIMADO', 'false').lower() == 'true'
+    # Cache LRU por proceso con el nombre visible de los remitentes
+    NOTIFICACIONES_REMITENTES_CACHE_TTL = int(os.getenv('NOTIFICACIONES_REMITENTES_CACHE_TTL', 300))
+    NOTIFICACIONES_REMITENTES_CACHE_MAXSIZE = int(os.getenv('NOTIFICACIONES_REMITENTES_CACHE_MAXSIZE', 4096))
+
+    # Stream SSE del badge (/notificacion/eventos). Cada stream ocupa un hilo o greenlet:
+    # usar gunicorn con -k gthread --threads N o -k gevent.
+    NOTIFICACIONES_SSE_KEEPALIVE = int(os.getenv('NOTIFICACIONES_SSE_KEEPALIVE', 25))  # segundos entre pings
+    NOTIFICACIONES_SSE_DURACION = int(os.getenv('NOTIFICACIONES_SSE_DURACION', 300))  # el navegador reconecta
+    # Reparte los eventos entre workers con LISTEN/NOTIFY (solo PostgreSQL)
+    NOTIFICACIONES_PG_NOTIFY = os.getenv('NOTIFICACIONES_PG_NOTIFY', 'false').lower() == 'true'
+    # Segundos entre escrituras en bloque de las lecturas al abrir una notificación
+    # (0 = escribir en cada visita)
+    NOTIFICACIONES_LECTURAS_INTERVALO = float(os.getenv('NOTIFICACIONES_LECTURAS_INTERVALO', 0.3))
+    # `flask notificaciones archivar` mueve las directas vistas con más de estos días
+    NOTIFICACIONES_ARCHIVAR_DIAS = int(os.getenv('NOTIFICACIONES_ARCHIVAR_DIAS', 180))
+
     # ============================
     # EMAIL
     # ============================
 
-    MAIL_SERVER = 'smtp.gmail.com'
-    MAIL_PORT = 465
-    MAIL_USE_TLS = False
-    MAIL_USE_SSL = True
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 465))
+    MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'false').lower() == 'true'
+    MAIL_USE_SSL = os.getenv('MAIL_USE_SSL', 'true').lower() == 'true'
 
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
@@ -65,6 +183,16 @@ class Config:
         MAIL_USERNAME
     )
 
+    # Bandeja de salida: las rutas encolan y `flask correo trabajador` envía
+    MAIL_OUTBOX_BATCH = int(os.getenv('MAIL_OUTBOX_BATCH', 20))
+    MAIL_OUTBOX_PER_MINUTE = int(os.getenv('MAIL_OUTBOX_PER_MINUTE', 60))
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', 6))
+    MAIL_OUTBOX_BACKOFF = int(os.getenv('MAIL_OUTBOX_BACKOFF', 30))  # segundos antes del 1er reintento
+    # "interno": run.py envía desde un hilo del proceso web (un solo proceso, p. ej. el
+    # Dockerfile). "externo": lo hace el proceso `worker` del Procfile; usar con varios
+    # procesos web para no tener un trabajador por proceso.
+    MAIL_OUTBOX_WORKER = os.getenv('MAIL_OUTBOX_WORKER', 'interno').lower()
+
     # ============================
     # PRODUCCIÓN
     # ============================
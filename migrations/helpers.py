@@ -0,0 +1,36 @@
+# migrations/helpers.py
+from alembic import context, op
+from sqlalchemy import inspect
+
+# Las bases anteriores a las migraciones se crearon con create_all(), así que ya
+# tienen las tablas de la revisión base: esa revisión crea solo lo que falta.
+# Sin conexión (flask db upgrade --sql) se genera el SQL de una base vacía.
+
+
+def _inspector():
+    return None if context.is_offline_mode() else inspect(op.get_bind())
+
+
+def existe_tabla(tabla):
+    inspector = _inspector()
+    return inspector is not None and tabla in inspector.get_table_names()
+
+
+def existe_fk(tabla, columna, destino):
+    """True si `tabla.columna` ya es clave foránea hacia `destino` (con cualquier nombre)."""
+    inspector = _inspector()
+    return inspector is not None and any(
+        fk['constrained_columns'] == [columna] and fk['referred_table'] == destino
+        for fk in inspector.get_foreign_keys(tabla)
+    )
+
+
+def crear_tabla(tabla, *columnas, **opciones):
+    if not existe_tabla(tabla):
+        op.create_table(tabla, *columnas, **opciones)
+
+
+def crear_indice(tabla, nombre, columnas, unique=False):
+    inspector = _inspector()
+    if inspector is None or nombre not in {indice['name'] for indice in inspector.get_indexes(tabla)}:
+        op.create_index(nombre, tabla, columnas, unique=unique)
@@ -0,0 +1,255 @@
+"""Esquema base (tablas anteriores al backlog)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 18:13:10.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from migrations.helpers import crear_tabla, crear_indice, existe_fk
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+ENUMS = {
+    'tipo_documento_enum': ('Cedula de Ciudadania', 'Tarjeta de Identidad', 'Cedula Extrangeria', 'Registro Civil'),
+    'tipo_documento_instructor_enum': ('Cedula de Ciudadania', 'Cedula Extrangeria'),
+    'jornada_aprendiz_enum': ('Mañana', 'Tarde', 'Noche'),
+    'tipo_contrato_enum': ('Contrato de Aprendizaje', 'Contrato laboral'),
+    'titulo_programa_enum': ('Auxiliar', 'Tecnico', 'Tecnologo'),
+}
+
+
+def _enum(nombre):
+    # En PostgreSQL el tipo se crea una sola vez en upgrade(): varias tablas
+    # comparten tipo_documento_enum
+    valores = ENUMS[nombre]
+    return sa.Enum(*valores, name=nombre).with_variant(
+        postgresql.ENUM(*valores, name=nombre, create_type=False), 'postgresql'
+    )
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for nombre, valores in ENUMS.items():
+            postgresql.ENUM(*valores, name=nombre).create(bind, checkfirst=True)
+
+    crear_tabla('sede',
+        sa.Column('id_sede', sa.Integer(), nullable=False),
+        sa.Column('nombre_sede', sa.String(length=50), nullable=False),
+        sa.Column('ciudad', sa.String(length=100), nullable=False),
+        sa.Column('token', sa.String(length=100), nullable=True),
+        sa.Column('token_expiracion', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id_sede'),
+        sa.UniqueConstraint('nombre_sede')
+    )
+    crear_tabla('administrador',
+        sa.Column('id_admin', sa.Integer(), nullable=False),
+        sa.Column('nombre', sa.String(length=100), nullable=False),
+        sa.Column('apellido', sa.String(length=100), nullable=False),
+        sa.Column('tipo_documento', _enum('tipo_documento_enum'), nullable=False),
+        sa.Column('documento', sa.String(length=50), nullable=False),
+        sa.Column('correo', sa.String(length=100), nullable=False),
+        sa.Column('celular', sa.String(length=45), nullable=False),
+        sa.Column('password', sa.String(length=200), nullable=False),
+        sa.PrimaryKeyConstraint('id_admin'),
+        sa.UniqueConstraint('correo'),
+        sa.UniqueConstraint('documento')
+    )
+    crear_tabla('administrador_sede',
+        sa.Column('id_admin_sede', sa.Integer(), nullable=False),
+        sa.Column('nombre', sa.String(length=100), nullable=False),
+        sa.Column('apellido', sa.String(length=100), nullable=False),
+        sa.Column('tipo_documento', _enum('tipo_documento_enum'), nullable=False),
+        sa.Column('documento', sa.String(length=50), nullable=False),
+        sa.Column('correo', sa.String(length=100), nullable=False),
+        sa.Column('celular', sa.String(length=45), nullable=False),
+        sa.Column('password', sa.String(length=200), nullable=False),
+        sa.Column('admin_principal_id', sa.Integer(), nullable=False),
+        sa.Column('sede_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['admin_principal_id'], ['administrador.id_admin'], ),
+        sa.ForeignKeyConstraint(['sede_id'], ['sede.id_sede'], ),
+        sa.PrimaryKeyConstraint('id_admin_sede'),
+        sa.UniqueConstraint('correo'),
+        sa.UniqueConstraint('documento')
+    )
+    crear_tabla('instructor',
+        sa.Column('id_instructor', sa.Integer(), nullable=False),
+        sa.Column('nombre_instructor', sa.String(length=45), nullable=False),
+        sa.Column('apellido_instructor', sa.String(length=45), nullable=False),
+        sa.Column('correo_instructor', sa.String(length=100), nullable=False),
+        sa.Column('celular_instructor', sa.String(length=45), nullable=False),
+        sa.Column('tipo_documento', _enum('tipo_documento_instructor_enum'), nullable=False),
+        sa.Column('documento', sa.String(length=45), nullable=False),
+        sa.Column('password_instructor', sa.String(length=250), nullable=False),
+        sa.Column('administrador_sede_id', sa.Integer(), nullable=False),
+        sa.Column('sede_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['administrador_sede_id'], ['administrador_sede.id_admin_sede'], ),
+        sa.ForeignKeyConstraint(['sede_id'], ['sede.id_sede'], ),
+        sa.PrimaryKeyConstraint('id_instructor'),
+        sa.UniqueConstraint('correo_instructor'),
+        sa.UniqueConstraint('documento')
+    )
+    crear_tabla('ficha',
+        sa.Column('id_ficha', sa.Integer(), nullable=False),
+        sa.Column('numero_ficha', sa.Integer(), nullable=False),
+        sa.Column('sede_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['sede_id'], ['sede.id_sede'], ),
+        sa.PrimaryKeyConstraint('id_ficha'),
+        sa.UniqueConstraint('numero_ficha')
+    )
+    crear_tabla('programa',
+        sa.Column('id_programa', sa.Integer(), nullable=False),
+        sa.Column('nombre_programa', sa.String(length=45), nullable=False),
+        sa.Column('titulo', _enum('titulo_programa_enum'), nullable=False),
+        sa.Column('ficha_id', sa.Integer(), nullable=False),
+        sa.Column('instructor_id_instructor', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['ficha_id'], ['ficha.id_ficha'], ),
+        sa.ForeignKeyConstraint(['instructor_id_instructor'], ['instructor.id_instructor'], ),
+        sa.PrimaryKeyConstraint('id_programa')
+    )
+    # aprendiz -> contrato -> empresa -> aprendiz es un ciclo: la clave de
+    # aprendiz.contrato_id se agrega cuando ya existe contrato
+    crear_tabla('aprendiz',
+        sa.Column('id_aprendiz', sa.Integer(), nullable=False),
+        sa.Column('nombre', sa.String(length=45), nullable=False),
+        sa.Column('apellido', sa.String(length=45), nullable=False),
+        sa.Column('tipo_documento', _enum('tipo_documento_enum'), nullable=False),
+        sa.Column('documento', sa.String(length=45), nullable=False),
+        sa.Column('correo', sa.String(length=100), nullable=False),
+        sa.Column('celular', sa.String(length=45), nullable=False),
+        sa.Column('jornada', _enum('jornada_aprendiz_enum'), nullable=False),
+        sa.Column('password_aprendiz', sa.String(length=250), nullable=False),
+        sa.Column('contrato_id', sa.Integer(), nullable=True),
+        sa.Column('programa_id', sa.Integer(), nullable=True),
+        sa.Column('instructor_id', sa.Integer(), nullable=True),
+        sa.Column('sede_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['instructor_id'], ['instructor.id_instructor'], ),
+        sa.ForeignKeyConstraint(['programa_id'], ['programa.id_programa'], ),
+        sa.ForeignKeyConstraint(['sede_id'], ['sede.id_sede'], ),
+        sa.PrimaryKeyConstraint('id_aprendiz')
+    )
+    crear_indice('aprendiz', 'ix_aprendiz_celular', ['celular'], unique=True)
+    crear_indice('aprendiz', 'ix_aprendiz_correo', ['correo'], unique=True)
+    crear_indice('aprendiz', 'ix_aprendiz_documento', ['documento'], unique=True)
+    crear_tabla('empresa',
+        sa.Column('id_empresa', sa.Integer(), nullable=False),
+        sa.Column('nombre_empresa', sa.String(length=100), nullable=False),
+        sa.Column('nit', sa.String(length=45), nullable=False),
+        sa.Column('direccion', sa.String(length=200), nullable=False),
+        sa.Column('telefono', sa.String(length=20), nullable=False),
+        sa.Column('correo_empresa', sa.String(length=100), nullable=False),
+        sa.Column('nombre_jefe', sa.String(length=150), nullable=False),
+        sa.Column('correo_jefe', sa.String(length=150), nullable=False),
+        sa.Column('telefono_jefe', sa.String(length=50), nullable=False),
+        sa.Column('aprendiz_id_aprendiz', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['aprendiz_id_aprendiz'], ['aprendiz.id_aprendiz'], ),
+        sa.PrimaryKeyConstraint('id_empresa'),
+        sa.UniqueConstraint('correo_jefe'),
+        sa.UniqueConstraint('nombre_jefe'),
+        sa.UniqueConstraint('telefono_jefe')
+    )
+    crear_indice('empresa', 'ix_empresa_nit', ['nit'], unique=True)
+    crear_tabla('contrato',
+        sa.Column('id_contrato', sa.Integer(), nullable=False),
+        sa.Column('fecha_inicio', sa.Date(), nullable=False),
+        sa.Column('fecha_fin', sa.Date(), nullable=False),
+        sa.Column('tipo_contrato', _enum('tipo_contrato_enum'), nullable=False),
+        sa.Column('empresa_id_empresa', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['empresa_id_empresa'], ['empresa.id_empresa'], ),
+        sa.PrimaryKeyConstraint('id_contrato')
+    )
+    if not existe_fk('aprendiz', 'contrato_id', 'contrato'):
+        with op.batch_alter_table('aprendiz') as batch_op:
+            batch_op.create_foreign_key('aprendiz_contrato_id_fkey', 'contrato', ['contrato_id'], ['id_contrato'])
+
+    crear_tabla('evidencia',
+        sa.Column('id_evidencia', sa.Integer(), nullable=False),
+        sa.Column('formato', sa.String(length=10), nullable=False),
+        sa.Column('nombre_archivo', sa.String(length=255), nullable=False),
+        sa.Column('url_archivo', sa.String(length=255), nullable=False),
+        sa.Column('fecha_subida', sa.Date(), nullable=False),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('nota', sa.String(length=255), nullable=True),
+        sa.Column('primera_subida_word', sa.Date(), nullable=True),
+        sa.Column('primera_subida_excel_15', sa.Date(), nullable=True),
+        sa.Column('primera_subida_excel_3', sa.Date(), nullable=True),
+        sa.Column('primera_subida_pdf', sa.Date(), nullable=True),
+        sa.Column('sesion_excel', sa.String(length=20), nullable=True),
+        sa.Column('aprendiz_id_aprendiz', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['aprendiz_id_aprendiz'], ['aprendiz.id_aprendiz'], ),
+        sa.PrimaryKeyConstraint('id_evidencia')
+    )
+    crear_tabla('seguimiento',
+        sa.Column('id_seguimiento', sa.Integer(), nullable=False),
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('tipo', sa.String(length=20), nullable=False),
+        sa.Column('observaciones', sa.String(length=255), nullable=False),
+        sa.Column('instructor_id_instructor', sa.Integer(), nullable=False),
+        sa.Column('aprendiz_id_aprendiz', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['aprendiz_id_aprendiz'], ['aprendiz.id_aprendiz'], ),
+        sa.ForeignKeyConstraint(['instructor_id_instructor'], ['instructor.id_instructor'], ),
+        sa.PrimaryKeyConstraint('id_seguimiento'),
+        sa.UniqueConstraint('aprendiz_id_aprendiz')
+    )
+    crear_tabla('token_instructor',
+        sa.Column('id_token', sa.Integer(), nullable=False),
+        sa.Column('token', sa.String(length=100), nullable=False),
+        sa.Column('fecha_expiracion', sa.DateTime(), nullable=False),
+        sa.Column('activo', sa.Boolean(), nullable=True),
+        sa.Column('sede_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['sede_id'], ['sede.id_sede'], ),
+        sa.PrimaryKeyConstraint('id_token'),
+        sa.UniqueConstraint('token')
+    )
+    crear_tabla('notificacion',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('motivo', sa.String(length=100), nullable=True),
+        sa.Column('mensaje', sa.Text(), nullable=False),
+        sa.Column('remitente_id', sa.Integer(), nullable=False),
+        sa.Column('rol_remitente', sa.String(length=50), nullable=False),
+        sa.Column('destinatario_id', sa.Integer(), nullable=True),
+        sa.Column('rol_destinatario', sa.String(length=50), nullable=True),
+        sa.Column('visto', sa.Boolean(), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    crear_tabla('password_reset_token',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('token', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False),
+        sa.Column('user_type', sa.String(length=20), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('used', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    crear_indice('password_reset_token', 'ix_password_reset_token_created_at', ['created_at'])
+    crear_indice('password_reset_token', 'ix_password_reset_token_email', ['email'])
+    crear_indice('password_reset_token', 'ix_password_reset_token_expires_at', ['expires_at'])
+    crear_indice('password_reset_token', 'ix_password_reset_token_token', ['token'], unique=True)
+    crear_indice('password_reset_token', 'ix_password_reset_token_used', ['used'])
+    crear_indice('password_reset_token', 'ix_password_reset_token_user_id', ['user_id'])
+
+
+def downgrade():
+    for tabla in ('password_reset_token', 'notificacion', 'token_instructor', 'seguimiento', 'evidencia'):
+        op.drop_table(tabla)
+    with op.batch_alter_table('aprendiz') as batch_op:
+        batch_op.drop_constraint('aprendiz_contrato_id_fkey', type_='foreignkey')
+    for tabla in ('contrato', 'empresa', 'aprendiz', 'programa', 'ficha', 'instructor',
+                  'administrador_sede', 'administrador', 'sede'):
+        op.drop_table(tabla)
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for nombre, valores in ENUMS.items():
+            postgresql.ENUM(*valores, name=nombre).drop(bind, checkfirst=True)
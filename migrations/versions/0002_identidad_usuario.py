@@ -0,0 +1,37 @@
+"""[user-001] Índice de identidades de todos los roles
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 18:13:20.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+CAMPOS = ('documento', 'correo', 'celular')
+
+
+def upgrade():
+    op.create_table('identidad_usuario',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rol', sa.String(length=30), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('documento', sa.String(length=50), nullable=False),
+        sa.Column('correo', sa.String(length=100), nullable=False),
+        sa.Column('celular', sa.String(length=45), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('rol', 'usuario_id', name='uq_identidad_rol_usuario')
+    )
+    for campo in CAMPOS:
+        op.create_index(f'ix_identidad_usuario_{campo}', 'identidad_usuario', [campo])
+
+
+def downgrade():
+    op.drop_table('identidad_usuario')
@@ -0,0 +1,37 @@
+"""[user-007] Bandeja de salida de correos
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 18:13:30.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('correo_pendiente',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('destinatario', sa.String(length=100), nullable=False),
+        sa.Column('asunto', sa.String(length=200), nullable=False),
+        sa.Column('cuerpo', sa.Text(), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('intentos', sa.Integer(), nullable=False),
+        sa.Column('proximo_intento', sa.DateTime(), nullable=False),
+        sa.Column('ultimo_error', sa.Text(), nullable=True),
+        sa.Column('creado_en', sa.DateTime(), nullable=True),
+        sa.Column('enviado_en', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_correo_pendiente_estado_proximo', 'correo_pendiente', ['estado', 'proximo_intento'])
+
+
+def downgrade():
+    op.drop_table('correo_pendiente')
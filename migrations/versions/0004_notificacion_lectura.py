@@ -0,0 +1,33 @@
+"""[user-008] Difusiones por rol con lecturas por destinatario
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 18:13:40.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notificacion_lectura',
+        sa.Column('notificacion_id', sa.Integer(), nullable=False),
+        sa.Column('rol', sa.String(length=30), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('fecha_lectura', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['notificacion_id'], ['notificacion.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('notificacion_id', 'rol', 'usuario_id')
+    )
+    op.create_index('ix_notificacion_bandeja', 'notificacion', ['rol_destinatario', 'destinatario_id', 'visto'])
+
+
+def downgrade():
+    op.drop_index('ix_notificacion_bandeja', table_name='notificacion')
+    op.drop_table('notificacion_lectura')
@@ -0,0 +1,36 @@
+"""[user-009] Contadores de no leídas por destinatario
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 18:13:50.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('contador_difusion',
+        sa.Column('rol', sa.String(length=50), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('rol')
+    )
+    op.create_table('contador_notificacion',
+        sa.Column('rol', sa.String(length=50), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('no_leidas', sa.Integer(), nullable=False),
+        sa.Column('difusiones_leidas', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('rol', 'usuario_id')
+    )
+
+
+def downgrade():
+    op.drop_table('contador_notificacion')
+    op.drop_table('contador_difusion')
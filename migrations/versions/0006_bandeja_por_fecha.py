@@ -0,0 +1,26 @@
+"""[user-010] Índice para paginar la bandeja por cursor
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 18:14:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_notificacion_bandeja_fecha', 'notificacion', [
+        'rol_destinatario', 'destinatario_id', sa.literal_column('fecha_creacion DESC'), sa.literal_column('id DESC')
+    ])
+
+
+def downgrade():
+    op.drop_index('ix_notificacion_bandeja_fecha', table_name='notificacion')
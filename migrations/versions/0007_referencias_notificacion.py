@@ -0,0 +1,45 @@
+"""[user-013] Referencias de la notificación en columnas
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 18:14:10.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+REFERENCIAS = (
+    ('evidencia_id', 'evidencia', 'id_evidencia'),
+    ('aprendiz_id', 'aprendiz', 'id_aprendiz'),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('notificacion') as batch_op:
+        for columna, _, _ in REFERENCIAS:
+            batch_op.add_column(sa.Column(columna, sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('adjunto', sa.String(length=255), nullable=True))
+        batch_op.create_index('ix_notificacion_evidencia_id', ['evidencia_id'])
+        batch_op.create_index('ix_notificacion_aprendiz_id', ['aprendiz_id'])
+        batch_op.create_index('ix_notificacion_adjunto', ['adjunto'])
+        for columna, tabla, clave in REFERENCIAS:
+            batch_op.create_foreign_key(f'notificacion_{columna}_fkey', tabla, [columna], [clave], ondelete='SET NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('notificacion') as batch_op:
+        for columna, _, _ in REFERENCIAS:
+            batch_op.drop_constraint(f'notificacion_{columna}_fkey', type_='foreignkey')
+        batch_op.drop_index('ix_notificacion_adjunto')
+        batch_op.drop_index('ix_notificacion_aprendiz_id')
+        batch_op.drop_index('ix_notificacion_evidencia_id')
+        batch_op.drop_column('adjunto')
+        batch_op.drop_column('aprendiz_id')
+        batch_op.drop_column('evidencia_id')
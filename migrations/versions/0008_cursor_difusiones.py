@@ -0,0 +1,30 @@
+"""[user-014] Cursor de difusiones leídas por usuario
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 18:14:20.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contador_notificacion') as batch_op:
+        batch_op.add_column(sa.Column('ultima_difusion_leida', sa.Integer(), nullable=True))
+    op.create_index('ix_notificacion_canal', 'notificacion', ['rol_destinatario', 'destinatario_id', 'id'])
+    op.create_index('ix_notificacion_lectura_usuario', 'notificacion_lectura', ['rol', 'usuario_id', 'notificacion_id'])
+
+
+def downgrade():
+    op.drop_index('ix_notificacion_lectura_usuario', table_name='notificacion_lectura')
+    op.drop_index('ix_notificacion_canal', table_name='notificacion')
+    with op.batch_alter_table('contador_notificacion') as batch_op:
+        batch_op.drop_column('ultima_difusion_leida')
@@ -0,0 +1,45 @@
+"""[user-016] Archivo de notificaciones vistas antiguas
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 18:14:30.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notificacion_archivada',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('motivo', sa.String(length=100), nullable=True),
+        sa.Column('mensaje', sa.Text(), nullable=False),
+        sa.Column('remitente_id', sa.Integer(), nullable=False),
+        sa.Column('rol_remitente', sa.String(length=50), nullable=False),
+        sa.Column('destinatario_id', sa.Integer(), nullable=True),
+        sa.Column('rol_destinatario', sa.String(length=50), nullable=True),
+        sa.Column('visto', sa.Boolean(), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+        sa.Column('evidencia_id', sa.Integer(), nullable=True),
+        sa.Column('aprendiz_id', sa.Integer(), nullable=True),
+        sa.Column('adjunto', sa.String(length=255), nullable=True),
+        sa.Column('fecha_archivo', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['aprendiz_id'], ['aprendiz.id_aprendiz'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['evidencia_id'], ['evidencia.id_evidencia'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notificacion_archivada_adjunto', 'notificacion_archivada', ['adjunto'])
+    op.create_index('ix_notificacion_archivada_bandeja', 'notificacion_archivada', [
+        'rol_destinatario', 'destinatario_id', sa.literal_column('fecha_creacion DESC'), sa.literal_column('id DESC')
+    ])
+
+
+def downgrade():
+    op.drop_table('notificacion_archivada')
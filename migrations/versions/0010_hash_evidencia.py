@@ -0,0 +1,28 @@
+"""[user-017] Hash y tamaño de cada evidencia
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 18:14:40.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('evidencia') as batch_op:
+        batch_op.add_column(sa.Column('sha256', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('tamano', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('evidencia') as batch_op:
+        batch_op.drop_column('tamano')
+        batch_op.drop_column('sha256')
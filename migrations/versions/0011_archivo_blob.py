@@ -0,0 +1,33 @@
+"""[user-018] Archivos de evidencia por contenido con referencias
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 18:14:50.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archivo_blob',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('tamano', sa.BigInteger(), nullable=True),
+        sa.Column('referencias', sa.Integer(), nullable=False),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+        sa.Column('liberado_en', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+    op.create_index('ix_evidencia_sha256', 'evidencia', ['sha256'])
+
+
+def downgrade():
+    op.drop_index('ix_evidencia_sha256', table_name='evidencia')
+    op.drop_table('archivo_blob')
@@ -0,0 +1,26 @@
+"""[user-023] Previa de cada archivo de evidencia
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17 18:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('archivo_blob') as batch_op:
+        batch_op.add_column(sa.Column('previa', sa.JSON(none_as_null=True), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('archivo_blob') as batch_op:
+        batch_op.drop_column('previa')
@@ -0,0 +1,35 @@
+"""[user-025] Resumen de evidencias por aprendiz
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-17 18:15:10.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resumen_evidencias',
+        sa.Column('aprendiz_id', sa.Integer(), nullable=False),
+        sa.Column('subidas', sa.Integer(), nullable=False),
+        sa.Column('word', sa.Integer(), nullable=False),
+        sa.Column('excel_15', sa.Integer(), nullable=False),
+        sa.Column('excel_3', sa.Integer(), nullable=False),
+        sa.Column('pdf', sa.Integer(), nullable=False),
+        sa.Column('primera_subida_word', sa.Date(), nullable=True),
+        sa.Column('primera_subida_excel_15', sa.Date(), nullable=True),
+        sa.Column('primera_subida_excel_3', sa.Date(), nullable=True),
+        sa.PrimaryKeyConstraint('aprendiz_id')
+    )
+
+
+def downgrade():
+    op.drop_table('resumen_evidencias')
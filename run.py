@@ -13,8 +13,12 @@ app = create_app()
 # -------------------------------
 def inicializar_base_de_datos():
     with app.app_context():
-        # Crear tablas si no existen
-        db.create_all()
+        # Crear o actualizar las tablas aplicando las migraciones pendientes (flask db upgrade)
+        try:
+            from flask_migrate import upgrade
+            upgrade()
+        except Exception as e:
+            print("Migración del esquema omitida:", e)
 
         # Insertar sedes SOLO si no existen
         try:
@@ -22,6 +26,37 @@ def inicializar_base_de_datos():
         except Exception as e:
             print("Inicialización de sedes omitida o ya existente:", e)
 
+        # Construir el índice de identidades si la base ya tenía usuarios
+        try:
+            from app.services.identidad import asegurar_identidades
+            resultado = asegurar_identidades()
+            if resultado:
+                print(f"[INFO] Índice de identidades construido: {resultado[0]} usuarios.")
+        except Exception as e:
+            db.session.rollback()
+            print("Construcción del índice de identidades omitida:", e)
+
+        # Construir los contadores de no leídas si ya había notificaciones
+        try:
+            from app.services.notificaciones import asegurar_contadores
+            resultado = asegurar_contadores()
+            if resultado:
+                db.session.commit()
+                print(f"[INFO] Contadores de notificaciones construidos: {resultado[0]} destinatarios.")
+        except Exception as e:
+            db.session.rollback()
+            print("Construcción de los contadores de notificaciones omitida:", e)
+
+    # Volver a verificar el esquema ahora que las tablas existen
+    from app.services.esquema import registrar_verificacion
+    registrar_verificacion(app)
+
+    # Sin proceso `flask correo trabajador` aparte, los correos encolados se envían desde aquí
+    if app.config['MAIL_OUTBOX_WORKER'] == 'interno':
+        from app.services.correo import iniciar_trabajador_interno
+        iniciar_trabajador_interno(app)
+        print("[INFO] Trabajador de correo interno iniciado.")
+
 # Ejecutar inicialización SOLO una vez
 if os.environ.get("WERKZEUG_RUN_MAIN") == "true" or not app.debug:
     inicializar_base_de_datos()